@@ -1,156 +1,372 @@
 import classes.errors as errors
 from classes.instruction import Instruction
-import re, pickle
+from classes.scheduler import Scheduler
+import ast, json, os, re, pickle
 
 
 class Assembler():
     """
     This class is the main assembler class defining all operations.
     """
-    # Define input and output file
-    assembly = None
-    output_file = None
+    # Patterns compiled once and shared by every assembler.
+    directive = re.compile(r"\.(data|text)$")
+    label = re.compile(r"([A-Za-z_][A-Za-z0-9_]*)\s*:(.*)$")
+    parameter = re.compile(r"([-0-9]*)\(*\$*([A-Za-z0-9_]*)\)*")
+    # Register name : register number.
+    registers = {"0": 0, "zero": 0, "v0": 2, "v1": 3, "a0": 4, "a1": 5, "a2": 6, "a3": 7,
+                 "t0": 8, "t1": 9, "t2": 10, "t3": 11, "t4": 12, "t5": 13, "t6": 14, "t7": 15,
+                 "s0": 16, "s1": 17, "s2": 18, "s3": 19, "s4": 20, "s5": 21, "s6": 22, "s7": 23,
+                 "t8": 24, "t9": 25, "k0": 26, "k1": 27, "sp": 29, "ra": 31}
+    # Binary string of every byte value, used to emit data in bulk.
+    binary = tuple("{0:08b}".format(value) for value in range(256))
 
-    # Define memory dictionary which will be dumped into machine code.
-    next_address = 32 # Reserve first 64 for registers etc...
-    memory = dict()
-    labels = dict()
-    instructions = []
-    main = None
-
-
-    def __init__(self, input_file, output_file):
+    def __init__(self, input_file, output_file, optimise=False):
         """
         Constructor for the Assembler class.
+        Each assembler holds its own memory image so several files can be assembled in one process.
         :param input_file: input source assembly file.
         :param output_file: output file to write to (or stdout if None)
+        :param optimise: schedule the instructions of each basic block.
         """
-        f = open(input_file, "r")
-        self.assembly = f.read()
-        f.close()
+        self.input_file = input_file
         self.output_file = output_file
+        self.optimise = optimise
+        self.dependencies = [] # Files included by .incbin, which the output must be rebuilt after changes to.
+        # Define memory dictionary which will be dumped into machine code.
+        self.next_address = 32 # Reserve first 64 for registers etc...
+        self.memory = dict()
+        self.labels = dict()
+        self.fixups = [] # List of (address, instruction, line) waiting on labels defined later.
+        self.symbols = dict() # Labels kept for the symbol table once the second pass is done with them.
+        self.lines = dict() # Instruction address : source line number.
+        self.decoded = dict() # Parameter text : decoded parameter, as operands repeat throughout a program.
+        self.operands = dict() # Operand list text : decoded parameters.
+        self.main = None
 
 
     def output(self):
         """
         Outputs calculated machine code to the requested destination.
+        Machine code written to a file is accompanied by a .sym file of its symbols.
         """
         if self.output_file is None:
             print("memory:")
-            for word in range(int(len(self.memory)/4)):
-                if 32+4*word == self.main:
+            get = self.memory.get
+            for address in range(32, self.next_address, 4):
+                if address == self.main:
                     print("instructions:")
-                print(str(32+4*word) + " "
-                      + self.memory[32+4*word] + " "
-                      + self.memory[32+4*word+1] + " "
-                      + self.memory[32+4*word+2] + " "
-                      + self.memory[32+4*word+3])
+                print(str(address) + " "
+                      + get(address, self.binary[0]) + " "
+                      + get(address+1, self.binary[0]) + " "
+                      + get(address+2, self.binary[0]) + " "
+                      + get(address+3, self.binary[0]))
             print("main address: " + str(self.main))
         else:
             f = open(self.output_file, "wb")
-            pickle.dump(self.memory, f)
+            pickle.dump(dict(sorted(self.memory.items())), f) # Address order, however labels were fixed up.
             pickle.dump(self.main, f)
             f.close()
+            self.output_symbols(os.path.splitext(self.output_file)[0] + ".sym")
+
+
+    def output_symbols(self, path):
+        """
+        Writes the symbol table and the address to source line map next to the machine code.
+        :param path: file to write the symbols to.
+        """
+        f = open(path, "w")
+        # Encoded in one go without indentation, which lets json use its C encoder on the line map of large programs.
+        f.write(json.dumps({
+            "source": os.path.abspath(self.input_file),
+            "labels": self.symbols,
+            "lines": {str(address): line for address, line in sorted(self.lines.items())}
+        }))
+        f.close()
 
 
-    def insert_data(self, label, operand):
+    def insert_data(self, label, operand, line=None):
         """
         This inserts variables into the memory dictionary.
-        :param label: variable name
+        Words and halves are aligned to their size, the label refers to the first byte of the data.
+        :param label: variable name (or None if the data is not labelled).
         :param operand: operand for associated variable.
+        :param line: source line number of the data.
         """
-        type = operand.split(" ")[0]
+        parts = operand.split(None, 1)
+        type, arguments = parts[0], (parts[1] if len(parts) > 1 else "")
+        try:
+            if type == ".word":
+                self._align(4)
+                self._define_label(label)
+                words = []
+                for parameter in arguments.split(","):
+                    binary_parameter = "{0:032b}".format(int(parameter.strip()))
+                    words += (binary_parameter[0:8], binary_parameter[8:16],
+                              binary_parameter[16:24], binary_parameter[24:])
+                self._emit_binary(words)
+            elif type == ".half":
+                self._align(2)
+                self._define_label(label)
+                self._emit(b"".join((self._integer(x) & 0xFFFF).to_bytes(2, "big") for x in arguments.split(",")))
+            elif type == ".byte":
+                self._define_label(label)
+                self._emit(bytes(self._integer(x) & 0xFF for x in arguments.split(",")))
+            elif type in [".ascii", ".asciiz"]:
+                self._define_label(label)
+                self._emit(self._string(arguments) + (b"\0" if type == ".asciiz" else b""))
+            elif type == ".space":
+                self._define_label(label)
+                self._reserve(self._integer(arguments))
+            elif type == ".align":
+                self._align(2 ** self._integer(arguments))
+                self._define_label(label)
+            elif type == ".incbin":
+                self._define_label(label)
+                path = os.path.join(os.path.dirname(self.input_file), self._string(arguments).decode())
+                f = open(path, "rb")
+                self._emit(f.read())
+                f.close()
+                self.dependencies.append(path)
+            else:
+                raise errors.InvalidDataFormat(self._located("unknown directive " + type, line))
+        except (ValueError, SyntaxError, OSError) as e:
+            raise errors.InvalidDataFormat(self._located(operand + ": " + str(e), line))
+
 
-        if type == ".word":
+    def _define_label(self, label):
+        """
+        Points a data label at the next free address.
+        :param label: variable name (or None if the data is not labelled).
+        """
+        if label is not None:
             self.labels[label] = self.next_address
-            parameters = operand.split(".word")[1].split(",")
-            for parameter in parameters:
-                parameter = int(parameter.strip())
-                binary_parameter = "{0:032b}".format(parameter)
-                self.memory[self.next_address  ] = binary_parameter[0:8]
-                self.memory[self.next_address+1] = binary_parameter[8:16]
-                self.memory[self.next_address+2] = binary_parameter[16:24]
-                self.memory[self.next_address+3] = binary_parameter[24:]
-                self.next_address += 4
 
 
-    def insert_instruction(self, address, instruction):
+    def _emit(self, data):
+        """
+        Emits bytes into memory at the next free address.
+        :param data: bytes to emit.
+        """
+        self._emit_binary(list(map(self.binary.__getitem__, data)))
+
+
+    def _emit_binary(self, data):
+        """
+        Emits binary byte strings into memory at the next free address in a single update.
+        :param data: list of binary byte strings.
+        """
+        self.memory.update(zip(range(self.next_address, self.next_address + len(data)), data))
+        self.next_address += len(data)
+
+
+    def _reserve(self, size):
+        """
+        Reserves zeroed bytes in memory at the next free address.
+        :param size: number of bytes.
+        """
+        self.memory.update(dict.fromkeys(range(self.next_address, self.next_address + size), self.binary[0]))
+        self.next_address += size
+
+
+    def _align(self, size):
+        """
+        Pads memory with zeroed bytes up to the next multiple of a size.
+        :param size: alignment in bytes.
+        """
+        self._reserve(-self.next_address % size)
+
+
+    @staticmethod
+    def _integer(text):
+        """
+        Parses an integer operand, allowing hex, octal and binary prefixes.
+        :param text: operand text.
+        :return: Integer value.
+        """
+        text = text.strip()
+        try:
+            return int(text, 0)
+        except ValueError:
+            return int(text) # Decimal with leading zeros.
+
+
+    @staticmethod
+    def _string(text):
+        """
+        Parses a double quoted string operand with C style escapes.
+        :param text: operand text.
+        :return: Bytes of the string.
+        """
+        text = text.strip()
+        if len(text) < 2 or text[0] != '"' or text[-1] != '"':
+            raise ValueError("expected a double quoted string")
+        return ast.literal_eval("b" + text)
+
+
+    def insert_instruction(self, address, instruction, line=None):
         """
         This inserts instructions into the memory dictionary.
-        :param instruction: list containing parts of the instruction.
+        :param address: address of the instruction.
+        :param instruction: list containing parts of the instruction with parameters already replaced.
+        :param line: source line number of the instruction.
         """
-        byte_instruction = Instruction(instruction).parse()
+        try:
+            byte_instruction = Instruction(instruction).parse()
+        except (errors.InvalidInstructionName, errors.InvalidInstructionFormat) as e:
+            raise type(e)(self._located(str(e), line))
         self.memory[address] = byte_instruction[0]
         self.memory[address+1] = byte_instruction[1]
         self.memory[address+2] = byte_instruction[2]
         self.memory[address+3] = byte_instruction[3]
 
 
-    def build_data(self, data_segment):
+    def build_instruction(self, text, line):
         """
-        This parses the data segment of the assembly code.
-        :param data_segment: data section of assembly code.
+        Allocates memory for an instruction and emits it straight away if every label it uses is defined.
+        Instructions referring to labels defined later are left to be fixed up by the second pass,
+        as are all instructions when optimising so that they can be scheduled.
+        :param text: instruction with comments and labels removed.
+        :param line: source line number of the instruction.
         """
-        for line in data_segment:
-            if line.strip():
-                if line.strip()[0] == "#":
-                    # Ignore full line comments
-                    continue
-                label, operand = line.split(":")[0], line.split(":")[1].strip().split("#")[0]
-                self.insert_data(label, operand)
+        parts = text.split(None, 1)
+        address = self.next_address
+        self.next_address += 4
+        self.lines[address] = line
+        if not self.optimise:
+            operands = self._decode_operands(parts[1]) if len(parts) > 1 else ()
+            labels = self.labels
+            try: # Same as replace_parameter, without a call per parameter.
+                parameters = [(labels[p], o) if isinstance(p, str) else (p, o) for p, o in operands]
+            except KeyError:
+                pass
+            else:
+                parameters.insert(0, parts[0])
+                self.insert_instruction(address, parameters, line)
+                return
+        instruction = [parts[0]]
+        if len(parts) > 1:
+            instruction += [part.strip() for part in parts[1].split(",")]
+        self.fixups.append((address, instruction, line))
 
 
-    def build_instructions(self, instruction_segment):
+    def _decode_operands(self, text):
         """
-        This parses the instruction segment of the assembly code.
-        :param instruction_segment: instruction segment of assembly code.
+        Decodes the comma separated parameters of an instruction, each distinct list only being decoded once.
+        :param text: parameters of the instruction.
+        :return: Tuple of decoded parameters with their memory offsets.
         """
-        for line in instruction_segment:
-            if len(line.split(":")) > 1:
-                # Add label definition
-                label = line.split(":")[0].strip()
-                if label == 'main':
-                    self.main = self.next_address
-                self.labels[label] = self.next_address
-            elif line.strip():
-                if line.strip()[0] == "#":
-                    # Ignore full line comments
-                    continue
-                operation, operand = line.strip().split(" ")[0], line.strip().split(" ", 1)[1].split("#")[0]
-                address, instruction=self.next_address, [operation]
-                for part in operand.split(","):
-                    instruction.append(part.strip())
-                self.instructions.append((address, instruction))
-                self.next_address += 4
+        operands = self.operands.get(text)
+        if operands is None:
+            operands = tuple(self.decode_parameter(part.strip()) for part in text.split(","))
+            self.operands[text] = operands
+        return operands
 
 
     def first_pass(self):
         """
-        Allocates memory for data & instructions.
-        Also identifies labels and associated addresses.
+        Streams through the source once, allocating memory for data & instructions and identifying labels.
+        Data and instructions are emitted into memory as they are read, in the order they appear,
+        so the source is never held in memory as a whole.
         """
-        data_segment = self.assembly.split(".data")[1].split(".text")[0].split("\n")
-        self.build_data(data_segment)
-        instruction_segment = self.assembly.split(".text")[1].split("\n")
-        self.build_instructions(instruction_segment)
+        f = open(self.input_file, "r")
+        try:
+            self._read(f)
+        finally:
+            f.close()
+
+
+    def _read(self, f):
+        """
+        Assembles each line of the source as it is read.
+        :param f: source file.
+        """
+        segment = None
+        for line, text in enumerate(f, 1):
+            text = self._strip_comment(text)
+            if not text:
+                continue
+            directive = self.directive.match(text) if text[0] == "." else None
+            if directive:
+                segment = directive.group(1)
+                if segment == "text":
+                    self._align(4) # Instructions are always word aligned.
+                continue
+            if segment is None:
+                continue # Anything before the first segment is ignored.
+            label = self.label.match(text) if ":" in text else None
+            name = None
+            if label:
+                name, text = label.group(1), label.group(2).strip()
+            if segment == "data":
+                if text:
+                    self.insert_data(name, text, line)
+                else:
+                    self._define_label(name)
+                continue
+            if name is not None:
+                if name == 'main':
+                    self.main = self.next_address
+                self.labels[name] = self.next_address
+            if text:
+                self.build_instruction(text, line)
 
 
     def second_pass(self):
         """
-        Converts label names to addresses
+        Fixes up the instructions which referred to labels defined after them.
+        When optimising every instruction is fixed up here, after scheduling each basic block.
         """
-        raw_instructions = []
-        for address, instruction in self.instructions:
-            raw_instruction = [instruction[0]] + list(map(lambda x:
-                                                          self.replace_parameter(x),
-                                                          instruction[1:]))
-            raw_instructions.append((address, raw_instruction))
+        resolved = []
+        for address, instruction, line in self.fixups:
+            try:
+                parameters = [self.replace_parameter(x) for x in instruction[1:]]
+            except errors.InvalidLabel as e:
+                raise errors.InvalidLabel(self._located(str(e), line))
+            resolved.append((address, [instruction[0]] + parameters, line))
+        if self.optimise:
+            resolved = Scheduler(self.labels).schedule(resolved)
+        for address, instruction, line in resolved:
+            self.insert_instruction(address, instruction, line)
+            self.lines[address] = line
+        self.fixups = []
         # Now we can remove all references to labels
+        self.symbols = self.labels
         self.labels = None
-        # Change the instructions to raw format
-        self.instructions = raw_instructions
-        for address, instruction in self.instructions:
-            self.insert_instruction(address, instruction)
+
+
+    @staticmethod
+    def _strip_comment(text):
+        """
+        Removes any comment from a line of source, leaving `#' inside string literals alone.
+        :param text: line of source.
+        :return: Stripped line without its comment.
+        """
+        if '"' not in text:
+            return text.split("#", 1)[0].strip()
+        quoted, escaped = False, False
+        for i, character in enumerate(text):
+            if escaped:
+                escaped = False
+            elif character == "\\":
+                escaped = quoted
+            elif character == '"':
+                quoted = not quoted
+            elif character == "#" and not quoted:
+                return text[:i].strip()
+        return text.strip()
+
+
+    @staticmethod
+    def _located(message, line):
+        """
+        Adds the source line number to an error message.
+        :param message: description of the error.
+        :param line: source line number (or None if unknown).
+        :return: Error message.
+        """
+        if line is None:
+            return message
+        return message + " (line " + str(line) + ")"
 
 
     def replace_parameter(self, parameter):
@@ -161,10 +377,8 @@ class Assembler():
         :return: label address or original x.
         """
         parameter, offset = self.decode_parameter(parameter)
-        try: # Register & immediate conversion
-            return int(parameter), offset
-        except ValueError:
-            pass
+        if isinstance(parameter, int): # Register & immediate
+            return parameter, offset
         try: # Label conversion
             return self.labels[parameter], offset
         except KeyError:
@@ -173,39 +387,33 @@ class Assembler():
 
     def decode_parameter(self, parameter):
         """
-        Decodes instruction parameters.
+        Decodes instruction parameters, each distinct parameter text only being decoded once.
         :param parameter: instruction parameter.
         :return: parameter interpretation with associated memory offset.
         """
-        result = re.search('([-0-9]*)\(*\$*([A-Za-z0-9_]*)\)*', parameter)
-        is_register = '$' in parameter
+        decoded = self.decoded.get(parameter)
+        if decoded is None:
+            decoded = self.decoded[parameter] = self._decode_parameter(parameter)
+        return decoded
+
+
+    def _decode_parameter(self, parameter):
+        """
+        Splits an instruction parameter into its register, immediate or label and its memory offset.
+        :param parameter: instruction parameter.
+        :return: register number, immediate or label name with associated memory offset.
+        """
+        result = self.parameter.search(parameter)
         offset = int(result.group(1) or 0)
-        parameter = result.group(2)
-        if not bool(parameter): # If parameter is not found then it's an immediate and offset should be used.
+        name = result.group(2)
+        if not bool(name): # If parameter is not found then it's an immediate and offset should be used.
             return offset, 0
-        if is_register and parameter in ["0", "zero"]: # Check for zero register
-            return 0, offset
-        elif is_register and parameter[0] == 't': # Check for temp register
-            number = int(parameter[1])
-            if number <= 7:
-                return (number + 8), offset
-            else:
-                return (number + 16), offset
-        elif is_register and parameter == "sp": # Check for stack pointer
-            return 29, offset
-        elif is_register and parameter[0] == 's': # Check for saved register
-            number = int(parameter[1])
-            return (number + 16), offset
-        elif is_register and parameter[0] == 'a': # Check for argument register
-            number = int(parameter[1])
-            return (number + 4), offset
-        elif is_register and parameter[0] == 'v':  # Check for return register
-            number = int(parameter[1])
-            return (number + 2), offset
-        elif is_register and parameter == "ra": # Check for return address
-            return 31, offset
-        else: # Otherwise it's a label or immediate
-            return parameter, offset
+        if '$' in parameter and name in self.registers:
+            return self.registers[name], offset
+        try: # Registers given by number, e.g. $31
+            return int(name), offset
+        except ValueError: # Otherwise it's a label
+            return name, offset
 
 
 
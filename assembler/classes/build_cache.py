@@ -0,0 +1,116 @@
+import hashlib, json, os
+
+
+class BuildCache():
+    """
+    Records the source each machine code file was assembled from so that unchanged sources are not reassembled.
+    Every output directory holds a manifest mapping output file names to the key they were built from
+    and the files their source included.
+    """
+    manifest_name = ".jw_build"
+    _version = None
+
+    def __init__(self, options=""):
+        """
+        Constructor for the BuildCache class.
+        :param options: assembler options which change the machine code produced.
+        """
+        self.options = options
+        self.manifests = {} # Output directory : {output file name : {key, dependencies}}
+        self.modified = set()
+
+
+    def key(self, source, dependencies=()):
+        """
+        Computes the key of a source file from its contents, the files it includes, the assembler version and options.
+        :param source: assembly source file.
+        :param dependencies: files included by the source.
+        :return: Hex digest identifying the build.
+        """
+        digest = hashlib.sha256((self.version() + self.options).encode('utf-8'))
+        for path in [source] + list(dependencies):
+            f = open(path, "rb")
+            digest.update(f.read())
+            f.close()
+        return digest.hexdigest()
+
+
+    def up_to_date(self, source, output):
+        """
+        Checks whether an output was built from the current contents of a source with this assembler.
+        :param source: assembly source file.
+        :param output: machine code file.
+        :return: Boolean representing whether the output can be reused.
+        """
+        directory, name = os.path.split(os.path.abspath(output))
+        entry = self._manifest(directory).get(name)
+        if not os.path.exists(output) or not isinstance(entry, dict):
+            return False
+        try:
+            return entry["key"] == self.key(source, entry["dependencies"])
+        except OSError: # An included file has gone.
+            return False
+
+
+    def record(self, source, output, dependencies=()):
+        """
+        Records that an output has just been built from a source.
+        :param source: assembly source file.
+        :param output: machine code file.
+        :param dependencies: files included by the source.
+        """
+        directory, name = os.path.split(os.path.abspath(output))
+        self._manifest(directory)[name] = {
+            "key": self.key(source, dependencies),
+            "dependencies": list(dependencies)
+        }
+        self.modified.add(directory)
+
+
+    def save(self):
+        """
+        Writes back the manifests of every output directory built into.
+        """
+        for directory in self.modified:
+            path = os.path.join(directory, self.manifest_name)
+            f = open(path + ".tmp", "w")
+            json.dump(self.manifests[directory], f, indent=1, sort_keys=True)
+            f.close()
+            os.replace(path + ".tmp", path)
+        self.modified = set()
+
+
+    def _manifest(self, directory):
+        """
+        Loads the manifest of an output directory.
+        :param directory: output directory.
+        :return: Dictionary of output file name to build entry.
+        """
+        if directory not in self.manifests:
+            try:
+                f = open(os.path.join(directory, self.manifest_name), "r")
+                try:
+                    self.manifests[directory] = json.load(f)
+                finally:
+                    f.close()
+            except (OSError, ValueError): # No manifest yet, or a damaged one, so nothing is up to date.
+                self.manifests[directory] = {}
+        return self.manifests[directory]
+
+
+    @classmethod
+    def version(cls):
+        """
+        Identifies the assembler version by the source code of its classes.
+        :return: Hex digest of the assembler source.
+        """
+        if cls._version is None:
+            directory = os.path.dirname(os.path.abspath(__file__))
+            digest = hashlib.sha256()
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".py"):
+                    f = open(os.path.join(directory, name), "rb")
+                    digest.update(f.read())
+                    f.close()
+            cls._version = digest.hexdigest()
+        return cls._version
@@ -16,4 +16,11 @@ class InvalidInstructionFormat(Exception):
     """
     This Exception is raised when an invalid number of operands are coupled with an assembly instruction.
     """
+    pass
+
+
+class InvalidDataFormat(Exception):
+    """
+    This Exception is raised when the operands of a data directive cannot be parsed.
+    """
     pass
\ No newline at end of file
@@ -8,6 +8,8 @@ class Instruction():
     """
     instruction = None
     type = None
+    # Binary string of every byte value, used to split an encoded word into bytes.
+    binary = tuple("{0:08b}".format(value) for value in range(256))
 
 
     def __init__(self, instruction):
@@ -48,8 +50,10 @@ class Instruction():
             stage = 3
             p3, o3 = self.instruction[3]
         except IndexError: # Check instruction format.
-            if function in [8, 16, 18, 38] and stage == 2:
-                pass # JR, MFHI, MFLO, SYSCALL only take 1 parameter.
+            if function in [8, 16, 18] and stage == 2:
+                pass # JR, MFHI, MFLO only take 1 parameter.
+            elif function == 12 and stage == 1:
+                pass # SYSCALL takes no parameters, the service is chosen by $v0.
             elif function in [24, 26] and stage == 3:
                 pass # Multiply & Divide only take 2 parameters as there is no destination register.
             else:
@@ -61,10 +65,14 @@ class Instruction():
             rd, rt, shift = p1, p2, p3
         elif function == 8:
             rs = p1
-        elif function in [16, 18, 38]:
+        elif function in [16, 18]:
             rd = p1
+        elif function == 12:
+            pass
         else:
             rd, rs, rt = p1, p2, p3
+        if not (rs | rt | rd | shift) >> 5: # Every field fits, so encode the word directly.
+            return self._bytes(rs << 21 | rt << 16 | rd << 11 | shift << 6 | function)
         # Build byte list
         byte_list= ["{0:06b}".format(0) + "{0:05b}".format(rs)[0:2]]
         byte_list.append("{0:05b}".format(rs)[2:] + "{0:05b}".format(rt))
@@ -106,6 +114,8 @@ class Instruction():
                 rt, rs, imm = p1, p2, o2 # Load address from register with offset
         else:
             rt, rs, imm = p1, p2, p3
+        if not (rs | rt) >> 5 and not imm >> 16: # Negative immediates keep their sign in the byte strings.
+            return self._bytes(opcode << 26 | rs << 21 | rt << 16 | imm)
         # Build byte list
         byte_list = ["{0:06b}".format(opcode) + "{0:05b}".format(rs)[0:2]]
         byte_list.append("{0:05b}".format(rs)[2:] + "{0:05b}".format(rt))
@@ -124,9 +134,20 @@ class Instruction():
             addr, _ = self.instruction[1]
         except IndexError:
             raise InvalidInstructionFormat(self.instruction[0])
+        if not addr >> 26:
+            return self._bytes(opcode << 26 | addr)
         byte_list = ["{0:06b}".format(opcode) + "{0:026b}".format(addr)[0:2]]
         byte_list.append("{0:026b}".format(addr)[2:10])
         byte_list.append("{0:026b}".format(addr)[10:18])
         byte_list.append("{0:026b}".format(addr)[18:26])
         return byte_list
 
+
+    def _bytes(self, word):
+        """
+        Splits an encoded instruction into bytes.
+        :param word: 32 bit instruction.
+        :return: List of byte strings representing instruction ready to insert into memory.
+        """
+        binary = self.binary
+        return [binary[word >> 24], binary[word >> 16 & 0xFF], binary[word >> 8 & 0xFF], binary[word & 0xFF]]
@@ -46,7 +46,7 @@ class Opcode():
         "jr"      : (Type.R,  0, 8   ),
         "mfhi"    : (Type.R,  0, 16  ),
         "mflo"    : (Type.R,  0, 18  ),
-        "syscall" : (Type.R,  0, 38  )
+        "syscall" : (Type.R,  0, 12  )
     }
 
 
@@ -0,0 +1,174 @@
+import importlib.util, os
+
+
+class Scheduler():
+    """
+    List scheduler reordering the instructions within each basic block of a program.
+    Blocks never move, so labels and relative branch immediates keep their meaning.
+    The machine model is read from the simulator's configuration so that the two cannot drift apart.
+    """
+    # Configuration of the simulator the machine model is read from.
+    constants = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir,
+                             "simulator", "classes", "constants.py")
+    # Functional unit of each opcode, any other opcode is executed by an ALU.
+    unit = {"lw": "lsu", "sw": "lsu", "beq": "beu", "bne": "beu", "blez": "beu", "bgtz": "beu",
+            "j": "beu", "jal": "beu", "jr": "beu"}
+    # Instructions ending a basic block and those whose immediate is relative to their own address.
+    control = ["beq", "bne", "blez", "bgtz", "j", "jal", "jr", "syscall"]
+    relative = {"beq": 3, "bne": 3, "blez": 2, "bgtz": 2} # Name : operand holding the offset in instructions.
+    operands = {"add": 3, "sub": 3, "and": 3, "or": 3, "xor": 3, "nor": 3, "slt": 3, "sll": 2, "sra": 2,
+                "mult": 2, "div": 2, "mfhi": 1, "mflo": 1, "addi": 2, "andi": 2, "ori": 2, "xori": 2,
+                "slti": 2, "lui": 1, "lw": 2, "sw": 2} # Name : operands the dependency analysis needs.
+
+    def __init__(self, labels):
+        """
+        Constructor for the Scheduler class.
+        :param labels: dictionary of label to address, every labelled address starts a block.
+        """
+        self.labels = set(labels.values())
+        self.width, self.units, self.latency = self.machine()
+
+
+    @classmethod
+    def machine(cls):
+        """
+        Reads the machine model from the simulator's configuration.
+        :return: Issue width, dictionary of unit : count and dictionary of opcode : result latency.
+        """
+        spec = importlib.util.spec_from_file_location("simulator_constants", cls.constants)
+        constants = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(constants)
+        latency = {}
+        for timing in [constants.lsu_timing, constants.alu_timing, constants.beu_timing]:
+            latency.update((name, timing[name][0]) for name in timing)
+        if constants.l1d_cache is not None: # Loads and stores also take the data cache's hit latency.
+            for name in constants.lsu_timing:
+                latency[name] += constants.l1d_cache["hit_latency"]
+        # The first execution unit is the only one with a BEU.
+        return constants.N, {"lsu": constants.load_store_ports, "alu": constants.alu_units, "beu": 1}, latency
+
+
+    def schedule(self, instructions):
+        """
+        Schedules a program.
+        :param instructions: list of (address, instruction, line) with parameters replaced, in address order.
+        :return: List of (address, instruction, line) with the instructions of each block reordered.
+        """
+        scheduled = []
+        for block in self._blocks(instructions):
+            addresses = [address for address, _, _ in block]
+            order = self._schedule_block([instruction for _, instruction, _ in block])
+            for address, i in zip(addresses, order):
+                scheduled.append((address, block[i][1], block[i][2]))
+        return scheduled
+
+
+    def _blocks(self, instructions):
+        """
+        Splits a program into basic blocks.
+        Blocks start at labels, relative branch targets, after control instructions and after gaps in the addresses.
+        :param instructions: list of (address, instruction, line) in address order.
+        :return: List of blocks, each a list of (address, instruction, line).
+        """
+        leaders = set(self.labels)
+        for address, instruction, _ in instructions:
+            name = instruction[0]
+            if name in self.relative and len(instruction) > self.relative[name]:
+                leaders.add(address + (instruction[self.relative[name]][0] << 2))
+        blocks, block, previous = [], [], None
+        for item in instructions:
+            address = item[0]
+            if block and (address in leaders or address != previous + 4 or block[-1][1][0] in self.control):
+                blocks.append(block)
+                block = []
+            block.append(item)
+            previous = address
+        if block:
+            blocks.append(block)
+        return blocks
+
+
+    def _schedule_block(self, block):
+        """
+        Orders the instructions of a basic block by list scheduling on the machine model.
+        Ready instructions on the longest latency path to the end of the block go first,
+        and any control instruction stays at the end of the block.
+        :param block: list of instructions.
+        :return: List of indices into the block in their new order.
+        """
+        count = len(block)
+        if block[-1][0] in self.control:
+            count -= 1
+        effects = [self._effects(instruction) for instruction in block[:count]]
+        predecessors = [[] for _ in range(count)] # List of (index, latency) each instruction waits on.
+        for j in range(count):
+            reads_j, writes_j, memory_j = effects[j]
+            for i in range(j):
+                reads_i, writes_i, memory_i = effects[i]
+                if writes_i & reads_j:
+                    predecessors[j].append((i, self.latency.get(block[i][0], 1)))
+                elif writes_i & writes_j or reads_i & writes_j or \
+                        (memory_i and memory_j and "store" in (memory_i, memory_j)):
+                    predecessors[j].append((i, 0))
+        priority = [0] * count
+        for j in reversed(range(count)):
+            priority[j] += self.latency.get(block[j][0], 1)
+            for i, _ in predecessors[j]:
+                priority[i] = max(priority[i], priority[j])
+        finished, order, cycle = {}, [], 0 # Index : cycle it was issued in.
+        while len(order) < count:
+            issued, used = 0, dict.fromkeys(self.units, 0)
+            progress = True
+            while progress and issued < self.width:
+                progress = False
+                ready = [j for j in range(count) if j not in finished and
+                         all(i in finished and finished[i] + latency <= cycle for i, latency in predecessors[j])]
+                for j in sorted(ready, key=lambda j: (-priority[j], j)):
+                    unit = self.unit.get(block[j][0], "alu")
+                    if used[unit] < self.units[unit]:
+                        used[unit] += 1
+                        issued += 1
+                        finished[j] = cycle
+                        order.append(j)
+                        progress = True
+                        break # Instructions only waiting on this one may now be ready this cycle.
+            cycle += 1
+        return order + list(range(count, len(block)))
+
+
+    @staticmethod
+    def _effects(instruction):
+        """
+        Finds the registers an instruction reads and writes and how it accesses memory.
+        HI and LO are registers 32 and 33, writes to the zero register are ignored.
+        :param instruction: instruction with parameters replaced by (value, offset) pairs.
+        :return: Set of registers read, set of registers written and "load", "store" or None.
+        """
+        name, parameters = instruction[0], [value for value, _ in instruction[1:]]
+        reads, writes, memory = set(), set(), None
+        if len(parameters) < Scheduler.operands.get(name, 0):
+            return reads, writes, memory # Malformed, left in place for the assembler to report.
+        if name in ["add", "sub", "and", "or", "xor", "nor", "slt"]:
+            writes, reads = {parameters[0]}, {parameters[1], parameters[2]}
+        elif name in ["sll", "sra"]:
+            writes, reads = {parameters[0]}, {parameters[1]}
+        elif name in ["mult", "div"]:
+            writes, reads = {32, 33}, {parameters[0], parameters[1]}
+        elif name == "mfhi":
+            writes, reads = {parameters[0]}, {32}
+        elif name == "mflo":
+            writes, reads = {parameters[0]}, {33}
+        elif name in ["addi", "andi", "ori", "xori", "slti"]:
+            writes, reads = {parameters[0]}, {parameters[1]}
+        elif name == "lui":
+            writes = {parameters[0]}
+        elif name == "lw":
+            writes, memory = {parameters[0]}, "load"
+            if parameters[1] < 32: # Otherwise the address of a variable rather than a register.
+                reads = {parameters[1]}
+        elif name == "sw":
+            reads, memory = {parameters[0]}, "store"
+            if parameters[1] < 32:
+                reads.add(parameters[1])
+        writes.discard(0)
+        return reads, writes, memory
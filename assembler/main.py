@@ -1,24 +1,154 @@
-import argparse
+import argparse, functools, os, sys, time
+from concurrent.futures import ProcessPoolExecutor
 from classes.assember import Assembler
+from classes.build_cache import BuildCache
+from classes.scheduler import Scheduler
 
 
 def main(args):
     """
     Main function spawning the assembler.
     :param args: Arguments passed to assembler:
-        source file name
-        output file name
+        source file names or directories
+        output file name or output directory
+        force flag
+        number of jobs
+        optimise flag
     :return: Machine code written to output or stdout if None specified.
     """
-    assembler = Assembler(args.file, args.output)
+    if args.directory is None and len(args.files) == 1 and not os.path.isdir(args.files[0]):
+        if args.output is None:
+            assemble(args.files[0], None, args.optimise)
+            return
+        failures = build([(args.files[0], args.output)], args.force, verbose=False, optimise=args.optimise)
+    else:
+        failures = build(find_sources(args.files, args.directory), args.force, jobs=args.jobs, optimise=args.optimise)
+    if failures:
+        exit(1)
+
+
+def assemble(source, output, optimise=False):
+    """
+    Assembles a single source file.
+    :param source: MIPS assembly source file.
+    :param output: destination for the machine code (or None for stdout).
+    :param optimise: schedule the instructions of each basic block.
+    :return: List of files included by the source.
+    """
+    assembler = Assembler(source, output, optimise)
     assembler.first_pass()
     assembler.second_pass()
     assembler.output()
+    return assembler.dependencies
+
+
+def assemble_job(target, optimise=False):
+    """
+    Assembles a single source file as part of a build, catching any error so the rest of the build can carry on.
+    :param target: (source, output) pair.
+    :param optimise: schedule the instructions of each basic block.
+    :return: Source, output, files included, seconds taken and the error message (or None if it assembled).
+    """
+    source, output = target
+    start = time.perf_counter()
+    try:
+        dependencies = assemble(source, output, optimise)
+    except Exception as e:
+        return source, output, [], time.perf_counter() - start, type(e).__name__ + ": " + str(e)
+    return source, output, dependencies, time.perf_counter() - start, None
+
+
+def build(targets, force=False, verbose=True, jobs=1, optimise=False):
+    """
+    Assembles every source whose output is missing or was built from a different source or assembler.
+    With more than one job the sources are assembled by a pool of worker processes.
+    :param targets: iterable of (source, output) pairs.
+    :param force: reassemble even if an output is up to date.
+    :param verbose: report what happened to each source.
+    :param jobs: number of sources to assemble at once.
+    :param optimise: schedule the instructions of each basic block.
+    :return: Number of sources which failed to assemble.
+    """
+    # Scheduled code depends on the machine model, so a change to the simulator's configuration rebuilds it.
+    cache = BuildCache("-O" + repr(Scheduler.machine()) if optimise else "")
+    stale = []
+    for source, output in targets:
+        if not force and cache.up_to_date(source, output):
+            if verbose:
+                print(source + " is up to date")
+            continue
+        directory = os.path.dirname(output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        stale.append((source, output))
+    failures = 0
+    pool = None
+    job = functools.partial(assemble_job, optimise=optimise)
+    if jobs > 1 and len(stale) > 1:
+        pool = ProcessPoolExecutor(min(jobs, len(stale)))
+        results = pool.map(job, stale)
+    else:
+        results = map(job, stale)
+    try:
+        for source, output, dependencies, seconds, error in results:
+            if error is not None:
+                failures += 1
+                print("Failed " + source + ": " + error, file=sys.stderr)
+                continue
+            cache.record(source, output, dependencies)
+            if verbose:
+                print("Assembled " + source + " -> " + output + " in " + "{0:.3f}".format(seconds) + "s")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        cache.save() # Keep track of what was built even if the build is interrupted.
+    return failures
+
+
+def find_sources(paths, directory=None):
+    """
+    Finds the assembly sources to build, searching directories recursively.
+    :param paths: source files and directories.
+    :param directory: output directory (or None to write each output next to its source).
+    :return: Generator of (source, output) pairs.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            for root, folders, files in os.walk(path):
+                folders.sort()
+                for name in sorted(files):
+                    if name.endswith(".mips"):
+                        source = os.path.join(root, name)
+                        yield source, output_path(source, directory, os.path.relpath(source, path))
+        else:
+            yield path, output_path(path, directory, os.path.basename(path))
+
+
+def output_path(source, directory, relative):
+    """
+    Chooses where the machine code for a source is written.
+    :param source: assembly source file.
+    :param directory: output directory (or None to write next to the source).
+    :param relative: path of the source relative to the tree it was found in.
+    :return: Path of the machine code file.
+    """
+    if directory is None:
+        return os.path.splitext(source)[0] + ".jw"
+    return os.path.join(directory, os.path.splitext(relative)[0] + ".jw")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="JW MIPS Assember")
     parser.add_argument('-o', '--output', metavar='file', help="Destination for binary file")
-    parser.add_argument('file', help="MIPS assembly source file")
+    parser.add_argument('-d', '--directory', metavar='dir',
+                        help="Destination for the binary files of a batch build (defaults to next to each source)")
+    parser.add_argument('-j', '--jobs', metavar='N', type=int, default=1,
+                        help="Number of sources to assemble in parallel during a batch build")
+    parser.add_argument('-O', '--optimise', action='store_true',
+                        help="Schedule the instructions of each basic block for the simulated machine")
+    parser.add_argument('-B', '--force', action='store_true', help="Reassemble sources even if they are up to date")
+    parser.add_argument('files', nargs='+', metavar='file', help="MIPS assembly source files or directories of them")
     args = parser.parse_args()
-    main(args)
\ No newline at end of file
+    if args.output is not None and (args.directory is not None or len(args.files) > 1 or os.path.isdir(args.files[0])):
+        parser.error("-o can only be used with a single source file, use -d for a batch build")
+    main(args)
@@ -0,0 +1,358 @@
+import time
+from classes.errors import DivergentCode
+from classes.instruction import Instruction
+from classes.memory_dump import MemoryDump
+from classes.register_file import RegisterFile
+try:
+    import numpy as np
+except ImportError:
+    np = None # Only needed by the batched engine, which reports it missing when it is constructed.
+
+
+class BatchedSimulator():
+    """
+    Executes one program architecturally over many memory images at once, each image being a lane.
+    Registers and memory are NumPy arrays shaped (lanes x registers) and (lanes x bytes), and every instruction
+    is executed across all the lanes at its pc as a single vectorised operation.
+    Lanes which diverge on a branch are masked off and the lanes at the lowest pc always run first,
+    so lanes reconverge where their paths join again.
+    Semantics follow the execution units except that lanes use 32 bit wraparound arithmetic
+    and bytes which were never written read as zero.
+    """
+    stack_size = 1000 * 4 # Bytes above the program the stack pointer starts at, as in the Simulator.
+    offsets = (24, 16, 8, 0) # Shifts of the bytes of a big endian word.
+
+    def __init__(self, images, pc, max_instructions=None, max_seconds=None):
+        """
+        Constructor for the BatchedSimulator class.
+        :param images: list of memory images of the same program (same addresses and entry point), one per lane.
+        :param pc: entry point of the program.
+        :param max_instructions: instructions after which a lane is stopped (or None for no limit).
+        :param max_seconds: wall clock seconds after which every lane still running is stopped (or None for no limit).
+        """
+        if np is None:
+            raise ImportError("The batched engine requires NumPy, install it with `pip install numpy`")
+        if not images:
+            raise ValueError("No memory images to run")
+        layout = images[0].keys()
+        for lane, image in enumerate(images):
+            if image.keys() != layout:
+                raise ValueError("Lane " + str(lane) + " does not have the same memory layout as lane 0")
+        self.images = images
+        self.lanes = len(images)
+        top = max(layout) + 1
+        self.size = top + self.stack_size + 4
+        self.loaded = np.zeros(self.size, dtype=bool) # Addresses in the images, the pc leaving them ends a lane.
+        self.loaded[list(layout)] = True
+        self.initial = np.zeros((self.lanes, self.size), dtype=np.uint8)
+        for lane, image in enumerate(images):
+            self.initial[lane] = self._unpack(image)
+        self.memory = self.initial.copy()
+        self.written = np.zeros((self.lanes, self.size), dtype=bool)
+        self.registers = np.zeros((self.lanes, RegisterFile.size), dtype=np.int32)
+        self.registers[:, 29] = top + self.stack_size # Initialise the stack pointer (1000 words).
+        self.pcs = np.full(self.lanes, pc, dtype=np.int64)
+        self.running = np.ones(self.lanes, dtype=bool)
+        self.decoded = {} # pc : Instruction decoded from the images.
+        self.text = np.zeros(self.size, dtype=bool) # Bytes of the decoded instructions.
+        self.modified = set() # pcs of instructions overwritten by a store, decoded again at every fetch.
+        self.faults = {} # Lane : reason it stopped early.
+        self.aborted = set() # Lanes stopped by the instruction budget or the time limit.
+        self.max_instructions = max_instructions
+        self.max_seconds = max_seconds
+        # Statistics
+        self.instructions_executed = np.zeros(self.lanes, dtype=np.int64)
+        self.steps = 0
+
+
+    def run(self):
+        """
+        Runs every lane until its pc leaves the program or it faults, exhausts its budget or runs out of time.
+        """
+        deadline = None if self.max_seconds is None else time.monotonic() + self.max_seconds
+        while True:
+            pcs = self.pcs[self.running]
+            if pcs.size == 0:
+                return
+            if deadline is not None and time.monotonic() > deadline:
+                for pc in np.unique(pcs):
+                    self._abort(np.flatnonzero(self.running & (self.pcs == pc)),
+                                "time limit of " + str(self.max_seconds) + " seconds exceeded", int(pc))
+                return
+            pc = int(pcs.min())
+            lanes = np.flatnonzero(self.running & (self.pcs == pc))
+            ins = self._fetch(pc, lanes)
+            if ins is None:
+                self.running[lanes] = False
+                continue
+            if self.max_instructions is not None:
+                exhausted = self.instructions_executed[lanes] >= self.max_instructions
+                if exhausted.any():
+                    self._abort(lanes[exhausted], "instruction budget of " + str(self.max_instructions) +
+                                " instructions exhausted", pc)
+                    lanes = lanes[~exhausted]
+                    if lanes.size == 0:
+                        continue
+            self.steps += 1
+            self.instructions_executed[lanes] += 1
+            self._execute(ins, lanes)
+
+
+    def register_values(self, lane):
+        """
+        Gets the final registers of a lane.
+        :param lane: lane number.
+        :return: List of integer register values indexed by register number.
+        """
+        return [int(value) for value in self.registers[lane]]
+
+
+    def memory_image(self, lane):
+        """
+        Gets the final memory of a lane in the form used by the Simulator.
+        Words which were written are encoded as the LSU would have written them.
+        :param lane: lane number.
+        :return: Dictionary of byte address to binary string.
+        """
+        image = dict(self.images[lane])
+        data, initial = self.memory[lane], self.initial[lane]
+        for address in sorted({int(a) & ~3 for a in np.flatnonzero(self.written[lane])}):
+            word = data[address:address + 4]
+            if address in image and (word == initial[address:address + 4]).all():
+                continue
+            binary = "{0:032b}".format(self._signed(int.from_bytes(bytes(word), "big")))
+            for i in range(4):
+                image[address + i] = binary[8 * i:8 * i + 8]
+        return image
+
+
+    def _unpack(self, image):
+        """
+        Converts a memory image into bytes, reading words formatted with a sign as two's complement.
+        :param image: dictionary of byte address to binary string.
+        :return: Array of bytes.
+        """
+        data = np.zeros(self.size, dtype=np.uint8)
+        for address in {address & ~3 for address in image}:
+            if all(address + i in image for i in range(4)):
+                value = MemoryDump._value(tuple(image[address + i] for i in range(4))) & 0xFFFFFFFF
+                data[address:address + 4] = tuple(value.to_bytes(4, "big"))
+            else:
+                for i in range(4):
+                    if address + i in image:
+                        data[address + i] = int(image[address + i], 2)
+        return data
+
+
+    def _fetch(self, pc, lanes):
+        """
+        Decodes the instruction the lanes at a pc execute next.
+        :param pc: address of the instruction.
+        :param lanes: array of the lanes at the pc.
+        :return: Instruction object or None if the address is not in the program.
+        """
+        if pc < 0 or pc + 4 > self.size or not self.loaded[pc:pc + 4].all():
+            return None
+        if pc not in self.modified:
+            ins = self.decoded.get(pc)
+            if ins is None:
+                image = self.images[0]
+                ins = self._decode(pc, image[pc] + image[pc + 1] + image[pc + 2] + image[pc + 3])
+                self.decoded[pc] = ins
+                self.text[pc:pc + 4] = True
+            return ins
+        words = self.memory[lanes, pc:pc + 4]
+        if (words != words[0]).any():
+            raise DivergentCode("Lanes execute different instructions at 0x{0:08x}".format(pc))
+        word = words[0]
+        if (word == self.initial[0, pc:pc + 4]).all():
+            image = self.images[0]
+            return self._decode(pc, image[pc] + image[pc + 1] + image[pc + 2] + image[pc + 3])
+        return self._decode(pc, "{0:032b}".format(self._signed(int.from_bytes(bytes(word), "big"))))
+
+
+    @staticmethod
+    def _decode(pc, raw_instruction):
+        """
+        Decodes a word of memory.
+        :param pc: address of the instruction.
+        :param raw_instruction: binary string of the word.
+        :return: Instruction object.
+        """
+        return Instruction({"pc": pc, "raw_instruction": raw_instruction, "prediction": None, "block": 0})
+
+
+    def _execute(self, ins, lanes):
+        """
+        Executes an instruction across lanes and moves their pcs on.
+        :param ins: Instruction object.
+        :param lanes: array of the lanes executing it.
+        """
+        name, pc = ins.name, ins.pc
+        next_pc = pc + 4
+        if name in ["add", "sub", "and", "or", "xor", "nor", "slt", "sll", "sra", "mfhi", "mflo"]:
+            s, t = self._operand(lanes, ins.rs), self._operand(lanes, ins.rt)
+            if name == "add":
+                value = s + t
+            elif name == "sub":
+                value = s - t
+            elif name == "and":
+                value = s & t
+            elif name == "or":
+                value = s | t
+            elif name == "xor":
+                value = s ^ t
+            elif name == "nor":
+                value = ~(s | t)
+            elif name == "slt":
+                value = s < t
+            elif name == "sll":
+                value = t << ins.shift
+            elif name == "sra":
+                value = t >> ins.shift
+            elif name == "mfhi":
+                value = self._operand(lanes, 32)
+            else:
+                value = self._operand(lanes, 33)
+            self._write(lanes, ins.rd, value)
+        elif name in ["addi", "andi", "ori", "xori", "slti", "lui"]:
+            s = self._operand(lanes, ins.rs)
+            if name == "addi":
+                value = s + ins.imm
+            elif name == "andi":
+                value = s & ins.imm
+            elif name == "ori":
+                value = s | ins.imm
+            elif name == "xori":
+                value = s ^ ins.imm
+            elif name == "slti":
+                value = s < ins.imm
+            else:
+                value = np.full(len(lanes), ins.imm << 16, dtype=np.int64)
+            self._write(lanes, ins.rt, value)
+        elif name == "lw":
+            lanes, addresses = self._addresses(ins, lanes)
+            data = self.memory[lanes[:, None], addresses[:, None] + np.arange(4)].astype(np.int64)
+            self._write(lanes, ins.rt, (data << np.array(self.offsets)).sum(axis=1))
+        elif name == "sw":
+            lanes, addresses = self._addresses(ins, lanes)
+            self._store(lanes, addresses, self._operand(lanes, ins.rt))
+        elif name == "mult":
+            self._write(lanes, 33, self._operand(lanes, ins.rs) * self._operand(lanes, ins.rt))
+        elif name == "div":
+            s, t = self._operand(lanes, ins.rs), self._operand(lanes, ins.rt)
+            zero = t == 0
+            if zero.any():
+                self._fault(lanes[zero], "division by zero", pc)
+                lanes, s, t = lanes[~zero], s[~zero], t[~zero]
+            self._write(lanes, 33, s // t)
+            self._write(lanes, 32, s % t)
+        elif name in ["beq", "bne", "blez", "bgtz"]:
+            s, t = self._operand(lanes, ins.rs), self._operand(lanes, ins.rt)
+            if name == "beq":
+                taken = s == t
+            elif name == "bne":
+                taken = s != t
+            elif name == "blez":
+                taken = s <= 0
+            else:
+                taken = s > 0
+            next_pc = np.where(taken, pc + (ins.imm << 2), pc + 4)
+        elif name == "j":
+            next_pc = ins.address
+        elif name == "jal":
+            self._write(lanes, 31, np.full(len(lanes), pc + 4, dtype=np.int64))
+            next_pc = ins.address
+        elif name == "jr":
+            next_pc = self._operand(lanes, ins.rs)
+        elif name == "syscall": # Lanes cannot share the host's console and files.
+            self._fault(lanes, "syscall not supported in batched mode", pc)
+        self.pcs[lanes] = next_pc
+
+
+    def _operand(self, lanes, register):
+        """
+        Reads a register across lanes.
+        :param lanes: array of lanes.
+        :param register: register number (None reads as zero, as for unused operands).
+        :return: Array of 64 bit values so intermediate results cannot overflow before they are wrapped.
+        """
+        if register is None:
+            return np.zeros(len(lanes), dtype=np.int64)
+        return self.registers[lanes, register].astype(np.int64)
+
+
+    def _write(self, lanes, register, value):
+        """
+        Writes a result to a register across lanes, wrapping it to 32 bits.
+        :param lanes: array of lanes.
+        :param register: register number, writes to the zero register are discarded.
+        :param value: array of results.
+        """
+        if register != 0:
+            self.registers[lanes, register] = np.asarray(value, dtype=np.int64).astype(np.int32)
+
+
+    def _addresses(self, ins, lanes):
+        """
+        Computes the addresses a memory instruction accesses across lanes, faulting lanes outside memory.
+        :param ins: Instruction object.
+        :param lanes: array of lanes.
+        :return: Array of the lanes still executing and array of their addresses.
+        """
+        addresses = self._operand(lanes, ins.rs) + ins.imm
+        outside = (addresses < 0) | (addresses + 4 > self.size)
+        if outside.any():
+            self._fault(lanes[outside], "access outside memory", ins.pc)
+            lanes, addresses = lanes[~outside], addresses[~outside]
+        return lanes, addresses
+
+
+    def _store(self, lanes, addresses, values):
+        """
+        Stores words across lanes, noting any decoded instruction they overwrite.
+        :param lanes: array of lanes.
+        :param addresses: array of the address each lane stores to.
+        :param values: array of the values to store.
+        """
+        data = ((values & 0xFFFFFFFF)[:, None] >> np.array(self.offsets)) & 0xFF
+        targets = addresses[:, None] + np.arange(4)
+        self.memory[lanes[:, None], targets] = data.astype(np.uint8)
+        self.written[lanes[:, None], targets] = True
+        overwritten = targets[self.text[targets]]
+        for address in {int(address) & ~3 for address in overwritten}:
+            self.decoded.pop(address, None)
+            self.modified.add(address)
+
+
+    def _fault(self, lanes, reason, pc):
+        """
+        Stops lanes which cannot carry on.
+        :param lanes: array of lanes.
+        :param reason: description of the fault.
+        :param pc: address of the instruction at fault.
+        """
+        self.running[lanes] = False
+        for lane in lanes:
+            self.faults[int(lane)] = reason + " at 0x{0:08x}".format(pc)
+
+
+    def _abort(self, lanes, reason, pc):
+        """
+        Stops lanes which have hit a limit.
+        :param lanes: array of lanes.
+        :param reason: description of the limit.
+        :param pc: address of the next instruction of the lanes.
+        """
+        self._fault(lanes, reason, pc)
+        self.aborted.update(int(lane) for lane in lanes)
+
+
+    @staticmethod
+    def _signed(value):
+        """
+        Interprets a 32 bit word as two's complement.
+        :param value: unsigned integer value of the word.
+        :return: Signed integer value.
+        """
+        return value - (1 << 32) if value & 0x80000000 else value
@@ -1,5 +1,4 @@
 from enum import IntEnum
-import curses
 
 class BranchPredictor:
     """
@@ -16,13 +15,17 @@ class BranchPredictor:
         strongly_taken = 3
 
 
-    # Define class variables for all instances.
-    total_predictions = 1
-    incorrect_predictions = 0
-    current_state = State.weakly_taken
-    return_address_stack = []
-    block = 0
-    in_recovery = False
+    def __init__(self):
+        """
+        Constructor for the BranchPredictor class.
+        State belongs to the instance, so simulators sharing a process (or forked from one another) are independent.
+        """
+        self.total_predictions = 1
+        self.incorrect_predictions = 0
+        self.current_state = self.State.weakly_taken
+        self.return_address_stack = []
+        self.block = 0
+        self.in_recovery = False
 
 
     def make_prediction(self, raw_instruction, pc):
@@ -74,37 +77,22 @@ class BranchPredictor:
                 break
 
 
-    @classmethod
-    def update_prediction(cls, branch_taken):
+    def update_prediction(self, branch_taken):
         """
         Based on the actual outcome of a branch instruction, update the global predictor state.
         :param branch_taken: Boolean representing whether the branch was actually taken.
         """
         if branch_taken:
-            cls.current_state = cls.State(min(cls.current_state + 1, 3))
+            self.current_state = self.State(min(self.current_state + 1, 3))
         else:
-            cls.current_state = cls.State(max(cls.current_state - 1, 0))
+            self.current_state = self.State(max(self.current_state - 1, 0))
 
 
-    def print(self, stdscr):
+    def snapshot(self):
         """
-        Prints the contents of the reservation station to the terminal.
-        :param stdscr: terminal to print to.
+        Builds an immutable snapshot of the branch predictor for the renderer.
+        :return: Current state, recovery mode and prediction rate.
         """
-        stdscr.addstr(7, 10, "BRANCH PREDICTOR".ljust(48), curses.A_BOLD)
-        stdscr.addstr(9, 10,
-                      "Current State: " +
-                      str(self.current_state) +
-                      ", Recovery Mode: " +
-                      str(self.in_recovery).ljust(24), curses.color_pair(7))
-        stdscr.addstr(10, 10,
-                      "Branch Prediction Rate: " +
-                      str(round(
-                          (self.total_predictions - self.incorrect_predictions)
-                          / self.total_predictions * 100,
-                          2))
-                      + "%".ljust(8),
-                      curses.color_pair(7))
-
-
-
+        return (self.current_state,
+                self.in_recovery,
+                round((self.total_predictions - self.incorrect_predictions) / self.total_predictions * 100, 2))
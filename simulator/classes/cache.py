@@ -0,0 +1,261 @@
+class MainMemory():
+    """
+    Timing model of main memory, the last level of the cache hierarchy.
+    """
+    def __init__(self, latency):
+        """
+        Constructor for the MainMemory class.
+        :param latency: cycles taken by every access.
+        """
+        self.name = "MEM"
+        self.latency = latency
+        self.reads = 0
+        self.writes = 0
+
+
+    def probe(self, address, write=False):
+        """
+        Finds how long an access would take without making it.
+        :param address: address being accessed.
+        :param write: whether the access is a write.
+        :return: Cycles the access would take.
+        """
+        return self.latency
+
+
+    def access(self, address, write=False):
+        """
+        Accesses main memory.
+        :param address: address being accessed.
+        :param write: whether the access is a write.
+        :return: Cycles taken by the access.
+        """
+        if write:
+            self.writes += 1
+        else:
+            self.reads += 1
+        return self.latency
+
+
+    def snapshot(self):
+        """
+        Builds an immutable snapshot of the memory statistics.
+        :return: Name, reads and writes.
+        """
+        return self.name, self.reads, self.writes
+
+
+class Cache():
+    """
+    Timing model of a set associative cache.
+    Only tags are tracked, the data itself always lives in the simulator's main memory.
+    """
+    replacement_policies = ["lru", "plru"]
+
+    def __init__(self, name, next_level, size, associativity, line_size, hit_latency,
+                 replacement="lru", write_back=True, write_allocate=True, mshrs=0):
+        """
+        Constructor for the Cache class.
+        :param name: name of the cache level.
+        :param next_level: Cache or MainMemory backing this cache.
+        :param size: capacity in bytes.
+        :param associativity: number of ways per set.
+        :param line_size: bytes per line.
+        :param hit_latency: cycles taken by a hit.
+        :param replacement: lru or plru (tree pseudo LRU, requires a power of two associativity).
+        :param write_back: write back dirty lines on eviction (otherwise write through).
+        :param write_allocate: allocate a line on a write miss (otherwise write around).
+        :param mshrs: miss status holding registers limiting the line fills in flight (0 for no limit).
+        """
+        if replacement not in self.replacement_policies:
+            raise ValueError("Unsupported replacement policy: " + str(replacement))
+        if replacement == "plru" and associativity & (associativity - 1):
+            raise ValueError("PLRU replacement requires a power of two associativity")
+        self.name = name
+        self.next_level = next_level
+        self.associativity = associativity
+        self.line_size = line_size
+        self.hit_latency = hit_latency
+        self.replacement = replacement
+        self.write_back = write_back
+        self.write_allocate = write_allocate
+        self.mshrs = mshrs
+        self.filling = {} # Line : cycle at which its fill completes, for accesses made with a cycle.
+        self.num_sets = max(1, size // (line_size * associativity))
+        self.tags = [[None] * associativity for _ in range(self.num_sets)]
+        self.dirty = [[False] * associativity for _ in range(self.num_sets)]
+        if replacement == "lru":
+            self.order = [list(range(associativity)) for _ in range(self.num_sets)] # Least recently used first.
+        else:
+            self.tree = [[0] * max(1, associativity - 1) for _ in range(self.num_sets)]
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+        self.merged = 0 # Misses to a line whose fill was already in flight.
+        self.mshr_stalls = 0 # Cycles an access was turned away because every MSHR was in use, counted by the simulator.
+
+
+    def accepts(self, address, cycle):
+        """
+        Checks whether an access can start this cycle.
+        Hits and misses to a line already being filled always can, other misses need a free MSHR.
+        :param address: address being accessed.
+        :param cycle: current clock cycle.
+        :return: Boolean representing whether the access can start.
+        """
+        if not self.mshrs:
+            return True
+        self.filling = {line: fill for line, fill in self.filling.items() if fill > cycle}
+        line = address // self.line_size
+        if line in self.filling or line // self.num_sets in self.tags[line % self.num_sets]:
+            return True
+        return len(self.filling) < self.mshrs
+
+
+    def probe(self, address, write=False, cycle=None):
+        """
+        Finds how long an access would take without making it, leaving the contents and statistics of every level alone.
+        :param address: address being accessed.
+        :param write: whether the access is a write.
+        :param cycle: current clock cycle, needed to account for a line which is still being filled.
+        :return: Cycles the access would take.
+        """
+        line = address // self.line_size
+        latency = self.hit_latency
+        if line // self.num_sets in self.tags[line % self.num_sets]:
+            fill = self.filling.get(line)
+            if cycle is not None and fill is not None and fill > cycle:
+                latency += fill - cycle
+        elif write and not self.write_allocate:
+            return latency + self.next_level.probe(address, True)
+        else:
+            latency += self.next_level.probe(address, False)
+        if write and not self.write_back:
+            latency += self.next_level.probe(address, True)
+        return latency
+
+
+    def access(self, address, write=False, cycle=None):
+        """
+        Accesses the cache, filling from the next level on a miss.
+        :param address: address being accessed.
+        :param write: whether the access is a write.
+        :param cycle: current clock cycle, needed to merge misses to a line which is still being filled.
+        :return: Cycles taken by the access.
+        """
+        line = address // self.line_size
+        index, tag = line % self.num_sets, line // self.num_sets
+        ways = self.tags[index]
+        latency = self.hit_latency
+        if tag in ways:
+            way = ways.index(tag)
+            fill = self.filling.get(line)
+            if cycle is not None and fill is not None and fill > cycle:
+                self.misses += 1
+                self.merged += 1
+                latency += fill - cycle
+            else:
+                self.hits += 1
+            self._touch(index, way)
+            if write:
+                if self.write_back:
+                    self.dirty[index][way] = True
+                else:
+                    latency += self.next_level.access(address, True)
+            return latency
+        self.misses += 1
+        if write and not self.write_allocate:
+            return latency + self.next_level.access(address, True)
+        latency += self.next_level.access(address, False)
+        way = self._victim(index)
+        if ways[way] is not None:
+            self.evictions += 1
+            if self.dirty[index][way]:
+                # The write back happens off the critical path of this access.
+                self.writebacks += 1
+                self.next_level.access((ways[way] * self.num_sets + index) * self.line_size, True)
+        ways[way] = tag
+        self.dirty[index][way] = write and self.write_back
+        if cycle is not None:
+            self.filling[line] = cycle + latency - self.hit_latency
+        if write and not self.write_back:
+            latency += self.next_level.access(address, True)
+        self._touch(index, way)
+        return latency
+
+
+    def _touch(self, index, way):
+        """
+        Updates the replacement state of a set to mark a way as most recently used.
+        :param index: set index.
+        :param way: way accessed.
+        """
+        if self.replacement == "lru":
+            order = self.order[index]
+            order.remove(way)
+            order.append(way)
+        else:
+            tree, node, span = self.tree[index], 0, self.associativity
+            while span > 1:
+                span //= 2
+                right = way % (span * 2) >= span
+                tree[node] = 0 if right else 1 # Point away from the way just used.
+                node = 2 * node + (2 if right else 1)
+
+
+    def _victim(self, index):
+        """
+        Chooses the way to replace in a set, preferring invalid ways.
+        :param index: set index.
+        :return: Way to replace.
+        """
+        ways = self.tags[index]
+        if None in ways:
+            return ways.index(None)
+        if self.replacement == "lru":
+            return self.order[index][0]
+        tree, node, way, span = self.tree[index], 0, 0, self.associativity
+        while span > 1:
+            span //= 2
+            if tree[node]:
+                way += span
+                node = 2 * node + 2
+            else:
+                node = 2 * node + 1
+        return way
+
+
+    def snapshot(self):
+        """
+        Builds an immutable snapshot of the cache statistics.
+        :return: Name, hits, misses, evictions, write backs, merged misses and MSHR stalls.
+        """
+        return self.name, self.hits, self.misses, self.evictions, self.writebacks, self.merged, self.mshr_stalls
+
+
+def build_hierarchy(l1i, l1d, l2, memory_latency):
+    """
+    Builds the cache hierarchy described by the configuration in constants.
+    :param l1i: L1 instruction cache configuration (or None for no cache).
+    :param l1d: L1 data cache configuration (or None for no cache).
+    :param l2: unified L2 cache configuration (or None for no L2).
+    :param memory_latency: cycles taken by a main memory access.
+    :return: Instruction cache, data cache, list of every cache level and main memory.
+    """
+    memory = MainMemory(memory_latency)
+    levels = []
+    backing = memory
+    if l2 is not None:
+        backing = Cache("L2", memory, **l2)
+    instruction_cache, data_cache = None, None
+    if l1i is not None:
+        instruction_cache = Cache("L1I", backing, **l1i)
+        levels.append(instruction_cache)
+    if l1d is not None:
+        data_cache = Cache("L1D", backing, **l1d)
+        levels.append(data_cache)
+    if backing is not memory:
+        levels.append(backing)
+    return instruction_cache, data_cache, levels, memory
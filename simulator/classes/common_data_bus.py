@@ -0,0 +1,81 @@
+from collections import deque
+from classes.constants import cdb_width, cdb_latency
+
+
+class CommonDataBus:
+    """
+    Common data bus broadcasting finished results to the re-order buffer and the reservation station.
+    """
+    def __init__(self, reorder_buffer, reservation_station, width=cdb_width, latency=cdb_latency):
+        """
+        Constructor for the CommonDataBus class.
+        :param reorder_buffer: re-order buffer to mark results ready in.
+        :param reservation_station: reservation station whose waiting instructions capture results.
+        :param width: number of results which can be broadcast per cycle.
+        :param latency: cycles between an instruction finishing and its result being broadcast.
+        A latency of 0 bypasses results straight to dependents issuing in the next cycle.
+        """
+        self.reorder_buffer = reorder_buffer
+        self.reservation_station = reservation_station
+        self.width = width
+        self.latency = latency
+        self.pending = deque() # Queue of (cycle the result can be broadcast, instruction)
+        # Statistics
+        self.broadcasts = 0
+        self.contended_cycles = 0 # Cycles in which results were held back by the bus width.
+        self.delayed_results = 0 # Total result-cycles spent waiting for a free bus slot.
+        self.max_pending = 0
+
+
+    def submit(self, instruction, cycle):
+        """
+        Queues the result of an instruction which has finished execution.
+        Instructions without a register result (stores and branches) do not need the bus.
+        :param instruction: Instruction which has finished execution.
+        :param cycle: current clock cycle.
+        """
+        if not instruction.result:
+            self.reorder_buffer.mark_ready(instruction.rob_entry)
+            return
+        self.pending.append((cycle + self.latency, instruction))
+        self.max_pending = max(self.max_pending, len(self.pending))
+
+
+    def tick(self, cycle):
+        """
+        Broadcasts up to `width` results which are available in this cycle, oldest first.
+        :param cycle: current clock cycle.
+        """
+        sent = 0
+        while self.pending and self.pending[0][0] <= cycle and sent < self.width:
+            _, instruction = self.pending.popleft()
+            self.reorder_buffer.mark_ready(instruction.rob_entry)
+            self.reservation_station.capture(instruction)
+            sent += 1
+        self.broadcasts += sent
+        waiting = 0
+        for available, _ in self.pending:
+            if available > cycle:
+                break
+            waiting += 1
+        if waiting:
+            self.contended_cycles += 1
+            self.delayed_results += waiting
+
+
+    def clear_block(self, instruction_block, thread=0):
+        """
+        Drops results of instructions after a particular speculative block.
+        :param instruction_block: Instruction block to delete (and all subsequent blocks).
+        :param thread: hardware thread the block belongs to.
+        """
+        self.pending = deque(item for item in self.pending
+                             if item[1].thread != thread or item[1].block < instruction_block)
+
+
+    def snapshot(self):
+        """
+        Builds an immutable snapshot of the bus statistics.
+        :return: Broadcasts, contended cycles, delayed results and results currently pending.
+        """
+        return self.broadcasts, self.contended_cycles, self.delayed_results, len(self.pending)
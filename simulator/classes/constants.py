@@ -1,3 +1,40 @@
 instruction_time = 0.25 # Time taken per instruction.
 debug = False          # Define whether the program should be run in `debug` mode.
 N = 4                  # Define N to represent an n-way superscalar design.
+snapshot_queue_size = 2 # Number of state snapshots the renderer may fall behind by before frames are dropped.
+input_poll_time = 0.05  # Time the renderer waits for a key press before redrawing.
+fetch_queue_size = 16   # Depth of the instruction fetch queue between fetch and decode.
+taken_branches_per_fetch = 2 # Number of predicted taken branches fetch may follow in a single cycle.
+fetch_policy = "icount" # Order SMT threads are offered fetch slots: round_robin or icount (fewest waiting first).
+fetch_threads = 2       # Number of SMT threads fetch may take instructions from in a single cycle.
+reservation_station_size = 20 # Number of instructions the reservation station can hold.
+cdb_width = N           # Number of results the common data bus can broadcast per cycle.
+cdb_latency = 0         # Cycles between a result being produced and broadcast (0 bypasses to the next cycle).
+# The assembler's -O scheduler (assembler/classes/scheduler.py) models the machine from N, the timing tables,
+# alu_units and load_store_ports.
+# Functional unit timing as opcode : (latency, initiation interval). Unlisted opcodes take (1, 1).
+# An initiation interval of 1 is fully pipelined, equal to the latency is unpipelined.
+lsu_timing = {"lw": (2, 2), "sw": (2, 2)}
+alu_timing = {"div": (3, 3)}
+beu_timing = {}
+alu_units = 2           # Number of execution units with an ALU (the first also has the LSU and BEU).
+# Cache hierarchy with sizes in bytes and latencies in cycles. Set a level to None to remove it.
+# Replacement is lru or plru, a write_back of False writes through and a write_allocate of False writes around.
+# The data cache is non-blocking with `mshrs` outstanding line fills (0 leaves misses unlimited).
+# Loads and stores take the lsu_timing latency plus their L1D latency, hit or miss (a forwarded load skips the cache).
+# Fetch covers one cycle of an L1I access, a longer hit or a miss stalls fetch for the remainder.
+l1i_cache = {"size": 1024, "associativity": 2, "line_size": 16, "hit_latency": 1, "replacement": "lru"}
+l1d_cache = {"size": 1024, "associativity": 2, "line_size": 16, "hit_latency": 1, "replacement": "lru",
+             "write_back": True, "write_allocate": True, "mshrs": 4}
+l2_cache = {"size": 8192, "associativity": 4, "line_size": 32, "hit_latency": 6, "replacement": "plru",
+            "write_back": True, "write_allocate": True}
+memory_latency = 20     # Cycles taken by an access to main memory.
+load_store_ports = 2    # Number of execution units with an LSU (the first also has the BEU).
+result_cache_dir = "~/.cache/jw_simulator" # Directory finished simulation results are cached in.
+result_cache_size = 64 * 1024 * 1024 # Bytes of results kept before the least recently used are evicted.
+functional_hot_threshold = 2 # Times a basic block is interpreted in functional mode before it is translated.
+functional_block_size = 64 # Most instructions translated into a single block in functional mode.
+progress_interval = 10000 # Cycles between the records of a progress stream.
+watchdog_cycles = 10000 # Cycles without a commit before a simulation is aborted (0 to never abort).
+multicore_window = 100 # Cycles the cores of a multi-core simulation run between exchanging their writes.
+syscall_buffer_size = 64 * 1024 # Bytes of program output buffered before they are written to the host.
@@ -0,0 +1,167 @@
+import json, os
+from classes.register_file import RegisterFile
+
+
+class Debugger():
+    """
+    Breakpoints and watchpoints checked as instructions commit, so they see the architectural state only.
+    A breakpoint fires when an instruction at its pc commits or once its cycle is reached, a watchpoint fires
+    when a committed write changes the register or memory word it watches and a condition fires when its
+    expression becomes true.
+    Conditions are Python expressions over the register names, pc, cycle and mem(address), e.g. "v0 > 10".
+    """
+    # Names a condition may refer to besides the registers.
+    variables = ["pc", "cycle", "mem"]
+
+    def __init__(self, breakpoints=(), cycles=(), registers=(), addresses=(), conditions=()):
+        """
+        Constructor for the Debugger class.
+        :param breakpoints: pcs to stop at when their instruction commits.
+        :param cycles: cycles to stop at.
+        :param registers: register numbers to watch.
+        :param addresses: addresses of memory words to watch.
+        :param conditions: expressions to stop at when they become true.
+        """
+        self.breakpoints = set(breakpoints)
+        self.cycles = sorted(cycles)
+        self.registers = {register: None for register in registers} # Register : last value seen.
+        self.addresses = {address & ~3: None for address in addresses} # Word address : last value seen.
+        self.conditions = []
+        for text in conditions:
+            code = compile(text, "<condition>", "eval")
+            unknown = [name for name in code.co_names if name not in RegisterFile.names and name not in self.variables]
+            if unknown:
+                raise ValueError("Unknown name `" + unknown[0] + "' in condition `" + text + "'")
+            self.conditions.append((text, code))
+        self.holds = [False] * len(self.conditions) # Whether each condition held at the last check.
+
+
+    @staticmethod
+    def load_labels(symbol_file):
+        """
+        Loads the labels written by the assembler alongside a program.
+        :param symbol_file: symbol file written by the assembler.
+        :return: Dictionary of label to address (empty if there is no symbol file).
+        """
+        if not os.path.exists(symbol_file):
+            return {}
+        f = open(symbol_file, "r")
+        labels = json.load(f)["labels"]
+        f.close()
+        return labels
+
+
+    @staticmethod
+    def address(location, labels):
+        """
+        Resolves a location given on the command line.
+        :param location: address (hex is accepted) or label.
+        :param labels: dictionary of label to address.
+        :return: Address of the location.
+        """
+        if location in labels:
+            return labels[location]
+        try:
+            return int(location, 0)
+        except ValueError:
+            raise ValueError("Unknown location `" + location + "' (not an address or a label in the symbol file)")
+
+
+    @staticmethod
+    def register(name):
+        """
+        Resolves a register given on the command line.
+        :param name: register name, with or without the $, or number.
+        :return: Register number or None if it is not a register.
+        """
+        name = name.lstrip("$")
+        if name in RegisterFile.names:
+            return RegisterFile.names.index(name)
+        if name.isdigit() and int(name) < RegisterFile.size:
+            return int(name)
+        return None
+
+
+    def start(self, simulator):
+        """
+        Records the initial values of the watched registers and words.
+        :param simulator: Simulator about to run.
+        """
+        for register in self.registers:
+            self.registers[register] = simulator.register_file.value[register]
+        for address in self.addresses:
+            self.addresses[address] = self._word(simulator.memory, address)
+        self.holds = [bool(self._evaluate(code, simulator, None)) for _, code in self.conditions]
+
+
+    def check_cycle(self, simulator):
+        """
+        Checks the cycle breakpoints.
+        :param simulator: Simulator being debugged.
+        :return: Description of the breakpoint which fired or None.
+        """
+        if self.cycles and simulator.clock >= self.cycles[0]:
+            return "cycle " + str(self.cycles.pop(0))
+        return None
+
+
+    def check_commit(self, simulator, instruction):
+        """
+        Checks the breakpoints, watchpoints and conditions against an instruction which has just committed.
+        :param simulator: Simulator being debugged.
+        :param instruction: Instruction which has just committed.
+        :return: Description of what fired or None.
+        """
+        reasons = []
+        if instruction.pc in self.breakpoints:
+            reasons.append("pc 0x{0:08x}".format(instruction.pc))
+        for register in self.registers.keys() & instruction.result.keys():
+            value = simulator.register_file.value[register]
+            if value != self.registers[register]:
+                reasons.append("$" + RegisterFile.names[register] + " " + str(self.registers[register]) +
+                               " -> " + str(value))
+                self.registers[register] = value
+        if instruction.store is not None and self.addresses:
+            address = instruction.store[0]
+            for word in {address & ~3, (address + 3) & ~3} & self.addresses.keys():
+                value = self._word(simulator.memory, word)
+                if value != self.addresses[word]:
+                    reasons.append("mem[0x{0:08x}] ".format(word) + str(self.addresses[word]) + " -> " + str(value))
+                    self.addresses[word] = value
+        for i, (text, code) in enumerate(self.conditions):
+            holds = bool(self._evaluate(code, simulator, instruction.pc))
+            if holds and not self.holds[i]:
+                reasons.append(text)
+            self.holds[i] = holds
+        return ", ".join(reasons) if reasons else None
+
+
+    @staticmethod
+    def _evaluate(code, simulator, pc):
+        """
+        Evaluates a condition against the architectural state.
+        :param code: compiled expression.
+        :param simulator: Simulator being debugged.
+        :param pc: address of the instruction which has just committed.
+        :return: Value of the expression (False if it cannot be evaluated, e.g. when reading outside memory).
+        """
+        names = dict(zip(RegisterFile.names, simulator.register_file.value))
+        names.update(pc=pc, cycle=simulator.clock, mem=lambda address: Debugger._word(simulator.memory, address))
+        try:
+            return eval(code, {"__builtins__": {}}, names)
+        except (TypeError, ArithmeticError):
+            return False
+
+
+    @staticmethod
+    def _word(memory, address):
+        """
+        Reads a word of memory as the LSU does.
+        :param memory: main memory.
+        :param address: address of the word.
+        :return: Integer representation of word or None if it is not in memory.
+        """
+        try:
+            return int(memory[address] + memory[address + 1] + memory[address + 2] + memory[address + 3], 2)
+        except (KeyError, ValueError):
+            return None
@@ -7,7 +7,7 @@ class InvalidOpcode(Exception):
 
 class Interrupt(Exception):
     """
-    This Exception is raised when a syscall is used.
+    This Exception is raised when the program has finished, by running off the end of its code or by an exit syscall.
     """
     pass
 
@@ -26,8 +26,36 @@ class AlreadyExecutingInstruction(Exception):
     pass
 
 
+class NoFreeMSHR(AlreadyExecutingInstruction):
+    """
+    This Exception is raised when a load cannot start because every MSHR of the data cache is in use.
+    """
+    pass
+
+
 class ResultNotReady(Exception):
     """
     This Exception is raised when a result is asked for in a ROB entry that is not yet ready.
     """
-    pass
\ No newline at end of file
+    pass
+
+class DivergentCode(Exception):
+    """
+    This Exception is raised when lanes of the batched engine would execute different instructions at the same pc.
+    """
+    pass
+
+
+class SimulationAborted(Exception):
+    """
+    This Exception is raised when a simulation exceeds its cycle or time budget, stops making progress
+    or makes an invalid system call.
+    """
+    pass
+
+
+class InvalidSyscall(Exception):
+    """
+    This Exception is raised when a syscall requests an unknown service or passes arguments it cannot use.
+    """
+    pass
@@ -1,9 +1,18 @@
-from classes.errors import UnsupportedInstruction, AlreadyExecutingInstruction
-from classes.branch_predictor import BranchPredictor
+from classes.errors import UnsupportedInstruction, AlreadyExecutingInstruction, NoFreeMSHR
+from classes.constants import lsu_timing, alu_timing, beu_timing
 
 
 class ExecutionUnit():
-    def __init__(self, memory, registers, alu=True, lsu=True, beu=True):
+    # Opcodes handled by each subunit.
+    subunits = {
+        "lsu" : ["lw", "sw"],
+        "alu" : ["add", "sub", "and", "or", "xor", "nor", "slt", "slti",
+                 "addi", "andi", "ori", "xori", "lui", "sll", "sra",
+                 "mult", "div", "mfhi", "mflo"],
+        "beu" : ["beq", "bne", "blez", "bgtz", "j", "jal", "jr"]
+    }
+
+    def __init__(self, memory, registers, alu=True, lsu=True, beu=True, data_cache=None, branch_predictors=None):
         """
         Constructor for ExecutionUnit class.
         :param instruction: Instruction object to execute.
@@ -11,56 +20,101 @@ class ExecutionUnit():
         :param alu: ALU capability.
         :param lsu: LSU capability.
         :param beu: BEU capability.
+        :param data_cache: L1 data cache timing model used by the LSU (or None for ideal memory).
+        :param branch_predictors: branch predictor of each hardware thread, which the BEU trains with branch outcomes.
         """
         self.mem = memory
         self.reg = registers # Each EU has it's own register file.
         self.busy_subunits = []
+        self.next_free = {} # Subunit : first cycle at which it can accept another instruction.
+        self.in_flight = [] # List of (cycle the result is produced, instruction, new pc).
+        self.busy_cycles = {} # Subunit : cycles spent unable to accept another instruction.
         # Define capabilities of execution unit.
         if alu:
             self.alu = self.ALU()
         if lsu:
-            self.lsu = self.LSU(self.mem)
+            self.lsu = self.LSU(self.mem, data_cache)
         if beu:
-            self.beu = self.BEU()
+            self.beu = self.BEU(branch_predictors)
 
 
-    def execute(self, ins, rob):
+    def execute(self, ins, rob, cycle):
         """
-        Executes the stored Instruction object.
+        Issues an Instruction object to the appropriate subunit.
+        The result is computed now but only handed back by complete() once the subunit's latency has elapsed.
+        Loads and stores take longer by the latency of their data cache access, hit or miss.
+        A load which would need an MSHR when none is free raises NoFreeMSHR, but only once the port itself is free.
         :param ins: instruction to execute.
         :param rob: re-order buffer.
+        :param cycle: current clock cycle.
         """
+        subunit = self._get_subunit(ins)
+        latency, interval = 1, 1
+        if subunit is not None:
+            # Catch instructions that cannot be executed by this EU.
+            if not hasattr(self, subunit):
+                raise UnsupportedInstruction("`" + ins.name + "` on EU: " + str(id(self)))
         source, target = self._get_operands(ins, rob)
+        if subunit is not None:
+            self._check_subunit_status(subunit, cycle)
+            if subunit == "lsu" and not self.lsu.accepts(ins, source, rob, cycle):
+                raise NoFreeMSHR("lsu on EU: " + str(id(self)) + " has no free MSHR")
+            self.busy_subunits.append(subunit)
+            latency, interval = getattr(self, subunit).timing.get(ins.name, (1, 1))
+            self.next_free[subunit] = cycle + interval
+            self.busy_cycles[subunit] = self.busy_cycles.get(subunit, 0) + interval
         new_pc = None
-        try:
-            if ins.cycles != 1:
-                ins.cycles -= 1
-                return ins.pc + 4
-            # LOAD/STORE
-            if ins.name in ["lw", "sw"]:
-                self._check_subunit_status("lsu")
-                self.lsu.execute(ins, source, target, rob)
-            # ALU Operations
-            elif ins.name in ["add", "sub", "and", "or", "xor", "nor", "slt", "slti",
-                              "addi", "andi", "ori", "xori", "lui", "sll", "sra",
-                              "mult", "div", "mfhi", "mflo"]:
-                self._check_subunit_status("alu")
-                self.alu.execute(ins, source, target, rob)
-            # Branch operations
-            elif ins.name in ["beq", "bne", "blez", "bgtz", "j", "jal", "jr"]:
-                self._check_subunit_status("beu")
-                new_pc = self.beu.execute(ins, source, target, rob)
-            # Mark the instruction as ready for writeback.
-            ins.cycles -= 1
-            if ins.cycles == 0:
-                rob.mark_ready(ins.rob_entry)
-            if new_pc is not None:
-                return new_pc
-            # All instructions bar branch pc += 4
-            return ins.pc + 4
-        # Catch instructions that cannot be executed by this EU.
-        except AttributeError:
-            raise UnsupportedInstruction("`" + ins.name + "` on EU: " + str(id(self)))
+        # LOAD/STORE
+        if subunit == "lsu":
+            latency += self.lsu.execute(ins, source, target, rob, cycle)
+        # ALU Operations
+        elif subunit == "alu":
+            self.alu.execute(ins, source, target, rob)
+        # Branch operations
+        elif subunit == "beu":
+            new_pc = self.beu.execute(ins, source, target, rob)
+        # All instructions bar branch pc += 4
+        if new_pc is None:
+            new_pc = ins.pc + 4
+        self.in_flight.append((cycle + latency - 1, ins, new_pc))
+
+
+    def complete(self, cycle):
+        """
+        Removes the instructions whose results are produced in this cycle.
+        :param cycle: current clock cycle.
+        :return: List of (instruction, new pc) which have finished execution.
+        """
+        finished, in_flight = [], []
+        for item in self.in_flight:
+            if item[0] <= cycle:
+                finished.append((item[1], item[2]))
+            else:
+                in_flight.append(item)
+        self.in_flight = in_flight
+        return finished
+
+
+    def clear_block(self, instruction_block, thread=0):
+        """
+        Drops in flight instructions after a particular speculative block.
+        :param instruction_block: Instruction block to delete (and all subsequent blocks).
+        :param thread: hardware thread the block belongs to.
+        """
+        self.in_flight = [item for item in self.in_flight
+                          if item[1].thread != thread or item[1].block < instruction_block]
+
+
+    def _get_subunit(self, ins):
+        """
+        Finds the subunit responsible for an instruction.
+        :param ins: instruction to inspect.
+        :return: Name of the subunit or None if the instruction needs no subunit.
+        """
+        for subunit, names in self.subunits.items():
+            if ins.name in names:
+                return subunit
+        return None
 
 
     def _get_operands(self, ins, rob):
@@ -71,27 +125,28 @@ class ExecutionUnit():
         :return: source and target register values.
         """
         source, target = None, None
-        if ins.operands["rs"] != {}:
-            if ins.operands["rs"]["valid"]:
-                source = ins.operands["rs"]["value"]
+        if ins.rs_valid is not None:
+            if ins.rs_valid:
+                source = ins.rs_value
             else:
-                source = rob.get_result(ins.operands["rs"]["value"], ins.rs)
-        if ins.operands["rt"] != {}:
-            if ins.operands["rt"]["valid"]:
-                target = ins.operands["rt"]["value"]
+                source = rob.get_result(ins.rs_value, ins.rs)
+        if ins.rt_valid is not None:
+            if ins.rt_valid:
+                target = ins.rt_value
             else:
-                target = rob.get_result(ins.operands["rt"]["value"], ins.rt)
+                target = rob.get_result(ins.rt_value, ins.rt)
         return source, target
 
 
-    def _check_subunit_status(self, subunit):
+    def _check_subunit_status(self, subunit, cycle):
         """
-        Checks if a EU subunit is busy. If it is, an exception is raised. Otherwise it is marked as busy.
+        Checks if a EU subunit is busy. If it is, an exception is raised.
+        A subunit is busy if it has accepted an instruction this cycle or is within the initiation interval of one.
         :param subunit: String representing subunit.
+        :param cycle: current clock cycle.
         """
-        if subunit in self.busy_subunits:
+        if subunit in self.busy_subunits or self.next_free.get(subunit, 0) > cycle:
             raise AlreadyExecutingInstruction(str(subunit) + " on EU: " + str(id(self)))
-        self.busy_subunits.append(subunit)
 
 
     def clear_subunits(self):
@@ -105,27 +160,90 @@ class ExecutionUnit():
         """
         This is the load store unit for the EU.
         """
-        def __init__(self, memory):
+        timing = lsu_timing
+
+        def __init__(self, memory, cache=None):
             """
-            This is the constructor for the ALU inside the execution unit.
+            This is the constructor for the LSU inside the execution unit.
+            :param memory: simulator main memory reference.
+            :param cache: data cache timing model (or None for ideal memory).
             """
             self.mem = memory
+            self.cache = cache
 
 
-        def execute(self, ins, source, target, rob):
+        def accepts(self, ins, source, rob, cycle):
+            """
+            Checks whether the data cache can take the access of a load/store instruction this cycle.
+            Stores only probe the cache until they commit, so never need an MSHR.
+            :param ins: Instruction object to execute.
+            :param source: source operand to execute with.
+            :param rob: re-order buffer.
+            :param cycle: current clock cycle.
+            :return: Boolean representing whether the instruction can be issued.
+            """
+            if self.cache is None or ins.name == "sw":
+                return True
+            address = source + ins.imm
+            if ins.name == "lw" and rob.pending_store(address, ins.rob_entry)[0]:
+                return True
+            return self.cache.accepts(address, cycle)
+
+
+        def execute(self, ins, source, target, rob, cycle):
             """
             This function executes a load/store instruction.
             :param ins: Instruction object to execute.
             :param source: source operand to execute with.
             :param target: target operand to execute with.
             :param rob: re-order buffer.
+            :param cycle: current clock cycle.
+            :return: Cycles taken by the data cache access.
             """
             if ins.name == "lw":
-                # Load to the register rt the word found at (register_file(rs) + imm) in memory.
-                rob.write_result(ins.rob_entry, ins.rt, self._get_word(source + ins.imm))
+                # Load to the register rt the word found at (register_file(rs) + imm) in memory,
+                # forwarding from any older store which has not yet been committed.
+                address = source + ins.imm
+                forwarded, value = rob.pending_store(address, ins.rob_entry)
+                if not forwarded:
+                    value = self._get_word(address)
+                rob.write_result(ins.rob_entry, ins.rt, value)
+                if forwarded:
+                    return 0
+                return self._access_latency(address, False, cycle)
             elif ins.name == "sw":
-                # Store to memory(rs + imm) the word found in the target register.
-                self._store_word(target, source + ins.imm)
+                # Buffer the store to memory(rs + imm) of the word found in the target register until it commits.
+                # A store may still be squashed, so the cache is only probed for its timing and written at commit.
+                ins.store = (source + ins.imm, target)
+                if self.cache is None:
+                    return 0
+                return self.cache.probe(ins.store[0], True, cycle)
+            return 0
+
+
+        def _access_latency(self, address, write, cycle):
+            """
+            Accesses the data cache to find how long an access takes.
+            :param address: address being accessed.
+            :param write: whether the access is a write.
+            :param cycle: current clock cycle.
+            :return: Cycles taken by the access (0 without a data cache).
+            """
+            if self.cache is None:
+                return 0
+            return self.cache.access(address, write, cycle)
+
+
+        def commit(self, ins, cycle=None):
+            """
+            Writes a buffered store to memory and the data cache once the store instruction is written back.
+            :param ins: store Instruction object being written back.
+            :param cycle: current clock cycle.
+            """
+            address, value = ins.store
+            self._store_word(value, address)
+            if self.cache is not None:
+                self.cache.access(address, True, cycle) # Drains from the store buffer off the critical path.
 
 
         def _get_word(self, address):
@@ -134,11 +252,7 @@ class ExecutionUnit():
             :param address: Address of word.
             :return: Integer representation of word.
             """
-            binary = self.mem[address]
-            binary += self.mem[address + 1]
-            binary += self.mem[address + 2]
-            binary += self.mem[address + 3]
-            return int(binary, 2)
+            return int(self.mem.word(address), 2)
 
 
         def _store_word(self, value, address):
@@ -147,17 +261,15 @@ class ExecutionUnit():
             :param value: Integer representation of value to store.
             :param address: Address to store word at.
             """
-            binary = "{0:032b}".format(value)
-            self.mem[address] = binary[0:8]
-            self.mem[address + 1] = binary[8:16]
-            self.mem[address + 2] = binary[16:24]
-            self.mem[address + 3] = binary[24:]
+            self.mem.set_word(address, "{0:032b}".format(value))
 
 
     class ALU():
         """
         This is the Arithmetic Logic unit for the EU.
         """
+        timing = alu_timing
+
         def execute(self, ins, source, target, rob):
             """
             Given an ALU Instruction object, it will execute it.
@@ -213,11 +325,14 @@ class ExecutionUnit():
         """
         This is the branch execution unit for the EU.
         """
-        def __init__(self):
+        timing = beu_timing
+
+        def __init__(self, branch_predictors):
             """
             This is the constructor for the BEU inside the execution unit.
+            :param branch_predictors: branch predictor of each hardware thread to train with branch outcomes.
             """
-            self.branch_predictor = BranchPredictor()
+            self.branch_predictors = branch_predictors
 
 
         def execute(self, ins, source, target, rob):
@@ -228,21 +343,22 @@ class ExecutionUnit():
             :param target: target operand to execute with.
             :param rob: re-order buffer.
             """
+            branch_predictor = self.branch_predictors[ins.thread] # Each thread keeps its own branch history.
             if ins.name == "beq":
                 if source == target:
-                    self.branch_predictor.update_prediction(True)
+                    branch_predictor.update_prediction(True)
                     return ins.pc + (ins.imm << 2)
             elif ins.name == "bne":
                 if source != target:
-                    self.branch_predictor.update_prediction(True)
+                    branch_predictor.update_prediction(True)
                     return ins.pc + (ins.imm << 2)
             elif ins.name == "blez":
                 if source <= 0:
-                    self.branch_predictor.update_prediction(True)
+                    branch_predictor.update_prediction(True)
                     return ins.pc + (ins.imm << 2)
             elif ins.name == "bgtz":
                 if source > 0:
-                    self.branch_predictor.update_prediction(True)
+                    branch_predictor.update_prediction(True)
                     return ins.pc + (ins.imm << 2)
             elif ins.name == "j":
                 return ins.address
@@ -251,5 +367,5 @@ class ExecutionUnit():
                 return ins.address
             elif ins.name == "jr":
                 return source
-            self.branch_predictor.update_prediction(False)
+            branch_predictor.update_prediction(False)
             return ins.pc + 4
\ No newline at end of file
@@ -0,0 +1,323 @@
+import time
+from collections import Counter
+from classes.instruction import Instruction
+from classes.register_file import RegisterFile
+from classes.constants import functional_hot_threshold, functional_block_size
+from classes.errors import SimulationAborted
+from classes.syscalls import SystemCalls
+
+
+class FunctionalSimulator():
+    """
+    Executes a program architecturally, without modelling the pipeline.
+    Hot basic blocks are translated into Python functions, cached by entry pc and invalidated by stores
+    to their instructions, while cold code is run by a simple interpreter.
+    Both follow the semantics of the execution units exactly: registers hold unbounded integers
+    and memory holds the binary strings the LSU would write.
+    """
+    control = ["beq", "bne", "blez", "bgtz", "j", "jal", "jr", "syscall"]
+
+    def __init__(self, memory, pc, hot_threshold=functional_hot_threshold, block_size=functional_block_size,
+                 syscalls=None, max_instructions=None, max_seconds=None):
+        """
+        Constructor for the FunctionalSimulator class.
+        :param memory: main memory holding the loaded program.
+        :param pc: entry point of the program.
+        :param hot_threshold: times a block is interpreted before it is translated.
+        :param block_size: most instructions translated into a single block.
+        :param syscalls: SystemCalls carrying out the program's syscalls (or None to use the console).
+        :param max_instructions: instructions after which the run is aborted (or None for no limit).
+        :param max_seconds: wall clock seconds after which the run is aborted (or None for no limit).
+        """
+        self.memory = memory
+        self.pc = pc
+        self.syscalls = syscalls if syscalls is not None else SystemCalls()
+        self.hot_threshold = hot_threshold
+        self.block_size = block_size
+        self.max_instructions = max_instructions
+        self.max_seconds = max_seconds
+        self.registers = [0] * RegisterFile.size
+        self.registers[29] = (max(self.memory) + 1) + (1000 * 4)  # Initialise the stack pointer (1000 words).
+        self.blocks = {} # Entry pc : translated function.
+        self.covers = {} # Entry pc : word addresses of the instructions translated.
+        self.code = {} # Word address : set of entry pcs of blocks translated from it.
+        self.heat = Counter() # Entry pc : times the block has been interpreted.
+        # Statistics
+        self.instructions_executed = 0
+        self.translations = 0
+        self.invalidations = 0
+
+
+    def run(self):
+        """
+        Runs the program until the pc leaves memory or it exits, leaving self.pc at the last block entered.
+        Limits are checked between blocks, so a translated block may run past the instruction budget.
+        """
+        registers, memory, store, syscall = self.registers, self.memory, self._store, self._syscall
+        pc, blocks = self.pc, self.blocks
+        deadline = None if self.max_seconds is None else time.monotonic() + self.max_seconds
+        while pc is not None:
+            self.pc = pc
+            # A program whose pc is about to leave memory has finished within its budget.
+            if self.max_instructions is not None and self.instructions_executed >= self.max_instructions and \
+                    pc in memory:
+                raise SimulationAborted("instruction budget of " + str(self.max_instructions) + " instructions exhausted")
+            if deadline is not None and time.monotonic() > deadline:
+                raise SimulationAborted("time limit of " + str(self.max_seconds) + " seconds exceeded")
+            block = blocks.get(pc)
+            if block is None:
+                self.heat[pc] += 1
+                if self.heat[pc] > self.hot_threshold:
+                    block = self._translate(pc)
+            if block is None:
+                pc = self._interpret(pc)
+            else:
+                pc, executed = block(registers, memory, store, syscall)
+                self.instructions_executed += executed
+
+
+    def _fetch(self, pc):
+        """
+        Decodes the instruction at an address.
+        :param pc: address of the instruction.
+        :return: Instruction object or None if the address is not in memory.
+        """
+        try:
+            raw_instruction = self.memory[pc] + self.memory[pc + 1] + self.memory[pc + 2] + self.memory[pc + 3]
+        except KeyError:
+            return None
+        return Instruction({"pc": pc, "raw_instruction": raw_instruction, "prediction": None, "block": 0})
+
+
+    def _interpret(self, pc):
+        """
+        Interprets the basic block starting at an address an instruction at a time.
+        :param pc: address of the first instruction.
+        :return: Address of the next block or None if the pc has left memory.
+        """
+        r = self.registers
+        for _ in range(self.block_size):
+            ins = self._fetch(pc)
+            if ins is None:
+                return None
+            self.instructions_executed += 1
+            name, next_pc = ins.name, pc + 4
+            if name in ["add", "sub", "and", "or", "xor", "nor", "slt", "sll", "sra", "mfhi", "mflo"]:
+                s, t = r[ins.rs], r[ins.rt]
+                if name == "add":
+                    value = s + t
+                elif name == "sub":
+                    value = s - t
+                elif name == "and":
+                    value = s & t
+                elif name == "or":
+                    value = s | t
+                elif name == "xor":
+                    value = s ^ t
+                elif name == "nor":
+                    value = ~(s | t)
+                elif name == "slt":
+                    value = int(s < t)
+                elif name == "sll":
+                    value = t << ins.shift
+                elif name == "sra":
+                    value = t >> ins.shift
+                elif name == "mfhi":
+                    value = r[32]
+                else:
+                    value = r[33]
+                if ins.rd != 0:
+                    r[ins.rd] = value
+            elif name in ["addi", "andi", "ori", "xori", "slti", "lui", "lw"]:
+                s = r[ins.rs]
+                if name == "addi":
+                    value = s + ins.imm
+                elif name == "andi":
+                    value = s & ins.imm
+                elif name == "ori":
+                    value = s | ins.imm
+                elif name == "xori":
+                    value = s ^ ins.imm
+                elif name == "slti":
+                    value = int(s < ins.imm)
+                elif name == "lui":
+                    value = ins.imm << 16
+                else:
+                    a = s + ins.imm
+                    value = int(self.memory[a] + self.memory[a + 1] + self.memory[a + 2] + self.memory[a + 3], 2)
+                if ins.rt != 0:
+                    r[ins.rt] = value
+            elif name == "sw":
+                self._store(r[ins.rt], r[ins.rs] + ins.imm)
+            elif name == "mult":
+                r[33] = r[ins.rs] * r[ins.rt]
+            elif name == "div":
+                r[33], r[32] = r[ins.rs] // r[ins.rt], r[ins.rs] % r[ins.rt]
+            elif name == "beq":
+                next_pc = pc + (ins.imm << 2) if r[ins.rs] == r[ins.rt] else next_pc
+            elif name == "bne":
+                next_pc = pc + (ins.imm << 2) if r[ins.rs] != r[ins.rt] else next_pc
+            elif name == "blez":
+                next_pc = pc + (ins.imm << 2) if r[ins.rs] <= 0 else next_pc
+            elif name == "bgtz":
+                next_pc = pc + (ins.imm << 2) if r[ins.rs] > 0 else next_pc
+            elif name == "j":
+                next_pc = ins.address
+            elif name == "jal":
+                r[31] = next_pc
+                next_pc = ins.address
+            elif name == "jr":
+                next_pc = r[ins.rs]
+            elif name == "syscall":
+                next_pc = None if self._syscall(r, self.memory) else next_pc
+            pc = next_pc
+            if name in self.control:
+                break
+        return pc
+
+
+    def _translate(self, entry):
+        """
+        Translates the basic block starting at an address into a Python function and caches it.
+        The function takes the registers, memory, store function and syscall function and returns the next pc
+        (None once the program has exited) and the number of instructions executed.
+        It returns early if a store overwrites translated code.
+        :param entry: address of the first instruction.
+        :return: Translated function or None if the address is not in memory.
+        """
+        lines, pc, count = [], entry, 0
+        while count < self.block_size:
+            ins = self._fetch(pc)
+            if ins is None:
+                break
+            count += 1
+            lines += self._emit(ins, count)
+            pc += 4
+            if ins.name in self.control:
+                break
+        if count == 0:
+            return None
+        if ins is None or ins.name not in self.control:
+            lines.append("return " + str(pc) + ", " + str(count))
+        source = "def block(r, m, store, syscall):\n" + "".join("    " + line + "\n" for line in lines)
+        namespace = {}
+        exec(compile(source, "<block 0x{0:08x}>".format(entry), "exec"), namespace)
+        block = namespace["block"]
+        self.blocks[entry] = block
+        self.covers[entry] = range(entry, pc, 4)
+        for address in self.covers[entry]:
+            self.code.setdefault(address, set()).add(entry)
+        self.translations += 1
+        return block
+
+
+    @staticmethod
+    def _emit(ins, count):
+        """
+        Generates the Python source of a single instruction.
+        :param ins: Instruction object.
+        :param count: number of instructions executed once this one has.
+        :return: List of lines of source.
+        """
+        name, pc = ins.name, ins.pc
+        rs, rt, imm = "r[" + str(ins.rs) + "]", "r[" + str(ins.rt) + "]", str(ins.imm)
+        taken = "return (" + str(pc) + " + (" + imm + " << 2) if {0} else " + str(pc + 4) + "), " + str(count)
+        expressions = {
+            "add": (ins.rd, rs + " + " + rt),
+            "sub": (ins.rd, rs + " - " + rt),
+            "and": (ins.rd, rs + " & " + rt),
+            "or": (ins.rd, rs + " | " + rt),
+            "xor": (ins.rd, rs + " ^ " + rt),
+            "nor": (ins.rd, "~(" + rs + " | " + rt + ")"),
+            "slt": (ins.rd, "int(" + rs + " < " + rt + ")"),
+            "sll": (ins.rd, rt + " << " + str(ins.shift)),
+            "sra": (ins.rd, rt + " >> " + str(ins.shift)),
+            "mfhi": (ins.rd, "r[32]"),
+            "mflo": (ins.rd, "r[33]"),
+            "addi": (ins.rt, rs + " + " + imm),
+            "andi": (ins.rt, rs + " & " + imm),
+            "ori": (ins.rt, rs + " | " + imm),
+            "xori": (ins.rt, rs + " ^ " + imm),
+            "slti": (ins.rt, "int(" + rs + " < " + imm + ")"),
+            "lui": (ins.rt, imm + " << 16"),
+            "lw": (ins.rt, "int(m[a] + m[a + 1] + m[a + 2] + m[a + 3], 2)"),
+            "mult": (33, rs + " * " + rt)
+        }
+        lines = []
+        if name == "lw":
+            lines.append("a = " + rs + " + " + imm)
+        if name in expressions:
+            register, expression = expressions[name]
+            if register != 0: # Writes to the zero register are discarded.
+                lines.append("r[" + str(register) + "] = " + expression)
+        elif name == "div":
+            lines.append("r[33], r[32] = " + rs + " // " + rt + ", " + rs + " % " + rt)
+        elif name == "sw":
+            lines.append("if store(" + rt + ", " + rs + " + " + imm + "):")
+            lines.append("    return " + str(pc + 4) + ", " + str(count))
+        elif name == "beq":
+            lines.append(taken.format(rs + " == " + rt))
+        elif name == "bne":
+            lines.append(taken.format(rs + " != " + rt))
+        elif name == "blez":
+            lines.append(taken.format(rs + " <= 0"))
+        elif name == "bgtz":
+            lines.append(taken.format(rs + " > 0"))
+        elif name == "j":
+            lines.append("return " + str(ins.address) + ", " + str(count))
+        elif name == "jal":
+            lines.append("r[31] = " + str(pc + 4))
+            lines.append("return " + str(ins.address) + ", " + str(count))
+        elif name == "jr":
+            lines.append("return " + rs + ", " + str(count))
+        elif name == "syscall":
+            lines.append("return (None if syscall(r, m) else " + str(pc + 4) + "), " + str(count))
+        return lines
+
+
+    def _syscall(self, registers, memory):
+        """
+        Carries out a syscall, invalidating any translation of the words it read input into.
+        :param registers: register values.
+        :param memory: main memory.
+        :return: Boolean representing whether the program has exited.
+        """
+        exited = self.syscalls.call(registers, memory)
+        if self.syscalls.written is not None and self.code:
+            address, count = self.syscalls.written
+            self._invalidate(range(address & ~3, address + count, 4))
+        return exited
+
+
+    def _store(self, value, address):
+        """
+        Stores a word in memory exactly as the LSU does, invalidating any translation of the words written.
+        :param value: Integer representation of value to store.
+        :param address: Address to store word at.
+        :return: Boolean representing whether a translation was invalidated.
+        """
+        binary = "{0:032b}".format(value)
+        self.memory[address] = binary[0:8]
+        self.memory[address + 1] = binary[8:16]
+        self.memory[address + 2] = binary[16:24]
+        self.memory[address + 3] = binary[24:]
+        if not self.code:
+            return False
+        return self._invalidate({address & ~3, (address + 3) & ~3})
+
+
+    def _invalidate(self, words):
+        """
+        Drops the translations of any block holding an instruction in the words written.
+        :param words: addresses of the words written.
+        :return: Boolean representing whether a translation was invalidated.
+        """
+        invalidated = False
+        for word in words:
+            for entry in self.code.pop(word, ()):
+                if self.blocks.pop(entry, None) is not None:
+                    invalidated = True
+                    self.invalidations += 1
+                    for covered in self.covers.pop(entry):
+                        self.code.get(covered, set()).discard(entry)
+        return invalidated
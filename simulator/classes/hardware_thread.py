@@ -0,0 +1,37 @@
+from classes.register_file import RegisterFile
+from classes.branch_predictor import BranchPredictor
+
+
+class HardwareThread():
+    """
+    State private to one hardware thread of a simultaneously multithreaded core.
+    Threads share the fetch queue, reservation station, re-order buffer, execution units and caches of the core,
+    but each has its own pc, architectural registers and branch predictor (with its history and return address stack).
+    """
+
+    def __init__(self, thread, pc):
+        """
+        Constructor for the HardwareThread class.
+        :param thread: thread ID.
+        :param pc: address the thread starts at.
+        """
+        self.thread = thread
+        self.pc = pc
+        self.register_file = RegisterFile()
+        self.branch_predictor = BranchPredictor()
+        self.fetch_stall_until = 0 # Cycle at which the thread's fetch resumes after an instruction cache access.
+        self.fetch_line = None # Instruction cache line whose access fetch has already stalled for.
+        self.syscall_pending = False # A syscall has been fetched, so fetch waits until it has been carried out.
+        self.exited = False # The thread has made an exit syscall.
+        self.instructions_committed = 0
+
+
+    def can_fetch(self, cycle):
+        """
+        Checks whether the thread may fetch, which it may not whilst recovering from a mispredict, waiting on a miss
+        or waiting on a syscall, nor once it has exited.
+        :param cycle: current clock cycle.
+        :return: Boolean representing whether the thread can be offered fetch slots.
+        """
+        return not self.branch_predictor.in_recovery and cycle >= self.fetch_stall_until and \
+            not self.syscall_pending and not self.exited
@@ -4,45 +4,83 @@ from classes.register_file import RegisterFile
 class Instruction():
     """
     Class for decoding machine instructions.
+    Records are pooled: retired and squashed instructions are returned to a free list and re-used by allocate().
     """
-    # PC value of instruction
-    pc = None
+    __slots__ = (
+        "pc",               # PC value of instruction
+        "raw_instruction",  # Fetched binary string
+        "prediction",       # Predicted pc outcome
+        "block",            # Speculative block
+        "thread",           # Hardware thread the instruction belongs to
+        "name", "type",     # Name and type of instruction
+        "rs", "rt", "rd",   # Real register numbers in instruction
+        "imm", "shift", "address",
+        "rs_valid", "rs_value",  # Runtime rs operand: valid is None when unused, value is a ROB entry id if not valid
+        "rt_valid", "rt_value",  # Runtime rt operand
+        "rob_entry",        # ROB entry id of instruction
+        "operands_ready",   # Reservation station: all operands are available
+        "ready",            # Re-order buffer: execution has finished
+        "written",          # Re-order buffer: result has been written back
+        "result",           # Re-order buffer: register -> value results
+        "store"             # Re-order buffer: (address, value) of a store waiting to be written to memory
+    )
+
+    # Register names indexed by register number
+    reg = RegisterFile.names
+
+    # Free list of records available for re-use
+    _free_list = []
 
-    # Name and type of instruction
-    name = None
-    type = None
+    def __init__(self, instruction):
+        """
+        Instruction class constructor.
+        :param instruction: fetch object containing the fetched instruction from memory.
+        """
+        self.result = {}
+        self.load(instruction)
 
-    # Define register file to get register names
-    reg = RegisterFile().reg
-    # Real register names in instruction
-    rs = None
-    rt = None
-    rd = None
 
-    # Operands of instruction
-    operands = None # rs & rt at runtime.
-    imm = None
-    shift = None
-    address = None
+    @classmethod
+    def allocate(cls, instruction):
+        """
+        Builds an Instruction, re-using a released record where possible.
+        :param instruction: fetch object containing the fetched instruction from memory.
+        :return: Instruction object.
+        """
+        try:
+            record = cls._free_list.pop()
+        except IndexError:
+            return cls(instruction)
+        record.load(instruction)
+        return record
 
-    # ROB entry id of instruction
-    rob_entry = None
 
-    # Speculative block
-    block = None
+    @classmethod
+    def release(cls, instructions):
+        """
+        Returns records which are no longer referenced by the pipeline to the free list.
+        :param instructions: Instruction objects to release.
+        """
+        cls._free_list.extend(instructions)
 
-    # Number of cycles taken to execute
-    cycles = 1
 
-    def __init__(self, instruction):
+    def load(self, instruction):
         """
-        Instruction class constructor.
-        :param raw_instruction: String containing fetched instruction from memory.
+        (Re-)initialises the record from a fetch object and decodes it.
+        :param instruction: fetch object containing the fetched instruction from memory.
         """
         self.pc = instruction["pc"]
         self.raw_instruction = instruction["raw_instruction"]
         self.block = instruction["block"]
+        self.thread = instruction.get("thread", 0) # Fetch objects built outside the pipeline belong to thread 0.
         self.prediction = instruction["prediction"] # If there is a predicted pc outcome then store it.
+        self.rs = self.rt = self.rd = None
+        self.imm = self.shift = self.address = None
+        self.rs_valid = self.rs_value = self.rt_valid = self.rt_value = None
+        self.rob_entry = None
+        self.operands_ready = self.ready = self.written = False
+        self.store = None
+        self.result.clear()
         self.decode()
 
 
@@ -57,10 +95,6 @@ class Instruction():
         if opcode == 0:
             function = int(self.raw_instruction[26:32], 2)
         self.name, self.type = Opcode(opcode, function).decode()
-        if self.name in ["lw", "sw"]:
-            self.cycles = 2
-        elif self.name in ["div"]:
-            self.cycles = 3
         self._decode_operands()
 
 
@@ -72,14 +106,14 @@ class Instruction():
         """
         if self.type == Type.R:
             return str(self.name) + \
-                   " (rd: " + str(self.reg[self.rd]["name"]) + ") " + \
-                   "(rs: " + str(self.reg[self.rs]["name"]) + ") " + \
-                   "(rt: " + str(self.reg[self.rt]["name"]) + ") " + \
+                   " (rd: " + str(self.reg[self.rd]) + ") " + \
+                   "(rs: " + str(self.reg[self.rs]) + ") " + \
+                   "(rt: " + str(self.reg[self.rt]) + ") " + \
                    "(shift: " + str(self.shift) + ")"
         elif self.type == Type.I:
             return str(self.name) + \
-                   " (rs: " + str(self.reg[self.rs]["name"]) + ") " + \
-                   "(rt: " + str(self.reg[self.rt]["name"]) + ") " + \
+                   " (rs: " + str(self.reg[self.rs]) + ") " + \
+                   "(rt: " + str(self.reg[self.rt]) + ") " + \
                    "(imm: " + str(self.imm) + ")"
         elif self.type == Type.J:
             return str(self.name) + \
@@ -0,0 +1,201 @@
+class PagedMemory():
+    """
+    Sparse byte addressed main memory made of pages allocated on first touch.
+    Like the dictionary it replaces, it maps addresses to binary strings and reading an address which
+    was never written raises KeyError, which is how fetch finds the end of a program.
+    Pages are shared copy-on-write between forks, so forking only copies the page table and a page
+    is copied the first time either side writes to it.
+    Writes can be logged, so the writes of one copy can be applied to others which run separately.
+    """
+    page_bits = 12
+    page_size = 1 << page_bits # 4 KiB pages.
+    offset_mask = page_size - 1
+
+    def __init__(self, image=None):
+        """
+        Constructor for the PagedMemory class.
+        :param image: dictionary of byte address to binary string to load (or None for empty memory).
+        """
+        self.pages = {} # Page number : list of page_size binary strings, None where an address is unmapped.
+        self.owned = set() # Pages not shared with a fork, which can be written in place.
+        self.log = None # Address : byte of the writes since the log was taken (None when not logging).
+        if image is not None:
+            self.update(image)
+
+
+    def __getitem__(self, address):
+        """
+        Reads a byte of memory.
+        :param address: address of the byte.
+        :return: Binary string of the byte, raising KeyError if the address is unmapped.
+        """
+        page = self.pages.get(address >> self.page_bits)
+        if page is not None:
+            value = page[address & self.offset_mask]
+            if value is not None:
+                return value
+        raise KeyError(address)
+
+
+    def __setitem__(self, address, value):
+        """
+        Writes a byte of memory.
+        :param address: address of the byte.
+        :param value: binary string of the byte.
+        """
+        self._writable(address >> self.page_bits)[address & self.offset_mask] = value
+        if self.log is not None:
+            self.log[address] = value
+
+
+    def __contains__(self, address):
+        """
+        Checks whether an address is mapped.
+        :param address: address of the byte.
+        :return: Boolean representing whether the address has been written.
+        """
+        page = self.pages.get(address >> self.page_bits)
+        return page is not None and page[address & self.offset_mask] is not None
+
+
+    def __iter__(self):
+        """
+        Iterates over the mapped addresses in ascending order.
+        :return: Generator of addresses.
+        """
+        return self.keys()
+
+
+    def __len__(self):
+        """
+        Counts the mapped addresses.
+        :return: Number of bytes written.
+        """
+        return sum(self.page_size - page.count(None) for page in self.pages.values())
+
+
+    def get(self, address, default=None):
+        """
+        Reads a byte of memory.
+        :param address: address of the byte.
+        :param default: value to return if the address is unmapped.
+        :return: Binary string of the byte or the default.
+        """
+        page = self.pages.get(address >> self.page_bits)
+        if page is None:
+            return default
+        value = page[address & self.offset_mask]
+        return default if value is None else value
+
+
+    def keys(self):
+        """
+        Generates the mapped addresses in ascending order.
+        :return: Generator of addresses.
+        """
+        for number in sorted(self.pages):
+            base = number << self.page_bits
+            for offset, value in enumerate(self.pages[number]):
+                if value is not None:
+                    yield base + offset
+
+
+    def items(self):
+        """
+        Generates the mapped addresses in ascending order along with their bytes.
+        :return: Generator of (address, binary string).
+        """
+        for address in self.keys():
+            yield address, self[address]
+
+
+    def update(self, image):
+        """
+        Writes every byte of an image to memory.
+        :param image: dictionary of byte address to binary string.
+        """
+        for address, value in image.items():
+            self[address] = value
+
+
+    def clear(self):
+        """
+        Unmaps every address.
+        """
+        self.pages = {}
+        self.owned = set()
+
+
+    def word(self, address):
+        """
+        Reads the 4 bytes of a word.
+        :param address: address of the word.
+        :return: Binary string of the word.
+        """
+        page = self.pages.get(address >> self.page_bits)
+        offset = address & self.offset_mask
+        if page is not None and offset <= self.page_size - 4:
+            try:
+                return page[offset] + page[offset + 1] + page[offset + 2] + page[offset + 3]
+            except TypeError: # At least one of the bytes is unmapped.
+                pass
+        return self[address] + self[address + 1] + self[address + 2] + self[address + 3]
+
+
+    def set_word(self, address, binary):
+        """
+        Writes the 4 bytes of a word.
+        :param address: address of the word.
+        :param binary: binary string of the word, 8 characters per byte.
+        """
+        offset = address & self.offset_mask
+        if offset > self.page_size - 4 or self.log is not None: # The word straddles two pages or is logged.
+            for i in range(4):
+                self[address + i] = binary[8 * i:8 * i + 8]
+            return
+        page = self._writable(address >> self.page_bits)
+        page[offset:offset + 4] = binary[0:8], binary[8:16], binary[16:24], binary[24:]
+
+
+    def take_log(self):
+        """
+        Starts logging writes, returning the writes logged since the previous call.
+        :return: Dictionary of address to byte.
+        """
+        log, self.log = self.log or {}, {}
+        return log
+
+
+    def apply(self, log):
+        """
+        Applies writes logged by another copy of memory without logging them again.
+        :param log: dictionary of address to byte.
+        """
+        for address, value in log.items():
+            self._writable(address >> self.page_bits)[address & self.offset_mask] = value
+
+
+    def fork(self):
+        """
+        Makes a copy of memory which shares every page copy-on-write with this one.
+        :return: PagedMemory object.
+        """
+        fork = PagedMemory()
+        fork.pages = dict(self.pages)
+        self.owned = set() # Neither side may write to a shared page in place any more.
+        return fork
+
+
+    def _writable(self, number):
+        """
+        Gets a page which can be written in place, allocating it or copying a shared page first.
+        :param number: page number.
+        :return: List of the bytes of the page.
+        """
+        if number in self.owned:
+            return self.pages[number]
+        page = self.pages.get(number)
+        page = [None] * self.page_size if page is None else list(page)
+        self.pages[number] = page
+        self.owned.add(number)
+        return page
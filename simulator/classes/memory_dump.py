@@ -0,0 +1,150 @@
+import struct
+from classes.memory import PagedMemory
+
+
+class MemoryDump():
+    """
+    Streams the contents of main memory to a file a word at a time.
+    """
+    formats = ["hex", "binary", "word", "raw"]
+
+    def __init__(self, memory, initial_memory=None, chunk_size=4096):
+        """
+        Constructor for the MemoryDump class.
+        :param memory: simulator main memory reference.
+        :param initial_memory: memory image as it was loaded (required to dump differences).
+        :param chunk_size: number of words buffered before each write to the file.
+        """
+        self.memory = memory
+        self.initial_memory = initial_memory
+        self.chunk_size = chunk_size
+
+
+    def write(self, path, start=None, end=None, format="hex", diff=False):
+        """
+        Writes the words of memory within [start, end) to a file.
+        :param path: file to write the dump to.
+        :param start: first address to dump (defaults to the lowest address in memory).
+        :param end: address after the last one to dump (defaults to the end of memory).
+        :param format: one of hex, binary, word or raw.
+        :param diff: only dump words that differ from the initial memory image.
+        :return: Number of words written.
+        """
+        if format not in self.formats:
+            raise ValueError("Unsupported memory dump format: " + str(format))
+        if diff and self.initial_memory is None:
+            raise ValueError("No initial memory image to diff against")
+        words = self.words(start, end)
+        if diff:
+            words = self._changed(words)
+        count = 0
+        f = open(path, "wb")
+        try:
+            if format == "raw":
+                count = self._write_raw(f, words)
+            else:
+                count = self._write_text(f, words, format)
+        finally:
+            f.close()
+        return count
+
+
+    def words(self, start=None, end=None):
+        """
+        Generates the word aligned addresses in memory within [start, end) along with their bytes.
+        :param start: first address to include.
+        :param end: address after the last one to include.
+        :return: Generator of (address, tuple of 4 binary byte strings).
+        """
+        # Paged memory already lists its addresses in order, only a plain dictionary has to be sorted.
+        keys = self.memory.keys() if isinstance(self.memory, PagedMemory) else sorted(self.memory)
+        get, last = self.memory.get, None
+        for address in keys:
+            if start is not None and address < start:
+                continue
+            if end is not None and address >= end:
+                break
+            address &= ~3
+            if address == last: # Another byte of the word just yielded.
+                continue
+            last = address
+            yield address, (get(address, "00000000"), get(address + 1, "00000000"),
+                            get(address + 2, "00000000"), get(address + 3, "00000000"))
+
+
+    def _changed(self, words):
+        """
+        Filters words down to those which differ from the initial memory image.
+        :param words: Generator of (address, bytes).
+        :return: Generator of (address, bytes).
+        """
+        get = self.initial_memory.get
+        for address, data in words:
+            if data != (get(address), get(address + 1), get(address + 2), get(address + 3)):
+                yield address, data
+
+
+    def _write_text(self, f, words, format):
+        """
+        Streams words to a file in one of the text formats.
+        :param f: file to write to.
+        :param words: Generator of (address, bytes).
+        :param format: hex, binary or word.
+        :return: Number of words written.
+        """
+        count, lines = 0, []
+        for address, data in words:
+            if format == "binary":
+                lines.append("0x{0:08x}: {1} {2} {3} {4}\n".format(address, *data))
+            elif format == "hex":
+                lines.append("0x{0:08x}: 0x{1:08x}\n".format(address, self._value(data) & 0xFFFFFFFF))
+            else:
+                lines.append("0x{0:08x}: {1}\n".format(address, self._value(data)))
+            count += 1
+            if len(lines) == self.chunk_size:
+                f.write("".join(lines).encode('utf-8'))
+                lines = []
+        f.write("".join(lines).encode('utf-8'))
+        return count
+
+
+    def _write_raw(self, f, words):
+        """
+        Streams words to a file in a compact binary form.
+        Each run of consecutive words is written as a big endian (address, length) header followed by the words.
+        :param f: file to write to.
+        :param words: Generator of (address, bytes).
+        :return: Number of words written.
+        """
+        count, run_start, run = 0, None, []
+        for address, data in words:
+            if run and (address != run_start + 4 * len(run) or len(run) == self.chunk_size):
+                f.write(struct.pack(">II", run_start, len(run)) + struct.pack(">" + str(len(run)) + "I", *run))
+                run = []
+            if not run:
+                run_start = address
+            run.append(self._value(data) & 0xFFFFFFFF)
+            count += 1
+        if run:
+            f.write(struct.pack(">II", run_start, len(run)) + struct.pack(">" + str(len(run)) + "I", *run))
+        return count
+
+
+    @staticmethod
+    def _value(data):
+        """
+        Converts the 4 bytes of a word into its integer value.
+        :param data: tuple of 4 binary byte strings.
+        :return: Integer representation of word.
+        """
+        binary = "".join(data)
+        try:
+            return int(binary, 2)
+        except ValueError:
+            # A negative field (such as an immediate) was formatted with a sign rather than two's complement.
+            prefix, field = binary.split("-", 1)
+            width = len(field) + 1
+            value = (int(prefix or "0", 2) << width) | (-int(field, 2) & ((1 << width) - 1))
+            if value & 0x80000000:
+                value -= 1 << 32
+            return value
@@ -0,0 +1,218 @@
+import multiprocessing, os, pickle, time
+from classes.constants import multicore_window, watchdog_cycles
+from classes.debugger import Debugger
+from classes.errors import Interrupt, SimulationAborted
+from classes.memory import PagedMemory
+from classes.memory_dump import MemoryDump
+from classes.simulator import Simulator
+
+
+class MultiCoreSimulator():
+    """
+    Simulates several cores, each with its own pipeline, running over one shared memory image.
+    Cores are stepped in lockstep windows of cycles. Each core works on its own copy of memory and the writes
+    every core made during a window are applied to all of them at the barrier ending it, in core order,
+    so the outcome does not depend on how the cores are spread over worker processes.
+    Core N starts at the label coreN if the program has one (otherwise at the entry point of the program),
+    with its ID in $k0 and the number of cores in $k1.
+    """
+
+    def __init__(self, input_file, cores, jobs=1, window=multicore_window, watchdog=watchdog_cycles,
+                 max_cycles=None, max_seconds=None):
+        """
+        Constructor for the MultiCoreSimulator class.
+        :param input_file: input source machine code file.
+        :param cores: number of cores.
+        :param jobs: number of worker processes to step the cores in (1 steps them in this process).
+        :param window: cycles the cores run between barriers.
+        :param watchdog: cycles without a commit after which a core aborts the simulation (or 0 to never abort).
+        :param max_cycles: cycles after which the simulation is aborted (or None for no limit).
+        :param max_seconds: wall clock seconds after which the simulation is aborted (or None for no limit).
+        """
+        f = open(input_file, "rb")
+        self.memory = PagedMemory(pickle.load(f))
+        f.close()
+        self.initial_memory = self.memory.fork()
+        labels = Debugger.load_labels(os.path.splitext(input_file)[0] + ".sym")
+        entries = {core: labels["core" + str(core)] for core in range(cores) if "core" + str(core) in labels}
+        self.cores = cores
+        self.jobs = max(1, min(jobs, cores))
+        self.window = window
+        self.max_seconds = max_seconds
+        self.clock = 0
+        self.results = None # Core : result of the core once the simulation has finished.
+        self.groups, self.workers = [], []
+        for job in range(self.jobs):
+            group = (input_file, list(range(job, cores, self.jobs)), cores, entries, watchdog, max_cycles)
+            if self.jobs == 1:
+                self.groups.append(CoreGroup(*group))
+                break
+            connection, worker_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(target=serve, args=(worker_connection,) + group, daemon=True)
+            worker.start()
+            self.groups.append(connection)
+            self.workers.append(worker)
+
+
+    def simulate(self):
+        """
+        Runs the cores window by window until every core has finished.
+        """
+        deadline = None if self.max_seconds is None else time.monotonic() + self.max_seconds
+        log = {}
+        try:
+            while True:
+                reports = {}
+                for report in self._each("run", log, self.window):
+                    reports.update(report)
+                log = {}
+                for core in sorted(reports): # Later cores win writes to the same address within a window.
+                    log.update(reports[core][0])
+                self.memory.apply(log)
+                self.clock = max(clock for _, _, clock in reports.values())
+                if all(finished for _, finished, _ in reports.values()):
+                    break
+                if deadline is not None and time.monotonic() > deadline:
+                    raise SimulationAborted("time limit of " + str(self.max_seconds) + " seconds exceeded")
+            self.results = {}
+            for results in self._each("results"):
+                self.results.update(results)
+        finally:
+            self._stop_workers()
+        raise Interrupt()
+
+
+    def _each(self, *message):
+        """
+        Sends a request to every group of cores, in parallel when they are in worker processes.
+        :param message: name of the CoreGroup method followed by its arguments.
+        :return: List of the replies of each group.
+        """
+        if not self.workers:
+            return [getattr(group, message[0])(*message[1:]) for group in self.groups]
+        for connection in self.groups:
+            connection.send(message)
+        replies = [connection.recv() for connection in self.groups]
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise reply
+        return replies
+
+
+    def _stop_workers(self):
+        """
+        Stops the worker processes.
+        """
+        for connection in self.groups if self.workers else []:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+
+
+    def shutdown(self, dump_file="./memory.out", dump_range=(None, None), dump_format="hex", dump_diff=False):
+        """
+        Displays the statistics and return registers of each core and does a memory dump.
+        :param dump_file: file to dump memory to (or None to skip the dump).
+        :param dump_range: (start, end) addresses of memory to dump.
+        :param dump_format: format of the memory dump (hex, binary, word or raw).
+        :param dump_diff: only dump words changed since the program was loaded.
+        """
+        if dump_file is not None:
+            MemoryDump(self.memory, self.initial_memory).write(dump_file, *dump_range, format=dump_format, diff=dump_diff)
+        print("EXECUTION COMPLETE!")
+        print("Clock cycles taken: " + str(self.clock) + " (" + str(self.cores) + " cores, " +
+              str(self.jobs) + " worker processes, " + str(self.window) + " cycle windows)")
+        for core in sorted(self.results):
+            result = self.results[core]
+            print("Core " + str(core) + ":")
+            for line in result["statistics"]:
+                print("    " + line)
+            print("    Return values: " + str(result["registers"][2]) + " " + str(result["registers"][3]))
+        if dump_file is not None:
+            print("See memory dump at " + str(dump_file))
+        exit(0)
+
+
+class CoreGroup():
+    """
+    Cores of a multi-core simulation stepped together, either in the simulating process or in a worker process.
+    """
+
+    def __init__(self, input_file, cores, count, entries, watchdog, max_cycles):
+        """
+        Constructor for the CoreGroup class.
+        :param input_file: input source machine code file.
+        :param cores: IDs of the cores in the group.
+        :param count: total number of cores.
+        :param entries: dictionary of core ID to entry address, for the cores with their own entry point.
+        :param watchdog: cycles without a commit after which a core aborts the simulation (or 0 to never abort).
+        :param max_cycles: cycles after which the simulation is aborted (or None for no limit).
+        """
+        self.cores = {}
+        self.finished = {}
+        for core in cores:
+            simulator = Simulator(input_file, None, watchdog=watchdog, max_cycles=max_cycles,
+                                  core=core, entry=entries.get(core))
+            simulator.register_file.value[27] = count # $k1 holds the number of cores.
+            simulator.memory.take_log()
+            self.cores[core] = simulator
+            self.finished[core] = False
+
+
+    def run(self, log, cycles):
+        """
+        Applies the writes every core made during the last window then runs each unfinished core through a window.
+        :param log: dictionary of address to byte written during the last window.
+        :param cycles: cycles in the window.
+        :return: Dictionary of core ID to (writes made during the window, finished, clock).
+        """
+        report = {}
+        for core, simulator in self.cores.items():
+            simulator.memory.apply(log)
+            try:
+                for _ in range(cycles):
+                    if self.finished[core]:
+                        break
+                    self.finished[core] = simulator.step()
+            except SimulationAborted as e:
+                raise SimulationAborted("core " + str(core) + ": " + str(e) + "\n" + "\n".join(simulator.diagnostic()))
+            report[core] = (simulator.memory.take_log(), self.finished[core], simulator.clock)
+        return report
+
+
+    def results(self):
+        """
+        Captures the outcome of each core once the simulation has finished.
+        :return: Dictionary of core ID to its statistics and final registers.
+        """
+        for simulator in self.cores.values():
+            simulator.syscalls.close() # Write out anything the core printed.
+        return {core: {"statistics": simulator.summary(), "registers": list(simulator.register_file.value)}
+                for core, simulator in self.cores.items()}
+
+
+def serve(connection, *group):
+    """
+    Main loop of a worker process, stepping a group of cores on request until told to stop.
+    :param connection: connection to the simulating process.
+    :param group: arguments of the CoreGroup.
+    """
+    try:
+        cores = CoreGroup(*group)
+    except Exception as e:
+        cores = e
+    while True:
+        message = connection.recv()
+        if message is None:
+            return
+        if isinstance(cores, Exception):
+            connection.send(cores)
+            continue
+        try:
+            connection.send(getattr(cores, message[0])(*message[1:]))
+        except SimulationAborted as e:
+            connection.send(e)
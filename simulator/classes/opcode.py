@@ -47,7 +47,7 @@ class Opcode():
         (0, 8)     : ("jr",   Type.R),
         (0, 16)    : ("mfhi", Type.R),
         (0, 18)    : ("mflo", Type.R),
-        (0, 38)    : ("syscall", Type.R)
+        (0, 12)    : ("syscall", Type.R)
     }
 
     def __init__(self, opcode, function):
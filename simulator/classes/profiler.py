@@ -0,0 +1,120 @@
+import json, os
+from collections import Counter
+
+
+class Profiler():
+    """
+    Attributes events of the simulation to the program counter of the instruction responsible for them.
+    With the symbol file written by the assembler the counts are reported per label and per source line.
+    """
+    # Event : column heading.
+    events = {
+        "committed": "Commits",
+        "stalls": "Stalls",
+        "mispredicts": "Mispred",
+        "icache_misses": "I$ miss",
+        "dcache_misses": "D$ miss"
+    }
+
+    def __init__(self, symbol_file=None):
+        """
+        Constructor for the Profiler class.
+        :param symbol_file: symbol file written by the assembler (or None to profile by address only).
+        """
+        self.counts = {event: Counter() for event in self.events}
+        self.source, self.labels, self.lines = None, {}, {}
+        if symbol_file is not None and os.path.exists(symbol_file):
+            f = open(symbol_file, "r")
+            symbols = json.load(f)
+            f.close()
+            self.source = symbols["source"]
+            self.labels = symbols["labels"]
+            self.lines = {int(address): line for address, line in symbols["lines"].items()}
+
+
+    def record(self, event, pc, count=1):
+        """
+        Counts an event against an instruction.
+        :param event: one of the events.
+        :param pc: address of the instruction responsible.
+        :param count: number of occurrences.
+        """
+        self.counts[event][pc] += count
+
+
+    def flat_profile(self):
+        """
+        Builds a flat profile of the events summed per label, busiest first.
+        Each address belongs to the closest label at or before it.
+        :return: List of lines of text.
+        """
+        starts = sorted((address, label) for label, address in self.labels.items())
+        totals = {}
+        for event, counter in self.counts.items():
+            for pc, count in counter.items():
+                label = "0x{0:08x}".format(pc)
+                for address, name in starts:
+                    if address > pc:
+                        break
+                    label = name
+                totals.setdefault(label, Counter())[event] += count
+        rows = sorted(totals.items(), key=lambda item: (-item[1]["committed"] - item[1]["stalls"], item[0]))
+        lines = [self._heading("Label")]
+        for label, counter in rows:
+            lines.append(self._row(label, counter))
+        return lines
+
+
+    def annotated_source(self):
+        """
+        Builds a listing of the source with the events of every line alongside it.
+        :return: List of lines of text (empty without a readable source file).
+        """
+        if self.source is None or not os.path.exists(self.source):
+            return []
+        per_line = {}
+        for event, counter in self.counts.items():
+            for pc, count in counter.items():
+                if pc in self.lines:
+                    per_line.setdefault(self.lines[pc], Counter())[event] += count
+        f = open(self.source, "r")
+        source = f.read().split("\n")
+        f.close()
+        lines = [self._heading("Line")]
+        for number, text in enumerate(source, 1):
+            counter = per_line.get(number)
+            if counter is None:
+                lines.append(" " * (9 * len(self.events) + 1) + str(number).rjust(8) + " | " + text)
+            else:
+                lines.append(self._row(str(number), counter) + " | " + text)
+        return lines
+
+
+    def write(self, path):
+        """
+        Writes the flat profile followed by the annotated source to a file.
+        :param path: file to write the profile to.
+        """
+        f = open(path, "w")
+        f.write("\n".join(["FLAT PROFILE"] + self.flat_profile() + ["", "ANNOTATED SOURCE"] +
+                          self.annotated_source()) + "\n")
+        f.close()
+
+
+    def _heading(self, title):
+        """
+        Builds the column headings of a report.
+        :param title: heading of the first column.
+        :return: Line of text.
+        """
+        return "".join(heading.rjust(9) for heading in self.events.values()) + " " + title.rjust(8)
+
+
+    def _row(self, name, counter):
+        """
+        Builds a row of a report.
+        :param name: label or line number the counts belong to.
+        :param counter: counts of each event.
+        :return: Line of text.
+        """
+        return "".join(str(counter[event]).rjust(9) for event in self.events) + " " + name.rjust(8)
@@ -0,0 +1,71 @@
+import json, socket, sys
+from classes.constants import progress_interval
+
+
+class ProgressStream():
+    """
+    Streams a JSON lines record of the progress of a simulation every few cycles, so long headless runs
+    can be monitored and stuck ones spotted. Records go to a file, a named pipe, stdout or a Unix socket.
+    If the reader goes away the stream is dropped and the simulation carries on.
+    """
+
+    def __init__(self, target, interval=progress_interval):
+        """
+        Constructor for the ProgressStream class.
+        :param target: file or named pipe to write to, - for stdout or unix:PATH to connect to a Unix socket.
+        :param interval: cycles between records.
+        """
+        self.interval = interval
+        self.connection = None
+        if target == "-":
+            self.stream = sys.stdout
+        elif target.startswith("unix:"):
+            self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.connection.connect(target[len("unix:"):])
+            self.stream = self.connection.makefile("w", buffering=1)
+        else:
+            self.stream = open(target, "w", buffering=1) # Line buffered so each record is seen as it is written.
+        self.cycle, self.committed = 0, 0 # Totals at the previous record.
+
+
+    def report(self, simulator, finished=False):
+        """
+        Writes a record of the state of a simulation.
+        :param simulator: Simulator to report on.
+        :param finished: whether this is the final record of the simulation.
+        """
+        if self.stream is None:
+            return
+        cycles = simulator.clock - self.cycle
+        committed = simulator.instructions_committed - self.committed
+        record = {
+            "cycle": simulator.clock,
+            "pc": simulator.threads[0].pc,
+            "committed": simulator.instructions_committed,
+            "ipc": round(committed / cycles, 3) if cycles else 0.0,
+            "rob": len(simulator.reorder_buffer.queue),
+            "rs": len(simulator.reservation_station.queue),
+            "mispredicts": sum(thread.branch_predictor.incorrect_predictions for thread in simulator.threads),
+            "finished": finished
+        }
+        self.cycle, self.committed = simulator.clock, simulator.instructions_committed
+        try:
+            self.stream.write(json.dumps(record) + "\n")
+        except OSError: # Nobody is listening any more.
+            self.stream = None
+
+
+    def close(self, simulator):
+        """
+        Writes the final record of a simulation and closes the stream.
+        :param simulator: Simulator which has finished.
+        """
+        self.report(simulator, finished=True)
+        if self.stream is not None and self.stream is not sys.stdout:
+            try:
+                self.stream.close()
+            except OSError:
+                pass
+        if self.connection is not None:
+            self.connection.close()
+        self.stream = None
@@ -1,64 +1,47 @@
 class RegisterFile():
+    """
+    Register file stored as parallel value, valid and ROB entry vectors indexed by register number.
+    """
+    # Static table of register names indexed by register number.
+    names = (
+        "zero", "at", "v0", "v1", "a0", "a1", "a2", "a3",
+        "t0", "t1", "t2", "t3", "t4", "t5", "t6", "t7",
+        "s0", "s1", "s2", "s3", "s4", "s5", "s6", "s7",
+        "t8", "t9", "k0", "k1", "gp", "sp", "fp", "ra",
+        "hi", "lo"
+    )
+    size = len(names)
+
+    # Templates used to reset the vectors in a single slice assignment.
+    _all_valid = [True] * size
+    _no_entries = [None] * size
+
     def __init__(self):
         """
         Constructor for the Register File class.
         """
-        self.reg = {
-            # Register_Number : [NAME, VALUE, VALID, ROB_ENTRY]
-            0:  {"name" : "zero", "value" : 0, "valid" : True, "rob_entry" : None},
-            1:  {"name" : "at", "value" : 0, "valid" : True, "rob_entry" : None},
-            2:  {"name" : "v0", "value" : 0, "valid" : True, "rob_entry" : None},
-            3:  {"name" : "v1", "value" : 0, "valid" : True, "rob_entry" : None},
-            4:  {"name" : "a0", "value" : 0, "valid" : True, "rob_entry" : None},
-            5:  {"name" : "a1", "value" : 0, "valid" : True, "rob_entry" : None},
-            6:  {"name" : "a2", "value" : 0, "valid" : True, "rob_entry" : None},
-            7:  {"name" : "a3", "value" : 0, "valid" : True, "rob_entry" : None},
-            8:  {"name" : "t0", "value" : 0, "valid" : True, "rob_entry" : None},
-            9:  {"name" : "t1", "value" : 0, "valid" : True, "rob_entry" : None},
-            10: {"name" : "t2", "value" : 0, "valid" : True, "rob_entry" : None},
-            11: {"name" : "t3", "value" : 0, "valid" : True, "rob_entry" : None},
-            12: {"name" : "t4", "value" : 0, "valid" : True, "rob_entry" : None},
-            13: {"name" : "t5", "value" : 0, "valid" : True, "rob_entry" : None},
-            14: {"name" : "t6", "value" : 0, "valid" : True, "rob_entry" : None},
-            15: {"name" : "t7", "value" : 0, "valid" : True, "rob_entry" : None},
-            16: {"name" : "s0", "value" : 0, "valid" : True, "rob_entry" : None},
-            17: {"name" : "s1", "value" : 0, "valid" : True, "rob_entry" : None},
-            18: {"name" : "s2", "value" : 0, "valid" : True, "rob_entry" : None},
-            19: {"name" : "s3", "value" : 0, "valid" : True, "rob_entry" : None},
-            20: {"name" : "s4", "value" : 0, "valid" : True, "rob_entry" : None},
-            21: {"name" : "s5", "value" : 0, "valid" : True, "rob_entry" : None},
-            22: {"name" : "s6", "value" : 0, "valid" : True, "rob_entry" : None},
-            23: {"name" : "s7", "value" : 0, "valid" : True, "rob_entry" : None},
-            24: {"name" : "t8", "value" : 0, "valid" : True, "rob_entry" : None},
-            25: {"name" : "t9", "value" : 0, "valid" : True, "rob_entry" : None},
-            26: {"name" : "k0", "value" : 0, "valid" : True, "rob_entry" : None},
-            27: {"name" : "k1", "value" : 0, "valid" : True, "rob_entry" : None},
-            28: {"name" : "gp", "value" : 0, "valid" : True, "rob_entry" : None},
-            29: {"name" : "sp", "value" : 0, "valid" : True, "rob_entry" : None},
-            30: {"name" : "fp", "value" : 0, "valid" : True, "rob_entry" : None},
-            31: {"name" : "ra", "value" : 0, "valid" : True, "rob_entry" : None},
-            32: {"name" : "hi", "value" : 0, "valid" : True, "rob_entry" : None},
-            33: {"name" : "lo", "value" : 0, "valid" : True, "rob_entry" : None}
-        }
+        self.value = [0] * self.size
+        self.valid = [True] * self.size
+        self.rob_entry = [None] * self.size
 
 
     def write(self, rob_instruction, rob):
         """
         Write a finished ROB item back to the register file.
-        :param rob_instruction: register number to update.
+        :param rob_instruction: finished Instruction held in the ROB.
         :param rob: re-order buffer to use.
-        :param stdscr: terminal to writeback to.
         :return: List of registers written to.
         """
         written_to = []
-        for register, value in rob_instruction["result"].items():
+        rob_entry = rob_instruction.rob_entry
+        for register, value in rob_instruction.result.items():
             if register == 0: # Cannot write to zero'th register
                 continue
-            self.reg[register]["value"] = value
-            if self.reg[register]["rob_entry"] == rob_instruction["instruction"].rob_entry:
-                self.reg[register]["valid"] = True
+            self.value[register] = value
+            if self.rob_entry[register] == rob_entry:
+                self.valid[register] = True
             written_to.append(register)
-        rob.mark_written(rob_instruction["instruction"].rob_entry)
+        rob.mark_written(rob_entry)
         return written_to
 
 
@@ -67,8 +50,7 @@ class RegisterFile():
         Sets all registers in register file to be valid.
         This is useful in a branch prediction failure.
         """
-        for key in self.reg.keys():
-            self.reg[key]["valid"] = True
+        self.valid[:] = self._all_valid
 
 
     def no_writebacks(self):
@@ -76,10 +58,7 @@ class RegisterFile():
         Checks that there are no pending writebacks to the main register file.
         :return: Boolean representing pending writeback status.
         """
-        for reg in self.reg:
-            if not self.reg[reg]["valid"]:
-                return False
-        return True
+        return False not in self.valid
 
 
     def get_value(self, register):
@@ -90,9 +69,9 @@ class RegisterFile():
         :return: Boolean representing whether the register is valid,
         and a value representing the raw value or the ROB entry id.
         """
-        if self.reg[register]["valid"]:
-            return True, self.reg[register]["value"]
-        return False, self.reg[register]["rob_entry"]
+        if self.valid[register]:
+            return True, self.value[register]
+        return False, self.rob_entry[register]
 
 
     def invalidate_register(self, register, rob_entry):
@@ -103,5 +82,33 @@ class RegisterFile():
         """
         if register == 0:
             return
-        self.reg[register]["valid"] = False
-        self.reg[register]["rob_entry"] = rob_entry
+        self.valid[register] = False
+        self.rob_entry[register] = rob_entry
+
+
+    def snapshot(self):
+        """
+        Takes a copy of the entire register file.
+        :return: Tuple of the value, valid and ROB entry vectors.
+        """
+        return tuple(self.value), tuple(self.valid), tuple(self.rob_entry)
+
+
+    def restore(self, snapshot):
+        """
+        Restores the register file to a previously taken snapshot.
+        :param snapshot: Snapshot returned by snapshot().
+        """
+        value, valid, rob_entry = snapshot
+        self.value[:] = value
+        self.valid[:] = valid
+        self.rob_entry[:] = rob_entry
+
+
+    def reset(self):
+        """
+        Clears every register back to a valid zero with no ROB entry.
+        """
+        self.value[:] = [0] * self.size
+        self.valid[:] = self._all_valid
+        self.rob_entry[:] = self._no_entries
@@ -0,0 +1,364 @@
+import curses, queue, threading, time
+from collections import namedtuple
+from classes.constants import N, instruction_time, snapshot_queue_size, input_poll_time
+
+
+# Immutable picture of the machine at the end of a single clock cycle.
+Snapshot = namedtuple("Snapshot", [
+    "pc",                     # Program counter.
+    "clock",                  # Clock cycles taken.
+    "instructions_executed",  # Total instructions executed.
+    "status",                 # Pipeline status message.
+    "registers",              # Tuple of (name, valid, value, rob_entry) for every register.
+    "written_to",             # Registers written to in this cycle.
+    "fetch",                  # Descriptions of instructions in the fetch stage.
+    "decode",                 # Descriptions of instructions in the decode stage.
+    "execute",                # Descriptions of instructions in the execute stage.
+    "writeback",              # Descriptions of instructions in the writeback stage.
+    "reservation_station",    # (pending count, tuple of (ready, description)).
+    "branch_predictor",       # (state, in recovery, prediction rate).
+    "common_data_bus",        # (broadcasts, contended cycles, delayed results, pending results).
+    "caches",                 # Tuple of (name, hits, misses, evictions, write backs, merged, MSHR stalls) per level.
+    "reorder_buffer"          # Tuple of (id, ready, written, description).
+])
+
+
+class Renderer(threading.Thread):
+    """
+    Draws simulator snapshots to the curses terminal on a thread separate to the simulation.
+    """
+    paused_help = "Press `SPACE' to resume execution, `c' to run to the next breakpoint or any other key to single step."
+
+    def __init__(self, stdscr, input_file, fast_forward=False):
+        """
+        Constructor for the Renderer class.
+        :param stdscr: curses terminal to draw to.
+        :param input_file: name of the program being simulated.
+        :param fast_forward: run at full speed without drawing until the simulation is paused.
+        """
+        super().__init__(daemon=True)
+        self.stdscr = stdscr
+        self.input_file = input_file
+        self.snapshots = queue.Queue(maxsize=snapshot_queue_size)
+        self.dropped_frames = 0
+        self.resumed = threading.Event()  # Set whilst the simulation is free running.
+        self.steps = threading.Semaphore(0)  # Released once per requested single step.
+        self.stopped = threading.Event()
+        self.fast_forward = threading.Event()  # Set whilst the simulation runs at full speed to a breakpoint.
+        self.paused = False  # Set by the simulation when a breakpoint fires, until the help line is redrawn.
+        self.error = None  # Exception the renderer thread died with, re-raised in the simulation.
+        if fast_forward:
+            self.fast_forward.set()
+
+
+    def publish(self, snapshot):
+        """
+        Hands a snapshot to the renderer without ever blocking the simulation.
+        If the renderer has fallen behind the oldest pending snapshot is dropped.
+        :param snapshot: Snapshot to draw.
+        """
+        self._check()
+        while True:
+            try:
+                self.snapshots.put_nowait(snapshot)
+                return
+            except queue.Full:
+                try:
+                    self.snapshots.get_nowait()
+                    self.dropped_frames += 1
+                except queue.Empty:
+                    pass
+
+
+    def wait(self):
+        """
+        Called by the simulation once per cycle.
+        Whilst paused this blocks until a single step is requested, otherwise it paces execution.
+        """
+        if self.resumed.is_set():
+            time.sleep(instruction_time)
+        else:
+            self.steps.acquire()
+        self._check()
+
+
+    def pause(self):
+        """
+        Called by the simulation when a breakpoint fires.
+        The cycle is drawn and the simulation waits for a key press as if it had been paused.
+        """
+        self.resumed.clear()
+        while self.steps.acquire(blocking=False): # Forget steps requested before the breakpoint fired.
+            pass
+        self.fast_forward.clear()
+        self.paused = True
+
+
+    def stop(self):
+        """
+        Stops the renderer thread, drawing any snapshot that is still pending.
+        Once this returns the calling thread owns the terminal again.
+        """
+        self.stopped.set()
+        self.join()
+        self._check()
+
+
+    def _check(self):
+        """
+        Re-raises in the simulation an exception the renderer thread died with, rather than waiting on it forever.
+        """
+        if self.error is not None:
+            raise self.error
+
+
+    def run(self):
+        """
+        Entry point of the renderer thread.
+        If drawing fails the exception is recorded and any waiting simulation is woken to re-raise it.
+        """
+        try:
+            self._loop()
+        except Exception as e:
+            self.error = e
+            self.resumed.set()
+            self.steps.release()
+
+
+    def _loop(self):
+        """
+        Main loop of the renderer thread: poll the keyboard and draw the latest snapshot.
+        """
+        self.setup_screen()
+        self.stdscr.timeout(int(input_poll_time * 1000))
+        while not self.stopped.is_set():
+            if self.paused:
+                self.paused = False
+                self.stdscr.addstr(51, 0, self.paused_help.ljust(92))
+            self._handle_input(self.stdscr.getch())
+            snapshot = self._latest_snapshot()
+            if snapshot is not None:
+                self.draw(snapshot)
+        snapshot = self._latest_snapshot()
+        if snapshot is not None:
+            self.draw(snapshot)
+
+
+    def _latest_snapshot(self):
+        """
+        Takes the most recent snapshot from the queue, discarding any older ones.
+        :return: Latest snapshot or None if nothing new has been published.
+        """
+        snapshot = None
+        while True:
+            try:
+                if snapshot is not None:
+                    self.dropped_frames += 1
+                snapshot = self.snapshots.get_nowait()
+            except queue.Empty:
+                return snapshot
+
+
+    def _handle_input(self, key):
+        """
+        Translates a key press into a pause/resume, run to the next breakpoint or single step request.
+        :param key: key code returned by getch (-1 if no key was pressed).
+        """
+        if key == -1 or self.fast_forward.is_set():
+            return
+        if key == ord("c"):
+            self.fast_forward.set()
+            self.steps.release()
+            self.stdscr.addstr(51, 0, "Running to the next breakpoint.".ljust(92))
+        elif key == 32:
+            if self.resumed.is_set():
+                self.resumed.clear()
+                self.stdscr.addstr(51, 0, self.paused_help.ljust(92))
+            else:
+                self.resumed.set()
+                self.steps.release()
+                self.stdscr.addstr(51, 0, "Press `SPACE' to pause execution.".ljust(92))
+        elif not self.resumed.is_set():
+            self.steps.release()
+
+
+    def setup_screen(self):
+        """
+        Sets up the curses terminal with the appropriate colour scheme.
+        """
+        curses.init_color(curses.COLOR_MAGENTA, 999, 0, 600)
+        curses.init_pair(1, curses.COLOR_GREEN, curses.COLOR_BLACK)
+        curses.init_pair(2, curses.COLOR_RED, curses.COLOR_BLACK)
+        curses.init_pair(3, curses.COLOR_BLUE, curses.COLOR_BLACK)
+        curses.init_pair(4, curses.COLOR_WHITE, curses.COLOR_BLACK)
+        curses.init_pair(5, curses.COLOR_YELLOW, curses.COLOR_BLACK)
+        curses.init_pair(6, curses.COLOR_CYAN, curses.COLOR_BLACK)
+        curses.init_pair(7, curses.COLOR_MAGENTA, curses.COLOR_BLACK)
+        self.stdscr.addstr(0, 100, "REGISTER FILE", curses.A_BOLD)
+        self.stdscr.addstr(0, 10, "MACHINE INFORMATION", curses.A_BOLD)
+        self.stdscr.addstr(2, 10, "Program: " + str(self.input_file), curses.color_pair(4))
+        self.stdscr.addstr(4, 35, "Cycles per second: " + str(1 / instruction_time)[:5], curses.color_pair(3))
+        self.stdscr.addstr(12, 10, "PIPELINE INFORMATION", curses.A_BOLD)
+        if self.fast_forward.is_set():
+            self.stdscr.addstr(51, 0, "Running to the first breakpoint.")
+        else:
+            self.stdscr.addstr(51, 0, self.paused_help)
+
+
+    def draw(self, snapshot):
+        """
+        Draws a snapshot of the simulator to the terminal.
+        :param snapshot: Snapshot to draw.
+        """
+        if snapshot.status == "NORMAL":
+            self.stdscr.addstr(25 + 3 * (N-1), 10, "Pipeline Status: NORMAL".ljust(64), curses.color_pair(1))
+        else:
+            self.stdscr.addstr(25 + 3 * (N-1), 10, ("Pipeline Status: " + snapshot.status).ljust(64), curses.color_pair(2))
+        self.stdscr.addstr(3, 10,
+                           "Program Counter: "
+                           + str(snapshot.pc),
+                           curses.color_pair(2))
+        self.stdscr.addstr(4, 10,
+                           "Clock Cycles Taken: "
+                           + str(snapshot.clock),
+                           curses.color_pair(3))
+        self.stdscr.addstr(5, 10,
+                           "Instructions Per Cycle: "
+                           + str(round(snapshot.instructions_executed/snapshot.clock, 2)),
+                           curses.color_pair(3))
+        self.stdscr.addstr(5, 40,
+                           "Instructions Executed: "
+                           + str(snapshot.instructions_executed),
+                           curses.color_pair(3))
+        for i, (name, valid, value, rob_entry) in enumerate(snapshot.registers):
+            offset = 100
+            if i >= 20:
+                offset += 25
+            color = 4
+            if i in snapshot.written_to:
+                color = 1
+            if valid:
+                valid = "\u2713"
+            else:
+                valid = "\u002E"
+            self.stdscr.addstr(i % 20 + 2, offset,
+                               str(name) + " v: " +
+                               valid + " " +
+                               str(value)[:6] + " rob: " +
+                               str(rob_entry).ljust(16),
+                               curses.color_pair(color))
+        for i in range(N):
+            self._draw_stage(14 + i, "Pipeline Fetch:     ", snapshot.fetch, i, 4)
+            self._draw_stage(14 + N + i + 1, "Pipeline Decode:    ", snapshot.decode, i, 1)
+            self._draw_stage(18 + 2*N + i + 3, "Pipeline Writeback: ", snapshot.writeback, i, 5)
+        for i in range(4):
+            self._draw_stage(14 + 2*N + i + 2, "Pipeline Execute:   ", snapshot.execute, i, 6)
+        self._draw_reservation_station(snapshot.reservation_station)
+        self._draw_branch_predictor(snapshot.branch_predictor)
+        self._draw_common_data_bus(snapshot.common_data_bus)
+        self._draw_caches(snapshot.caches)
+        self._draw_reorder_buffer(snapshot.reorder_buffer)
+        self.stdscr.refresh()
+
+
+    def _draw_stage(self, row, title, descriptions, i, color):
+        """
+        Draws a single slot of a pipeline stage.
+        :param row: terminal row to draw on.
+        :param title: name of the pipeline stage.
+        :param descriptions: instruction descriptions in the stage.
+        :param i: slot of the stage to draw.
+        :param color: colour pair to draw with.
+        """
+        if i < len(descriptions) and descriptions[i] is not None:
+            self.stdscr.addstr(row, 10, title + descriptions[i].ljust(64), curses.color_pair(color))
+        else:
+            self.stdscr.addstr(row, 10, (title + "Empty").ljust(72), curses.color_pair(color))
+
+
+    def _draw_reservation_station(self, reservation_station):
+        """
+        Prints the contents of the reservation station to the terminal.
+        :param reservation_station: reservation station snapshot.
+        """
+        pending, entries = reservation_station
+        self.stdscr.addstr(0, 150, "RESERVATION STATION".ljust(48), curses.A_BOLD)
+        self.stdscr.addstr(2, 150, "Pending Instructions: " + str(pending).ljust(24), curses.color_pair(6))
+        for i in range(20):
+            self.stdscr.addstr(4 + i, 150, "".ljust(52))
+        for i, (ready, description) in enumerate(entries):
+            if ready:
+                prefix = "\u2713 "
+            else:
+                prefix = "\u002E "
+            self.stdscr.addstr(4 + i, 150,
+                               "r: " + prefix +
+                               description.ljust(48),
+                               curses.color_pair(6))
+
+
+    def _draw_branch_predictor(self, branch_predictor):
+        """
+        Prints the state of the branch predictor to the terminal.
+        :param branch_predictor: branch predictor snapshot.
+        """
+        state, in_recovery, rate = branch_predictor
+        self.stdscr.addstr(7, 10, "BRANCH PREDICTOR".ljust(48), curses.A_BOLD)
+        self.stdscr.addstr(9, 10,
+                           "Current State: " +
+                           str(state) +
+                           ", Recovery Mode: " +
+                           str(in_recovery).ljust(24), curses.color_pair(7))
+        self.stdscr.addstr(10, 10,
+                           "Branch Prediction Rate: " +
+                           str(rate)
+                           + "%".ljust(8),
+                           curses.color_pair(7))
+
+
+    def _draw_common_data_bus(self, common_data_bus):
+        """
+        Prints the common data bus statistics to the terminal.
+        :param common_data_bus: common data bus snapshot.
+        """
+        broadcasts, contended_cycles, delayed_results, pending = common_data_bus
+        self.stdscr.addstr(11, 10,
+                           "Result Bus: " + str(broadcasts) + " broadcasts, " +
+                           str(contended_cycles) + " contended cycles, " +
+                           str(delayed_results) + " delayed results".ljust(24),
+                           curses.color_pair(7))
+
+
+    def _draw_caches(self, caches):
+        """
+        Prints the hit rate of every cache level to the terminal.
+        :param caches: tuple of cache snapshots.
+        """
+        rates = []
+        for name, hits, misses, *_ in caches:
+            accesses = hits + misses
+            rates.append(name + " " + str(round(100 * hits / accesses, 1) if accesses else 0.0) + "%")
+        self.stdscr.addstr(6, 10, ("Cache Hit Rates: " + ", ".join(rates)).ljust(64), curses.color_pair(3))
+
+
+    def _draw_reorder_buffer(self, reorder_buffer):
+        """
+        Prints the re-order buffer to the terminal.
+        :param reorder_buffer: re-order buffer snapshot.
+        """
+        self.stdscr.addstr(23, 100, "REORDER BUFFER".ljust(48), curses.A_BOLD)
+        for i in range(26):
+            self.stdscr.addstr(25 + i, 100, "".ljust(72))
+        for i, (key, ready, written, description) in enumerate(reorder_buffer):
+            if ready:
+                prefix_r = "\u2713 "
+            else:
+                prefix_r = "\u002E "
+            if written:
+                prefix_w = "\u2713 "
+            else:
+                prefix_w = "\u002E "
+            self.stdscr.addstr(25 + i, 100,
+                               "id: " + str(key) + " r: " + prefix_r + " w: " + prefix_w +
+                               description.ljust(56),
+                               curses.color_pair(5))
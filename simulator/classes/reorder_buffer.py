@@ -1,18 +1,23 @@
 from classes.constants import N
 from classes.errors import ResultNotReady
-import curses
 
 class ReOrderBuffer:
     """
     Class representing the re-order buffer.
+    Hardware threads share its capacity, each committing its own instructions in program order.
     """
-    def __init__(self):
+    def __init__(self, threads=1):
         """
         Constructor for the Re-Order Buffer class.
+        :param threads: number of hardware threads sharing the buffer.
         """
-        self.queue = { # Define a dictionary representing the re-order buffer queue
-            # ID : { "ready" : w, "instruction" : x, "result" : { y }, "written" : z }
+        self.queue = { # Define a dictionary representing the re-order buffer queue in program order
+            # ID : Instruction (holding its ready, written and result fields)
         }
+        self.next_key = 0
+        self.threads = threads
+        self.occupancy = [0] * threads # Entries held by each hardware thread.
+        self.released = [] # Instructions retired or squashed since the last collect().
 
 
     def insert_entry(self, instruction):
@@ -21,65 +26,63 @@ class ReOrderBuffer:
         :param Instruction: Instruction to insert.
         :return: Key at which the instruction is stored in the ROB.
         """
-        key = self._next_available_key()
-        self.queue[key] = {
-            "ready" : False,
-            "written" : False,
-            "instruction" : instruction,
-            "result" : {}
-        }
+        key = self.next_key
+        self.next_key += 1
+        instruction.ready = False
+        instruction.written = False
+        self.queue[key] = instruction
+        self.occupancy[instruction.thread] += 1
         return key
 
 
-    def _next_available_key(self):
-        """
-        Calculates the next available key in the ROB.
-        :return: Next available key.
-        """
-        try:
-            return max(self.queue.keys()) + 1 # We can do this as all keys are integers
-        except ValueError: # ROB is empty
-            return 0
-
-
     def get_finished_instructions(self):
         """
         Gets up to N finished instructions from the ROB.
-        Ready instructions are returned sequentially for writeback to ensure program correctness.
+        Ready instructions are returned sequentially for writeback to ensure program correctness,
+        so a thread's instructions stop at its oldest unfinished one whilst other threads carry on committing.
         :return: Instructions that have finished execution and are ready to be written back.
         """
         instructions = []
-        for key in range(len(self.queue)):
+        blocked = set() # Threads with an older instruction which has not finished.
+        for instruction in self.queue.values():
             if len(instructions) == N:
                 break
-            elif self.queue[key]["ready"] and not self.queue[key]["written"]:
-                instructions.append(self.queue[key])
-            elif self.queue[key]["ready"]:
+            if instruction.thread in blocked:
                 continue
-            else:
-                break
+            if not instruction.ready:
+                blocked.add(instruction.thread)
+                if len(blocked) == self.threads:
+                    break
+                continue
+            instructions.append(instruction)
         return instructions
 
 
-    def clear_block(self, instruction_block):
+    def clear_block(self, instruction_block, thread=0):
         """
         Clears all instructions after a particular speculative block.
         :param instruction_block: Instruction block to delete (and all subsequent blocks).
+        :param thread: hardware thread the block belongs to.
         """
-        for i in range(len(self.queue)):
-            if self.queue[i]["instruction"].block >= instruction_block:
-                del self.queue[i]
+        for key in list(reversed(self.queue)):
+            instruction = self.queue[key]
+            if instruction.thread != thread:
+                continue
+            if instruction.block < instruction_block:
+                break
+            self.released.append(self.queue.pop(key))
+            self.occupancy[thread] -= 1
 
 
-    def no_writebacks(self):
+    def no_writebacks(self, thread=None):
         """
         Checks if there are any pending writebacks in the re-order buffer.
+        :param thread: hardware thread to check (or None for every thread).
         :return: Boolean representing whether writebacks are pending.
         """
-        for key, value in self.queue.items():
-            if not value["written"]:
-                return False
-        return True
+        if thread is None:
+            return not self.queue
+        return not self.occupancy[thread]
 
 
     def get_result(self, rob_entry, register):
@@ -89,11 +92,28 @@ class ReOrderBuffer:
         :param register: Register in the result dictionary one wishes to obtain.
         :return: Value of register selected.
         """
-        if self.queue[rob_entry]["ready"]:
-            return self.queue[rob_entry]["result"][register]
+        if self.queue[rob_entry].ready:
+            return self.queue[rob_entry].result[register]
         raise ResultNotReady("Result is not yet ready for ROB entry: " + str(rob_entry))
 
 
+    def pending_store(self, address, rob_entry):
+        """
+        Finds the youngest store older than a load to an address which has executed but not yet been written back to memory.
+        Only stores of the load's own hardware thread are forwarded, those of other threads are seen once committed.
+        :param address: Address being loaded from.
+        :param rob_entry: ROB entry of the load.
+        :return: Boolean representing whether a store was found, and the value it stores.
+        """
+        thread = self.queue[rob_entry].thread
+        for key, instruction in reversed(self.queue.items()):
+            if key > rob_entry or instruction.thread != thread:
+                continue
+            if instruction.store is not None and instruction.store[0] == address:
+                return True, instruction.store[1]
+        return False, None
+
+
     def write_result(self, rob_entry, register, result):
         """
         Writes the result for an instruction to an entry in the ROB.
@@ -101,7 +121,7 @@ class ReOrderBuffer:
         :param register: Register to which the result belongs.
         :param result: Result of the execution.
         """
-        self.queue[rob_entry]["result"][register] = result
+        self.queue[rob_entry].result[register] = result
 
 
     def mark_ready(self, rob_entry):
@@ -109,46 +129,37 @@ class ReOrderBuffer:
         Mark a ROB entry as ready.
         :param rob_entry: ROB entry to mark.
         """
-        self.queue[rob_entry]["ready"] = True
+        self.queue[rob_entry].ready = True
 
 
     def mark_written(self, rob_entry):
         """
-        Mark a ROB entry as written.
+        Mark a ROB entry as written and retire it from the buffer.
         :param rob_entry: ROB entry to mark.
         """
-        self.queue[rob_entry]["written"] = True
-
-
-    def print(self, stdscr):
-        """
-        This prints the re-order buffer to the terminal provided.
-        :param stdscr: Terminal to print the re-order buffer to.
-        """
-        stdscr.addstr(23, 100, "REORDER BUFFER".ljust(48), curses.A_BOLD)
-        for i in range(26):
-            stdscr.addstr(25 + i, 100, "".ljust(72))
-        display = {}
-        for key in self.queue.keys():
-            try:
-                if self.queue[key+10]["ready"] and self.queue[key+10]["written"]:
-                    continue
-            except KeyError:
-                pass
-            if len(display) < 26:
-                display[key] = self.queue[key]
-        i = 0
-        for key in display.keys():
-            if display[key]["ready"]:
-                prefix_r = "\u2713 "
-            else:
-                prefix_r = "\u002E "
-            if display[key]["written"]:
-                prefix_w = "\u2713 "
-            else:
-                prefix_w = "\u002E "
-            stdscr.addstr(25 + i, 100,
-                          "id: " + str(key) + " r: " + prefix_r + " w: " + prefix_w +
-                          display[key]["instruction"].description().ljust(56),
-                          curses.color_pair(5))
-            i += 1
+        instruction = self.queue.pop(rob_entry)
+        instruction.written = True
+        self.occupancy[instruction.thread] -= 1
+        self.released.append(instruction)
+
+
+    def collect(self):
+        """
+        Hands over the instructions retired or squashed since the last call.
+        :return: List of Instruction objects no longer held by the ROB.
+        """
+        released, self.released = self.released, []
+        return released
+
+
+    def snapshot(self):
+        """
+        Builds an immutable snapshot of the re-order buffer for the renderer.
+        :return: Tuple of (id, ready, written, description) for up to 26 entries.
+        """
+        display = []
+        for key, instruction in self.queue.items():
+            if len(display) == 26:
+                break
+            display.append((key, instruction.ready, instruction.written, instruction.description()))
+        return tuple(display)
@@ -1,5 +1,4 @@
-import curses
-from classes.constants import N
+from classes.constants import N, load_store_ports
 
 class ReservationStation:
     """
@@ -15,32 +14,29 @@ class ReservationStation:
 
     def get_ready_instructions(self):
         """
-        This function will return the oldest ready instruction.
-        :return: Instruction or None depending on whether the instruction is ready to be executed.
+        This function will return the instructions ready to be issued, oldest first.
+        Instructions stay in the reservation station until they are removed once issued.
+        :return: List of instructions whose operands are ready.
         """
         self._update_dependencies()
-        instructions = []
-        for i in range(len(self.queue)):
-            try:
-                while self.queue[i]["ready"]:
-                    if self.queue[i]["instruction"].cycles > 1:
-                        instructions.append(self.queue[i]["instruction"])
-                        break
-                    else:
-                        instructions.append(self.queue.pop(i)["instruction"])
-            except IndexError:
-                break
-        return instructions
+        return [instruction for instruction in self.queue if instruction.operands_ready]
+
+
+    def remove(self, instructions):
+        """
+        Removes issued instructions from the reservation station.
+        :param instructions: Instructions to remove.
+        """
+        if instructions:
+            self.queue = [instruction for instruction in self.queue if instruction not in instructions]
 
 
     def add_instruction(self, instruction):
         """
         This function will add an instruction to the reservation station.
         """
-        self.queue.append({
-            "instruction" : instruction,
-            "ready" : self._calculate_readyness(instruction)
-        })
+        self.queue.append(instruction)
+        instruction.operands_ready = self._calculate_readyness(instruction)
 
 
     def _calculate_readyness(self, instruction):
@@ -49,93 +45,73 @@ class ReservationStation:
         :param instruction: Instruction to determine readyness of.
         :return: Boolean representing whether instruction is ready to be executed.
         """
-        valid_rs = False
-        valid_rt = False
-        if instruction.operands["rs"] == {} or instruction.operands["rs"]["valid"]:
-            valid_rs = True
-        elif self.reorder_buffer.queue[instruction.operands["rs"]["value"]]["ready"]:
-            valid_rs = True
-        if instruction.operands["rt"] == {} or instruction.operands["rt"]["valid"]:
-            valid_rt = True
-        elif self.reorder_buffer.queue[instruction.operands["rt"]["value"]]["ready"]:
-            valid_rt = True
-        # Ensure loads and stores are done in order.
+        # Operands are captured from the common data bus, so only their valid flags need checking.
+        valid_rs = instruction.rs_valid is not False
+        valid_rt = instruction.rt_valid is not False
+        # Ensure loads and stores of a thread are done in order, up to one per load/store port each cycle.
         if instruction.name in ["lw", "sw"]:
+            older = 0
             for item in self.queue:
-                if item["instruction"].name in ["lw", "sw"]:
-                    if item["instruction"] == instruction:
+                if item.name in ["lw", "sw"] and item.thread == instruction.thread:
+                    if item is instruction:
                         return valid_rs & valid_rt
-                    else:
+                    older += 1
+                    if item.rs_valid is False or item.rt_valid is False or older == load_store_ports:
                         return False
         return valid_rs & valid_rt
 
 
-    def clear_block(self, instruction_block):
+    def capture(self, instruction):
         """
-        Clears all instructions after a particular speculative block.
-        :param instruction_block: Instruction block to delete (and all subsequent blocks).
+        Captures a result broadcast on the common data bus into any instruction waiting on its ROB entry.
+        :param instruction: Instruction whose result is being broadcast.
         """
-        for i in range(len(self.queue)):
-            try:
-                while self.queue[i]["instruction"].block >= instruction_block:
-                    del self.queue[i]
-            except IndexError:
-                break
+        rob_entry, result = instruction.rob_entry, instruction.result
+        for item in self.queue:
+            if item.rs_valid is False and item.rs_value == rob_entry and item.rs in result:
+                item.rs_valid, item.rs_value = True, result[item.rs]
+            if item.rt_valid is False and item.rt_value == rob_entry and item.rt in result:
+                item.rt_valid, item.rt_value = True, result[item.rt]
 
 
-    def _update_dependencies(self):
+    def forward(self, instruction, register_file):
         """
-        This function will update the dependencies of the pending instructions.
+        Hands the written back results of a retiring instruction to any instruction still waiting on its ROB entry.
+        :param instruction: Instruction being retired.
+        :param register_file: Register file the results have just been written to.
         """
+        rob_entry = instruction.rob_entry
         for item in self.queue:
-            item["ready"] = self._calculate_readyness(item["instruction"]) # Clear previous dependencies
-        self._hardware_limitation()
+            if item.rs_valid is False and item.rs_value == rob_entry:
+                item.rs_valid, item.rs_value = True, register_file.value[item.rs]
+            if item.rt_valid is False and item.rt_value == rob_entry:
+                item.rt_valid, item.rt_value = True, register_file.value[item.rt]
 
 
-    def _hardware_limitation(self):
+    def clear_block(self, instruction_block, thread=0):
         """
-        Will change the ready flag of instructions in the reservation station to reflect hardware limitations.
+        Clears all instructions after a particular speculative block.
+        :param instruction_block: Instruction block to delete (and all subsequent blocks).
+        :param thread: hardware thread the block belongs to.
         """
-        lsu_list = ["lw", "sw"]
-        beu_list = ["beq", "bne", "blez", "bgtz", "j", "jal", "jr"]
-        lsu_instructions, beu_instructions, alu_instructions = [], [], []
-        for i in range(len(self.queue)):
-            instruction = self.queue[i]["instruction"]
-            if instruction.name in lsu_list and self.queue[i]["ready"]:
-                lsu_instructions.append(i)
-            elif instruction.name in beu_list and self.queue[i]["ready"]:
-                beu_instructions.append(i)
-            elif self.queue[i]["ready"]:
-                alu_instructions.append(i)
-        if len(lsu_instructions) > 1:
-            for ins in lsu_instructions[1:]:
-                self.queue[ins]["ready"] = False
-        if len(beu_instructions) > 1:
-            for ins in beu_instructions[1:]:
-                self.queue[ins]["ready"] = False
-        if len(alu_instructions) > 2:
-            for ins in alu_instructions[2:]:
-                self.queue[ins]["ready"] = False
+        self.queue = [instruction for instruction in self.queue
+                      if instruction.thread != thread or instruction.block < instruction_block]
 
 
-    def print(self, stdscr):
+    def _update_dependencies(self):
         """
-        Prints the contents of the reservation station to the terminal.
-        :param stdscr: terminal to print to.
+        This function will update the dependencies of the pending instructions.
         """
-        self._update_dependencies()
-        stdscr.addstr(0, 150, "RESERVATION STATION".ljust(48), curses.A_BOLD)
-        stdscr.addstr(2, 150, "Pending Instructions: " + str(len(self.queue)).ljust(24), curses.color_pair(6))
-        for i in range(20):
-            stdscr.addstr(4 + i, 150, "".ljust(52))
-        for i in range(min(20, len(self.queue))):
-            if self.queue[i]["ready"]:
-                prefix = "\u2713 "
-            else:
-                prefix = "\u002E "
-            stdscr.addstr(4 + i, 150,
-                          "r: " + prefix +
-                          self.queue[i]["instruction"].description().ljust(48),
-                          curses.color_pair(6))
+        for instruction in self.queue:
+            instruction.operands_ready = self._calculate_readyness(instruction) # Clear previous dependencies
 
 
+    def snapshot(self):
+        """
+        Builds an immutable snapshot of the reservation station for the renderer.
+        :return: Number of pending instructions and a tuple of (ready, description) for the first 20.
+        """
+        self._update_dependencies()
+        return len(self.queue), tuple(
+            (instruction.operands_ready, instruction.description()) for instruction in self.queue[:20]
+        )
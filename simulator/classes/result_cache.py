@@ -0,0 +1,129 @@
+import hashlib, os, pickle
+import classes.constants as constants
+
+
+class ResultCache():
+    """
+    Persistent content addressed store of finished simulation results.
+    Results are keyed by the program image, the machine configuration and the simulator version,
+    and the least recently used results are evicted once the store grows beyond its size limit.
+    """
+    # Constants which only affect presentation and so cannot change the result of a simulation.
+    presentation = ["instruction_time", "debug", "snapshot_queue_size", "input_poll_time",
+                    "result_cache_dir", "result_cache_size", "functional_hot_threshold", "functional_block_size",
+                    "progress_interval", "watchdog_cycles", "syscall_buffer_size"]
+    _version = None
+
+    def __init__(self, directory=constants.result_cache_dir, max_size=constants.result_cache_size):
+        """
+        Constructor for the ResultCache class.
+        :param directory: directory the results are stored in.
+        :param max_size: total size in bytes the stored results may take up.
+        """
+        self.directory = os.path.expanduser(directory)
+        self.max_size = max_size
+
+
+    def key(self, memory, pc):
+        """
+        Computes the key of a simulation.
+        :param memory: memory image as it was loaded.
+        :param pc: entry point of the program.
+        :return: Hex digest identifying the simulation.
+        """
+        config = sorted((name, value) for name, value in vars(constants).items()
+                        if not name.startswith("_") and name not in self.presentation)
+        digest = hashlib.sha256()
+        digest.update(self.version().encode('utf-8'))
+        digest.update(repr(config).encode('utf-8'))
+        digest.update(repr((pc, sorted(memory.items()))).encode('utf-8'))
+        return digest.hexdigest()
+
+
+    def get(self, key):
+        """
+        Looks up a stored result, marking it as recently used.
+        :param key: key of the simulation.
+        :return: The stored result or None if there is none.
+        """
+        path = self._path(key)
+        try:
+            f = open(path, "rb")
+        except OSError:
+            return None
+        try:
+            result = pickle.load(f)
+        except (pickle.UnpicklingError, EOFError, ValueError):
+            return None # A damaged entry is simply treated as a miss and replaced.
+        finally:
+            f.close()
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return result
+
+
+    def put(self, key, result):
+        """
+        Stores a result, evicting the least recently used results if the store is full.
+        :param key: key of the simulation.
+        :param result: result to store.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        temporary = path + "." + str(os.getpid()) + ".tmp"
+        f = open(temporary, "wb")
+        try:
+            pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+        finally:
+            f.close()
+        os.replace(temporary, path) # Concurrent simulations never see a partially written result.
+        self._evict()
+
+
+    def _evict(self):
+        """
+        Removes the least recently used results until the store fits within its size limit.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".result"):
+                stat = os.stat(os.path.join(self.directory, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total -= size
+
+
+    def _path(self, key):
+        """
+        Gets the file holding the result for a key.
+        :param key: key of the simulation.
+        :return: Path of the result file.
+        """
+        return os.path.join(self.directory, key + ".result")
+
+
+    @classmethod
+    def version(cls):
+        """
+        Identifies the simulator version by the source code of its classes, excluding the configuration.
+        :return: Hex digest of the simulator source.
+        """
+        if cls._version is None:
+            directory = os.path.dirname(os.path.abspath(__file__))
+            digest = hashlib.sha256()
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(".py") and name != "constants.py":
+                    f = open(os.path.join(directory, name), "rb")
+                    digest.update(f.read())
+                    f.close()
+            cls._version = digest.hexdigest()
+        return cls._version
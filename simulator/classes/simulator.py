@@ -1,71 +1,156 @@
-import pickle, curses, time
+import pickle, curses, copy, sys, time
+from collections import deque
 from classes.instruction import Instruction, Type
 from classes.execution_unit import ExecutionUnit
 from classes.register_file import RegisterFile
-from classes.constants import debug, instruction_time, N
-from classes.errors import Interrupt, AlreadyExecutingInstruction, UnsupportedInstruction
-from classes.branch_predictor import BranchPredictor
+from classes.constants import debug, N, fetch_queue_size, taken_branches_per_fetch, reservation_station_size, alu_units
+from classes.constants import load_store_ports, watchdog_cycles, fetch_policy, fetch_threads
+from classes.constants import l1i_cache, l1d_cache, l2_cache, memory_latency
+from classes.errors import Interrupt, AlreadyExecutingInstruction, UnsupportedInstruction, SimulationAborted
+from classes.errors import NoFreeMSHR
+from classes.errors import InvalidSyscall
 from classes.reservation_station import ReservationStation
 from classes.reorder_buffer import ReOrderBuffer
+from classes.renderer import Renderer, Snapshot
+from classes.memory_dump import MemoryDump
+from classes.common_data_bus import CommonDataBus
+from classes.cache import build_hierarchy
+from classes.memory import PagedMemory
+from classes.hardware_thread import HardwareThread
+from classes.syscalls import SystemCalls
 
 
 class Simulator():
     """
     This is the class for the main processor simulator.
+    The core can run several hardware threads at once (SMT), fetching from them according to a fetch policy.
     """
+    # Orders in which hardware threads can be offered fetch slots.
+    fetch_policies = ["round_robin", "icount"]
 
-    def __init__(self, input_file, stdscr):
+    def __init__(self, input_file, stdscr, profiler=None, progress=None, debugger=None,
+                 max_cycles=None, max_seconds=None, watchdog=watchdog_cycles, core=0, entry=None,
+                 threads=1, entries=None, fetch_policy=fetch_policy, syscalls=None):
         """
         Constructor for the Simulator class.
         :param input_file: input source machine code file.
+        :param stdscr: curses terminal to render to (or None to run headless).
+        :param profiler: Profiler to attribute events to instructions with (or None to not profile).
+        :param progress: ProgressStream to report progress to periodically (or None to not report).
+        :param debugger: Debugger whose breakpoints and watchpoints pause the simulation (or None).
+        :param max_cycles: cycles after which the simulation is aborted (or None for no limit).
+        :param max_seconds: wall clock seconds after which the simulation is aborted (or None for no limit).
+        :param watchdog: cycles without a commit after which the simulation is aborted (or 0 to never abort).
+        :param core: core ID, held in $k0, which also selects the core's stack.
+        :param entry: address the core starts at (or None for the entry point of the program).
+        :param threads: number of hardware threads the core runs.
+        :param entries: dictionary of thread ID to entry address, for the threads with their own entry point.
+        :param fetch_policy: order the hardware threads are offered fetch slots in (round_robin or icount).
+        :param syscalls: SystemCalls carrying out the program's syscalls (or None to use the console).
         """
         # Re-construct the binary file and parse it.
         f = open(input_file, "rb")
-        self.memory = pickle.load(f)
-        self.pc = pickle.load(f)
+        self.memory = PagedMemory(pickle.load(f))
+        pc = pickle.load(f)
         f.close()
+        if entry is not None:
+            pc = entry
+        self.core = core
+        self.fetch_policy = fetch_policy
+        self.initial_memory = self.memory.fork()  # Keep the loaded image to diff the final memory against.
         # Set the internal clock, total number of instructions executed and define a global register file.
         self.clock = 0
-        self.intercept = True
+        self.status = "NORMAL"
         self.instructions_executed = 0
-        self.register_file = RegisterFile()
-        self.register_file.reg[29]["value"] = (max(self.memory) + 1) + (1000 * 4)  # Initialise the stack pointer (1000 words).
+        self.instructions_committed = 0
+        self.statistics = None # Statistics of a cached result, when one is loaded instead of simulating.
+        self.profiler = profiler
+        self.progress = progress
+        self.debugger = debugger
+        self.syscalls = syscalls if syscalls is not None else SystemCalls()
+        self.max_cycles = max_cycles
+        self.max_seconds = max_seconds
+        self.watchdog = watchdog
+        self.last_commit = 0 # Cycle of the most recent commit, watched for a lack of progress.
+        # Define the hardware threads, each with its own pc, register file and branch predictor.
+        entries = entries or {}
+        self.threads = [HardwareThread(thread, entries.get(thread, pc)) for thread in range(threads)]
+        top = max(self.memory) + 1
+        for thread in self.threads:
+            # Initialise the stack pointer, each hardware thread has a stack of 1000 words above the program.
+            thread.register_file.value[29] = top + (1000 * 4) * (core * threads + thread.thread + 1)
+            thread.register_file.value[26] = core * threads + thread.thread # $k0 holds the core (and thread) ID.
+            if threads > 1:
+                thread.register_file.value[27] = threads # $k1 holds the number of threads.
+        # The first thread, which is the only one unless simulating SMT, is the one shown and reported on.
+        self.register_file = self.threads[0].register_file
+        self.branch_predictor = self.threads[0].branch_predictor
+        # Define the cache hierarchy modelling the timing of instruction and data accesses.
+        self.instruction_cache, self.data_cache, self.caches, self.main_memory = build_hierarchy(
+            l1i_cache, l1d_cache, l2_cache, memory_latency)
         # Define some execution units able to execute instructions in a superscalar manner.
-        self.master_eu = ExecutionUnit(self.memory, self.register_file)
-        self.slave_eu = ExecutionUnit(self.memory, self.register_file, alu=True, lsu=False, beu=False)
-        # Define a branch predictor to optimise the global pipeline.
-        self.branch_predictor = BranchPredictor()
+        self.master_eu = ExecutionUnit(self.memory, self.register_file, data_cache=self.data_cache,
+                                       branch_predictors=[thread.branch_predictor for thread in self.threads])
+        self.execution_units = [self.master_eu] + [
+            ExecutionUnit(self.memory, self.register_file, alu=i < alu_units, lsu=i < load_store_ports, beu=False,
+                          data_cache=self.data_cache)
+            for i in range(1, max(alu_units, load_store_ports))
+        ]
         # Define a re-order buffer for register renaming and out of order execution.
-        self.reorder_buffer = ReOrderBuffer()
+        self.reorder_buffer = ReOrderBuffer(threads)
         # Define a reservation station to allow for dispatch of instructions.
         self.reservation_station = ReservationStation(self.reorder_buffer)
+        # Define a common data bus to broadcast results to the re-order buffer and reservation station.
+        self.common_data_bus = CommonDataBus(self.reorder_buffer, self.reservation_station)
+        # Define the contents of the pipeline stages.
+        self.fetch_queue = deque() # Instructions fetched but not yet decoded.
+        self.fetched, self.decoding = [], []
+        self.now_executing, self.now_finished, self.now_writing = [], [], []
+        self.released = []
         self.stdscr = stdscr  # Define the curses terminal
-        if not debug:
-            self.setup_screen(input_file)  # Setup the initial curses layout
+        self.renderer = None
+        if not debug and stdscr is not None:
+            # Draw to the terminal on a separate thread, running at full speed to the first breakpoint if there are any.
+            self.renderer = Renderer(stdscr, input_file, fast_forward=debugger is not None)
+            self.renderer.start()
 
 
     def simulate(self):
         """
         The main simulate function controlling the:
         fetch, decode, execute and writeback.
+        The pipeline carries on from where it was, so a simulation which was aborted or forked can be resumed.
         """
-        empty_state = [None for _ in range(N)]
-        self.raw_instructions = empty_state
-        self.prev_raw_instructions = empty_state
-        self.exec_results = RegisterFile() # Blank register files.
-        self.prev_exec_results = RegisterFile()
-        self.now_executing, self.now_writing = [], []
-        while True:
-            self.clock += 1
-            self.advance_pipeline()
-            # Check if program is finished.
-            finished = self.raw_instructions == empty_state # Nothing fetched
-            finished &= self.prev_raw_instructions == empty_state # Nothing to decode
-            finished &= len(self.reservation_station.queue) == 0 # Nothing to execute
-            finished &= self.reorder_buffer.no_writebacks() # Nothing to writeback
-            finished &= not self.branch_predictor.in_recovery
-            if finished:
-                raise Interrupt()
+        if self.debugger is not None:
+            self.debugger.start(self)
+        deadline = None if self.max_seconds is None else time.monotonic() + self.max_seconds
+        while not self.step():
+            if deadline is not None and not self.clock % 1024 and time.monotonic() > deadline:
+                raise SimulationAborted("time limit of " + str(self.max_seconds) + " seconds exceeded")
+        raise Interrupt()
+
+
+    def step(self):
+        """
+        Advances the simulation by a single clock cycle.
+        :return: Boolean representing whether the program has finished.
+        """
+        self.clock += 1
+        self.advance_pipeline()
+        if self.progress is not None and self.clock % self.progress.interval == 0:
+            self.progress.report(self)
+        # Check if program is finished.
+        finished = not self.fetch_queue # Nothing fetched or left to decode
+        finished &= len(self.reservation_station.queue) == 0 # Nothing to execute
+        finished &= self.reorder_buffer.no_writebacks() # Nothing to writeback
+        # No miss or recovery outstanding in any thread which has not exited.
+        finished &= all(thread.exited or thread.can_fetch(self.clock) for thread in self.threads)
+        # A program finishing on the last cycle of its budget has not run away.
+        if not finished and self.clock == self.max_cycles:
+            raise SimulationAborted("cycle budget of " + str(self.max_cycles) + " cycles exhausted")
+        if not finished and self.watchdog and self.clock - self.last_commit >= self.watchdog:
+            raise SimulationAborted("no instruction committed for " + str(self.watchdog) + " cycles")
+        return finished
 
 
     def advance_pipeline(self):
@@ -73,52 +158,133 @@ class Simulator():
         This function will advance the pipeline by one stage.
         :param pipeline: Pipeline to be advanced.
         """
-        if not debug:
-            self.stdscr.addstr(25+ 3 * (N-1), 10, "Pipeline Status: NORMAL".ljust(64), curses.color_pair(1))  # Clear warnings
-        # Check if system has finished recovering from failed branch
-        if self.branch_predictor.in_recovery and self.reorder_buffer.no_writebacks():
-            self.branch_predictor.in_recovery = False
-            self.register_file.set_all_valid()
+        self.status = "NORMAL"  # Clear warnings
+        # Check if any thread has finished recovering from failed branch
+        for thread in self.threads:
+            if thread.branch_predictor.in_recovery and self.reorder_buffer.no_writebacks(thread.thread):
+                thread.branch_predictor.in_recovery = False
+                thread.register_file.set_all_valid()
         # Fetch Stage in Pipeline
-        if not self.branch_predictor.in_recovery and len(self.reservation_station.queue) <= 20-N:
-            self.raw_instructions = self.fetch()
+        self.fetched = self.fetch()
         # Writeback stage in pipeline
         written_to = self.writeback()
         # Execute Stage in Pipeline
         self.execute()
         # Decode Stage in Pipeline
-        if self.prev_raw_instructions != [None for _ in range(N)]:
-            self.decode(self.prev_raw_instructions)
-        # Do prints and prepare for next round
-        if not debug:
-            self.print_state(written_to)
-        self.prev_raw_instructions, self.raw_instructions = self.raw_instructions, [None for _ in range(N)]
-        self.now_writing = [ins for ins in self.now_executing if ins.cycles == 0 and ins.name != "sw"]
+        self.decoding = self._take_fetched()
+        if self.decoding:
+            self.decode(self.decoding)
+        # Publish the state of the machine and prepare for next round
+        if self.renderer is not None and not self.renderer.fast_forward.is_set():
+            self.renderer.publish(self.snapshot(written_to))
+            self.renderer.wait()
+        self.now_writing = [ins for ins in self.now_finished if ins.name != "sw"]
+        # Records retired or squashed last cycle can no longer be referenced by any stage so may be re-used.
+        Instruction.release(self.released)
+        self.released = self.reorder_buffer.collect()
 
 
     def fetch(self):
         """
-        This function fetches the appropriate instruction from memory.
-        :return: raw binary instruction (string).
+        This function fetches up to N instructions from memory into the fetch queue.
+        The slots are offered to the hardware threads in the order of the fetch policy,
+        and up to fetch_threads of them may fetch in a single cycle.
+        :return: List of fetch objects fetched this cycle.
+        """
+        fetched, threads = [], 0
+        for thread in self._fetch_order():
+            if len(fetched) == N or threads == fetch_threads:
+                break
+            fetched_from_thread = self._fetch_thread(thread, N - len(fetched))
+            if fetched_from_thread:
+                fetched += fetched_from_thread
+                threads += 1
+        return fetched
+
+
+    def _fetch_order(self):
+        """
+        Orders the hardware threads able to fetch this cycle by their priority under the fetch policy.
+        Round robin rotates the priority every cycle, whilst ICOUNT favours the threads with the fewest instructions
+        waiting to be decoded or issued so that no thread can clog the shared reservation station.
+        :return: List of HardwareThread objects.
+        """
+        count = len(self.threads)
+        threads = [self.threads[(self.clock + i) % count] for i in range(count)]
+        if self.fetch_policy == "icount" and count > 1:
+            waiting = [0] * count
+            for fetch_object in self.fetch_queue:
+                waiting[fetch_object["thread"]] += 1
+            for instruction in self.reservation_station.queue:
+                waiting[instruction.thread] += 1
+            threads.sort(key=lambda thread: waiting[thread.thread]) # Ties are broken round robin.
+        return [thread for thread in threads if thread.can_fetch(self.clock)]
+
+
+    def _fetch_thread(self, thread, slots):
+        """
+        Fetches instructions of a hardware thread into the fetch queue.
+        Fetch follows predicted branches, stopping after taken_branches_per_fetch redirections
+        and whenever the fetch queue is full.
+        An instruction cache access taking longer than a cycle stalls fetch for the thread until the line arrives,
+        and a syscall stalls it until the syscall has been carried out at commit.
+        :param thread: HardwareThread to fetch for.
+        :param slots: most instructions to fetch.
+        :return: List of fetch objects fetched.
         """
-        raw_instructions = []
-        for i in range(N):
+        fetched, taken, line = [], 0, None
+        while len(fetched) < slots and len(self.fetch_queue) < fetch_queue_size:
             try:
-                raw_instruction = ""
-                for offset in range(4):
-                    raw_instruction += self.memory[self.pc + offset]
-                prediction = self.branch_predictor.make_prediction(raw_instruction, self.pc)
-                raw_instructions.append({
-                    "pc": self.pc,
-                    "raw_instruction": raw_instruction,
-                    "prediction": prediction,
-                    "block" : self.branch_predictor.block
-                })
-                self.pc = prediction
-            except KeyError:
-                raw_instructions.append(None)
-                self.pc += 4
-        return raw_instructions
+                raw_instruction = self.memory.word(thread.pc)
+            except KeyError: # Nothing to fetch until the pc is redirected.
+                break
+            if self.instruction_cache is not None and thread.pc // self.instruction_cache.line_size != line:
+                line = thread.pc // self.instruction_cache.line_size
+                if line == thread.fetch_line: # The stall for this line has already been served.
+                    thread.fetch_line = None
+                else:
+                    misses = self.instruction_cache.misses
+                    # Fetch's own cycle covers one cycle of the access, anything longer stalls it.
+                    penalty = max(self.instruction_cache.access(thread.pc) - 1, 0)
+                    if penalty:
+                        thread.fetch_stall_until = self.clock + penalty
+                        thread.fetch_line = line
+                        if self.profiler is not None and self.instruction_cache.misses > misses:
+                            self.profiler.record("icache_misses", thread.pc)
+                        break
+            prediction = thread.branch_predictor.make_prediction(raw_instruction, thread.pc)
+            fetch_object = {
+                "pc": thread.pc,
+                "raw_instruction": raw_instruction,
+                "prediction": prediction,
+                "block" : thread.branch_predictor.block,
+                "thread" : thread.thread,
+                "cycle" : self.clock
+            }
+            self.fetch_queue.append(fetch_object)
+            fetched.append(fetch_object)
+            if prediction != thread.pc + 4:
+                taken += 1
+            thread.pc = prediction
+            if raw_instruction[0:6] == "000000" and raw_instruction[26:32] == "001100": # SYSCALL
+                thread.syscall_pending = True
+                break
+            if taken == taken_branches_per_fetch:
+                break
+        return fetched
+
+
+    def _take_fetched(self):
+        """
+        Removes the instructions to be decoded this cycle from the fetch queue.
+        Up to N instructions fetched in earlier cycles are taken, limited by the free space in the reservation station.
+        :return: List of fetch objects to decode.
+        """
+        space = min(N, reservation_station_size - len(self.reservation_station.queue))
+        taken = []
+        while len(taken) < space and self.fetch_queue and self.fetch_queue[0]["cycle"] < self.clock:
+            taken.append(self.fetch_queue.popleft())
+        return taken
 
 
     def decode(self, fetch_object):
@@ -130,12 +296,11 @@ class Simulator():
         instructions = []
         for instruction in fetch_object:
             if instruction is not None:
-                decoded_instruction = Instruction(instruction)
+                decoded_instruction = Instruction.allocate(instruction)
                 instructions.append(decoded_instruction)
                 key = self.reorder_buffer.insert_entry(decoded_instruction)
                 decoded_instruction.rob_entry = key
-                operands = self._get_operands(decoded_instruction)
-                decoded_instruction.operands = operands
+                self._get_operands(decoded_instruction)
                 self._writeback_analysis(decoded_instruction, key)
                 self.reservation_station.add_instruction(decoded_instruction)
             else:
@@ -146,36 +311,50 @@ class Simulator():
     def _get_operands(self, ins):
         """
         Given an instruction, this function will calculate the operands required for execution.
+        The rs and rt operand fields of the instruction are filled in, unused operands are left as None.
         :param ins: Instruction to calculate operands for.
-        :return: Dictionary of operands.
         """
-        operands = {
-            "rs" : {},
-            "rt" : {}
-        }
+        register_file = self.threads[ins.thread].register_file
         # Type R operands.
         if ins.type == Type.R:
-            if ins.name == "jr":
-                operands["rs"]["valid"], operands["rs"]["value"] = self.register_file.get_value(ins.rs)
+            if ins.name == "syscall": # Reads the architectural registers once it commits.
+                pass
+            elif ins.name == "jr":
+                ins.rs_valid, ins.rs_value = self._read_register(register_file, ins.rs)
             elif ins.name == "mfhi":
-                operands["rs"]["valid"], operands["rs"]["value"] = self.register_file.get_value(32)
+                ins.rs_valid, ins.rs_value = self._read_register(register_file, 32)
                 ins.rs = 32
             elif ins.name == "mflo":
-                operands["rs"]["valid"], operands["rs"]["value"] = self.register_file.get_value(33)
+                ins.rs_valid, ins.rs_value = self._read_register(register_file, 33)
                 ins.rs = 33
             elif ins.name in ["sll", "sra"]:
-                operands["rt"]["valid"], operands["rt"]["value"] = self.register_file.get_value(ins.rt)
+                ins.rt_valid, ins.rt_value = self._read_register(register_file, ins.rt)
             else:
-                operands["rs"]["valid"], operands["rs"]["value"] = self.register_file.get_value(ins.rs)
-                operands["rt"]["valid"], operands["rt"]["value"] = self.register_file.get_value(ins.rt)
+                ins.rs_valid, ins.rs_value = self._read_register(register_file, ins.rs)
+                ins.rt_valid, ins.rt_value = self._read_register(register_file, ins.rt)
         # Type I operands.
         elif ins.type == Type.I and ins.name != "lui":
             if ins.name in ["beq", "bne", "sw"]:
-                operands["rs"]["valid"], operands["rs"]["value"] = self.register_file.get_value(ins.rs)
-                operands["rt"]["valid"], operands["rt"]["value"] = self.register_file.get_value(ins.rt)
+                ins.rs_valid, ins.rs_value = self._read_register(register_file, ins.rs)
+                ins.rt_valid, ins.rt_value = self._read_register(register_file, ins.rt)
             else:
-                operands["rs"]["valid"], operands["rs"]["value"] = self.register_file.get_value(ins.rs)
-        return operands
+                ins.rs_valid, ins.rs_value = self._read_register(register_file, ins.rs)
+
+
+    def _read_register(self, register_file, register):
+        """
+        Reads a register for a decoding instruction.
+        If the register is waiting on a ROB entry whose result has already been broadcast the result is bypassed.
+        :param register_file: register file of the instruction's hardware thread.
+        :param register: The register to read.
+        :return: Boolean representing whether the value is available, and the value or the ROB entry id.
+        """
+        valid, value = register_file.get_value(register)
+        if not valid:
+            entry = self.reorder_buffer.queue[value]
+            if entry.ready and register in entry.result:
+                return True, entry.result[register]
+        return valid, value
 
 
     def _writeback_analysis(self, ins, key):
@@ -185,56 +364,89 @@ class Simulator():
         :param ins: Instruction to inspect.
         :param key: Re-order buffer entry id.
         """
+        register_file = self.threads[ins.thread].register_file
         if ins.type == Type.R:
             if ins.name == "mult":  # Special case for MULT
-                self.register_file.invalidate_register(33, key)
+                register_file.invalidate_register(33, key)
             elif ins.name == "div":  # Special case for DIV
-                self.register_file.invalidate_register(33, key)
-                self.register_file.invalidate_register(32, key)
-            elif ins.name == "jr":
+                register_file.invalidate_register(33, key)
+                register_file.invalidate_register(32, key)
+            elif ins.name in ["jr", "syscall"]:
                 pass
             else:
-                self.register_file.invalidate_register(ins.rd, key)
+                register_file.invalidate_register(ins.rd, key)
         elif ins.type == Type.I:
             if ins.name in ["beq", "bgtz", "blez", "bne", "sw"]:
                 pass
             else:
-                self.register_file.invalidate_register(ins.rt, key)
+                register_file.invalidate_register(ins.rt, key)
         elif ins.type == Type.J:
             if ins.name == "jal":  # Special case for JAL
-                self.register_file.invalidate_register(31, key)
+                register_file.invalidate_register(31, key)
 
 
     def execute(self):
         """
-        This function executes the Instruction object.
-        :param instruction: Instruction object to be executed.
+        This function issues ready instructions to the execution units and handles those finishing execution.
         """
-        self.now_executing = []
-        instructions = self.reservation_station.get_ready_instructions()
-        for instruction in instructions:
-            try:
-                pc = self.master_eu.execute(instruction, self.reorder_buffer)
-            except AlreadyExecutingInstruction:
+        self.now_executing, self.now_finished = [], []
+        memory_blocked = set() # Loads and stores of a thread issue in order, so none may pass one which could not issue.
+        for instruction in self.reservation_station.get_ready_instructions():
+            memory = instruction.name in ["lw", "sw"]
+            if memory and instruction.thread in memory_blocked:
+                continue
+            misses = self.data_cache.misses if self.data_cache is not None else 0
+            mshr_stall = False
+            for execution_unit in self.execution_units:
                 try:
-                    pc = self.slave_eu.execute(instruction, self.reorder_buffer)
+                    execution_unit.execute(instruction, self.reorder_buffer, self.clock)
+                except NoFreeMSHR:
+                    mshr_stall = True
+                    continue
                 except (AlreadyExecutingInstruction, UnsupportedInstruction):
-                    raise AlreadyExecutingInstruction("Dispatcher Failed...")
-            if instruction.cycles == 0:
-                self.instructions_executed += 1
-            self.now_executing.append(instruction)
-            if instruction.name in ["beq", "bne", "blez", "bgtz", "jr"] and pc != instruction.prediction:
-                self.branch_predictor.incorrect_predictions += 1
-                self.reservation_station.clear_block(instruction.block)
-                self.reorder_buffer.clear_block(instruction.block)
-                self.branch_predictor.in_recovery = True
-                self.branch_predictor.remove_invalid_returns(instruction.block)
-                self.flush_pipeline()
-                self.pc = pc
+                    continue
+                self.now_executing.append(instruction)
+                if self.profiler is not None and memory and self.data_cache is not None and self.data_cache.misses > misses:
+                    self.profiler.record("dcache_misses", instruction.pc)
                 break
+            else:
+                if mshr_stall: # Counted once however many free ports were turned away.
+                    self.data_cache.mshr_stalls += 1
+                if memory:
+                    memory_blocked.add(instruction.thread)
+        self.reservation_station.remove(self.now_executing)
+        # Collect the instructions finishing this cycle, oldest first.
+        finished = []
+        for execution_unit in self.execution_units:
+            finished += execution_unit.complete(self.clock)
+        finished.sort(key=lambda item: item[0].rob_entry)
+        squashed = {} # Thread : oldest block squashed by a mispredict this cycle.
+        for instruction, pc in finished:
+            if instruction.block >= squashed.get(instruction.thread, instruction.block + 1):
+                continue
+            self.instructions_executed += 1
+            self.common_data_bus.submit(instruction, self.clock)
+            self.now_finished.append(instruction)
+            if instruction.name in ["beq", "bne", "blez", "bgtz", "jr"] and pc != instruction.prediction:
+                thread = self.threads[instruction.thread]
+                thread.branch_predictor.incorrect_predictions += 1
+                if self.profiler is not None:
+                    self.profiler.record("mispredicts", instruction.pc)
+                self.reservation_station.clear_block(instruction.block, thread.thread)
+                self.reorder_buffer.clear_block(instruction.block, thread.thread)
+                self.common_data_bus.clear_block(instruction.block, thread.thread)
+                for execution_unit in self.execution_units:
+                    execution_unit.clear_block(instruction.block, thread.thread)
+                thread.branch_predictor.in_recovery = True
+                thread.branch_predictor.remove_invalid_returns(instruction.block)
+                self.flush_pipeline(thread)
+                thread.pc = pc
+                squashed[thread.thread] = instruction.block
+        # Broadcast finished results to dependent instructions
+        self.common_data_bus.tick(self.clock)
         # Free the EU subunits
-        self.master_eu.clear_subunits()
-        self.slave_eu.clear_subunits()
+        for execution_unit in self.execution_units:
+            execution_unit.clear_subunits()
 
 
     def writeback(self):
@@ -244,151 +456,299 @@ class Simulator():
         :return: List of registers written to in the architectural register file.
         """
         instructions = self.reorder_buffer.get_finished_instructions()
+        if instructions:
+            self.instructions_committed += len(instructions)
+            self.last_commit = self.clock
+        if self.profiler is not None:
+            self._profile_commits(instructions)
         written_to = []
         for instruction in instructions:
-            written_to += self.register_file.write(instruction, self.reorder_buffer)
+            thread = self.threads[instruction.thread]
+            thread.instructions_committed += 1
+            if instruction.store is not None:
+                self.master_eu.lsu.commit(instruction, self.clock)
+            written = thread.register_file.write(instruction, self.reorder_buffer)
+            if thread.thread == 0: # Only the registers of the first thread are shown.
+                written_to += written
+            self.reservation_station.forward(instruction, thread.register_file)
+            if instruction.name == "syscall":
+                self._syscall(thread, instruction)
+            if self.debugger is not None:
+                self._break(self.debugger.check_commit(self, instruction))
+        if self.debugger is not None:
+            self._break(self.debugger.check_cycle(self))
         return written_to
 
 
+    def _syscall(self, thread, instruction):
+        """
+        Carries out a syscall as it commits, once every older instruction of its thread has been written back.
+        Fetch of the thread was stalled behind it, so no younger instruction can have read the registers it returns.
+        :param thread: HardwareThread making the syscall.
+        :param instruction: syscall Instruction being written back.
+        """
+        try:
+            thread.exited = self.syscalls.call(thread.register_file.value, self.memory)
+        except InvalidSyscall as e:
+            raise SimulationAborted("invalid syscall at pc 0x{0:08x}: ".format(instruction.pc) + str(e))
+        thread.syscall_pending = False
+        thread.fetch_stall_until = self.clock + 1 # Fetch resumes after the syscall from the next cycle.
+
+
+    def _break(self, reason):
+        """
+        Stops at a breakpoint or watchpoint which has fired, handing control to the curses view.
+        Headless, the hit is reported and the simulation carries on.
+        :param reason: description of what fired (or None if nothing did).
+        """
+        if reason is None:
+            return
+        self.status = "BREAKPOINT: " + reason
+        if self.renderer is not None:
+            self.renderer.pause()
+        else:
+            print("Breakpoint at cycle " + str(self.clock) + ": " + reason)
+
+
 
-    def flush_pipeline(self):
+    def _profile_commits(self, instructions):
         """
-        This function flushes a particular pipeline.
-        :param pipeline: Pipeline to be flushed.
+        Counts the instructions committing this cycle, or a stall against the instruction holding up commit.
+        A stall with an empty re-order buffer is charged to the instruction being fetched.
+        :param instructions: Instructions committing this cycle.
         """
-        if not debug:
-            self.stdscr.addstr(25+ 3 * (N-1), 10, "Pipeline Status: BRANCH PREDICTION FAILED - FLUSHING PIPELINE".ljust(64), curses.color_pair(2))
-        self.raw_instructions = [None for _ in range(N)] # Clear anything already fetched.
-        self.prev_raw_instructions = [None for _ in range(N)] # Clear anything about to be decoded.
+        for instruction in instructions:
+            self.profiler.record("committed", instruction.pc)
+        if not instructions:
+            oldest = next(iter(self.reorder_buffer.queue.values()), None)
+            self.profiler.record("stalls", self.threads[0].pc if oldest is None else oldest.pc)
 
 
-    def print_state(self, written_to):
+    def flush_pipeline(self, thread):
+        """
+        This function flushes the front end of the pipeline for a hardware thread.
+        :param thread: HardwareThread whose instructions are flushed.
         """
-        This function prints the current state of the simulator to the terminal
+        self.status = "BRANCH PREDICTION FAILED - FLUSHING PIPELINE"
+        thread.syscall_pending = False # Any syscall fetched was on the wrong path.
+        # Clear anything the thread has already fetched and which is about to be decoded.
+        self.fetch_queue = deque(item for item in self.fetch_queue if item["thread"] != thread.thread)
+        self.fetched = [item for item in self.fetched if item["thread"] != thread.thread]
+
+
+    def snapshot(self, written_to):
+        """
+        Builds an immutable snapshot of the current state of the simulator for the renderer.
         :param written_to: List of registers written to in this cycle.
+        :return: Snapshot of the simulator.
         """
-        self.stdscr.addstr(3, 10,
-                           "Program Counter: "
-                           + str(self.pc),
-                           curses.color_pair(2))
-        self.stdscr.addstr(4, 10,
-                           "Clock Cycles Taken: "
-                           + str(self.clock),
-                           curses.color_pair(3))
-        self.stdscr.addstr(5, 10,
-                           "Instructions Per Cycle: "
-                           + str(round(self.instructions_executed/self.clock, 2)),
-                           curses.color_pair(3))
-        self.stdscr.addstr(5, 40,
-                           "Instructions Executed: "
-                           + str(self.instructions_executed),
-                           curses.color_pair(3))
-        for i in range(34):
-            offset = 100
-            if i >= 20:
-                offset += 25
-            color = 4
-            if i in written_to:
-                color = 1
-            if self.register_file.reg[i]["valid"]:
-                valid = "\u2713"
-            else:
-                valid = "\u002E"
-            self.stdscr.addstr(i % 20 + 2, offset,
-                               str(self.register_file.reg[i]["name"]) + " v: " +
-                               valid + " " +
-                               str(self.register_file.reg[i]["value"])[:6] + " rob: " +
-                               str(self.register_file.reg[i]["rob_entry"]).ljust(16),
-                               curses.color_pair(color))
-        for i in range(N):
-            try:
-                self.stdscr.addstr(14 + i, 10,
-                                   "Pipeline Fetch:     "
-                                   + str(Instruction(self.raw_instructions[i]).description().ljust(64)),
-                                   curses.color_pair(4))
-            except:
-                self.stdscr.addstr(14 + i, 10,
-                                   "Pipeline Fetch:     Empty".ljust(72),
-                                   curses.color_pair(4))
-            try:
-                self.stdscr.addstr(14 + N + i + 1, 10,
-                                   "Pipeline Decode:    "
-                                   + str(Instruction(self.prev_raw_instructions[i]).description().ljust(64)),
-                                   curses.color_pair(1))
-            except:
-                self.stdscr.addstr(14 + N + i + 1, 10,
-                                   "Pipeline Decode:    Empty".ljust(72),
-                                   curses.color_pair(1))
-            try:
-                self.stdscr.addstr(18 + 2*N + i + 3, 10,
-                                   "Pipeline Writeback: "
-                                   + str(self.now_writing[i].description().ljust(64)),
-                                   curses.color_pair(5))
-            except:
-                self.stdscr.addstr(18 + 2*N + i + 3, 10,
-                                   "Pipeline Writeback: Empty".ljust(72),
-                                   curses.color_pair(5))
-        for i in range(4):
-            try:
-                self.stdscr.addstr(14 + 2*N + i + 2, 10,
-                                   "Pipeline Execute:   "
-                                   + str(self.now_executing[i].description().ljust(64)),
-                                   curses.color_pair(6))
-            except:
-                self.stdscr.addstr(14 + 2*N + i + 2, 10,
-                                   "Pipeline Execute:   Empty".ljust(72),
-                                   curses.color_pair(6))
-        self.reservation_station.print(self.stdscr)
-        self.branch_predictor.print(self.stdscr)
-        self.reorder_buffer.print(self.stdscr)
-        self.stdscr.refresh()
-        if not self.intercept:
-            time.sleep(instruction_time)
-        if self.intercept and self.stdscr.getch() == 32:
-            self.intercept = False
-            self.stdscr.addstr(51, 0, "".ljust(92))
+        return Snapshot(
+            pc=self.threads[0].pc,
+            clock=self.clock,
+            instructions_executed=self.instructions_executed,
+            status=self.status,
+            registers=tuple(zip(RegisterFile.names, *self.register_file.snapshot())),
+            written_to=tuple(written_to),
+            fetch=tuple(self._describe_raw(raw) for raw in self.fetched),
+            decode=tuple(self._describe_raw(raw) for raw in self.decoding),
+            execute=tuple(ins.description() for ins in self.now_executing),
+            writeback=tuple(ins.description() for ins in self.now_writing),
+            reservation_station=self.reservation_station.snapshot(),
+            branch_predictor=self.branch_predictor.snapshot(),
+            common_data_bus=self.common_data_bus.snapshot(),
+            caches=tuple(cache.snapshot() for cache in self.caches),
+            reorder_buffer=self.reorder_buffer.snapshot()
+        )
+
+
+    @staticmethod
+    def _describe_raw(raw_instruction):
+        """
+        Describes a fetched but not yet decoded instruction.
+        :param raw_instruction: fetch object (or None if the slot is empty).
+        :return: Description of the instruction or None if it cannot be decoded.
+        """
+        try:
+            return Instruction(raw_instruction).description()
+        except:
+            return None
+
+
+    def summary(self):
+        """
+        Describes the statistics gathered over the simulation.
+        :return: List of lines of text.
+        """
+        if self.statistics is not None:
+            return self.statistics
+        lines = ["Clock cycles taken: " + str(self.clock),
+                 "Instructions executed: " + str(self.instructions_executed)]
+        broadcasts, contended_cycles, delayed_results, _ = self.common_data_bus.snapshot()
+        lines.append("Result bus: " + str(broadcasts) + " broadcasts, " + str(contended_cycles) +
+                     " contended cycles, " + str(delayed_results) + " delayed results")
+        for cache in self.caches:
+            name, hits, misses, evictions, writebacks, merged, stalls = cache.snapshot()
+            lines.append(name + " cache: " + str(hits) + " hits, " + str(misses) + " misses, " +
+                         str(evictions) + " evictions, " + str(writebacks) + " write backs" +
+                         (", " + str(merged) + " merged misses, " + str(stalls) + " MSHR stalls" if cache.mshrs else ""))
+        ports = [execution_unit for execution_unit in self.execution_units if hasattr(execution_unit, "lsu")]
+        for i, execution_unit in enumerate(ports):
+            busy = min(execution_unit.busy_cycles.get("lsu", 0), self.clock)
+            lines.append("LSU port " + str(i) + ": " + str(round(100 * busy / self.clock, 1)) + "% utilised")
+        _, reads, writes = self.main_memory.snapshot()
+        lines.append("Main memory: " + str(reads) + " reads, " + str(writes) + " writes")
+        if len(self.threads) > 1:
+            lines.append("SMT throughput: " + str(round(self.instructions_committed / self.clock, 3)) +
+                         " instructions per cycle over " + str(len(self.threads)) + " threads (" +
+                         self.fetch_policy + " fetch)")
+            for thread in self.threads:
+                predictor = thread.branch_predictor
+                lines.append("Thread " + str(thread.thread) + ": " + str(thread.instructions_committed) +
+                             " instructions committed (" + str(round(thread.instructions_committed / self.clock, 3)) +
+                             " per cycle), " + str(predictor.incorrect_predictions) + " mispredicts")
+        return lines
+
 
+    def result(self):
+        """
+        Captures the outcome of a finished simulation so it can be cached.
+        :return: Dictionary of the statistics and final architectural state.
+        """
+        return {
+            "clock": self.clock,
+            "instructions_executed": self.instructions_executed,
+            "instructions_committed": self.instructions_committed,
+            "statistics": self.summary(),
+            "registers": list(self.register_file.value),
+            "memory": dict(self.memory)
+        }
 
-    def setup_screen(self, input_file):
+
+    def load_result(self, result):
         """
-        Sets up the curses terminal with the appropriate colour scheme.
+        Puts the simulator into the final state of a previously cached simulation.
+        :param result: Dictionary returned by result().
         """
-        curses.init_color(curses.COLOR_MAGENTA, 999, 0, 600)
-        curses.init_pair(1, curses.COLOR_GREEN, curses.COLOR_BLACK)
-        curses.init_pair(2, curses.COLOR_RED, curses.COLOR_BLACK)
-        curses.init_pair(3, curses.COLOR_BLUE, curses.COLOR_BLACK)
-        curses.init_pair(4, curses.COLOR_WHITE, curses.COLOR_BLACK)
-        curses.init_pair(5, curses.COLOR_YELLOW, curses.COLOR_BLACK)
-        curses.init_pair(6, curses.COLOR_CYAN, curses.COLOR_BLACK)
-        curses.init_pair(7, curses.COLOR_MAGENTA, curses.COLOR_BLACK)
-        self.stdscr.addstr(0, 100, "REGISTER FILE", curses.A_BOLD)
-        self.stdscr.addstr(0, 10, "MACHINE INFORMATION", curses.A_BOLD)
-        self.stdscr.addstr(2, 10, "Program: " + str(input_file), curses.color_pair(4))
-        self.stdscr.addstr(4, 35, "Cycles per second: " + str(1 / instruction_time)[:5], curses.color_pair(3))
-        self.stdscr.addstr(12, 10, "PIPELINE INFORMATION", curses.A_BOLD)
-        self.stdscr.addstr(51, 0, "Press `SPACE' to automate execution or any other key to single step.")
+        self.clock = result["clock"]
+        self.instructions_executed = result["instructions_executed"]
+        self.instructions_committed = result["instructions_committed"]
+        self.statistics = result["statistics"]
+        self.register_file.value[:] = result["registers"]
+        self.memory.clear() # Cleared in place as the execution units share the reference.
+        self.memory.update(result["memory"])
 
 
-    def shutdown(self):
+    def fork(self):
+        """
+        Copies the whole state of the simulation, sharing memory copy-on-write, so what-if runs can carry on
+        from a common point. The copy runs headless without any profiler, progress stream, debugger or limits,
+        printing to the console.
+        :return: Simulator object.
         """
-        Displays the final values of the return registers and does a memory dump.
+        memo = {id(self.memory): self.memory.fork(), id(self.initial_memory): self.initial_memory,
+                id(self.syscalls): SystemCalls()}
+        for unshared in (self.stdscr, self.renderer, self.profiler, self.progress, self.debugger):
+            memo[id(unshared)] = None
+        simulator = copy.deepcopy(self, memo)
+        simulator.max_cycles = simulator.max_seconds = None
+        return simulator
+
+
+    def diagnostic(self):
+        """
+        Describes where the pipeline has got to, to explain why a simulation was aborted.
+        :return: List of lines of text.
+        """
+        lines = ["Clock cycles taken: " + str(self.clock),
+                 "Instructions committed: " + str(self.instructions_committed),
+                 "Cycles since the last commit: " + str(self.clock - self.last_commit)]
+        for thread in self.threads:
+            lines.append(("Thread " + str(thread.thread) + " fetch pc: " if len(self.threads) > 1 else "Fetch pc: ") +
+                         "0x{0:08x}".format(thread.pc) +
+                         (" (recovering from a mispredict)" if thread.branch_predictor.in_recovery else ""))
+        oldest = next(iter(self.reorder_buffer.queue.items()), None)
+        if oldest is None:
+            lines.append("Oldest ROB entry: none, the re-order buffer is empty")
+        else:
+            key, instruction = oldest
+            lines.append("Oldest ROB entry: " + str(key) + " " + self._describe_waiting(instruction) +
+                         (" ready" if instruction.ready else " not ready"))
+        lines.append("Reservation station: " + str(len(self.reservation_station.queue)) + " instructions")
+        for instruction in self.reservation_station.queue:
+            lines.append("    ROB " + str(instruction.rob_entry) + " " + self._describe_waiting(instruction))
+        return lines
+
+
+    @staticmethod
+    def _describe_waiting(instruction):
         """
+        Describes an in flight instruction along with the operands it is still waiting on.
+        :param instruction: Instruction object.
+        :return: String describing the instruction.
+        """
+        description = "0x{0:08x}: ".format(instruction.pc) + instruction.description()
+        for name, valid, value in (("rs", instruction.rs_valid, instruction.rs_value),
+                                   ("rt", instruction.rt_valid, instruction.rt_value)):
+            if valid is False:
+                description += " [" + name + " waits on ROB " + str(value) + "]"
+        return description
+
+
+    def abort(self, reason):
+        """
+        Stops an aborted simulation, reporting why along with a diagnostic dump of the pipeline.
+        :param reason: why the simulation was aborted.
+        """
+        if self.renderer is not None:
+            self.renderer.stop()  # Take back ownership of the terminal and hand it back to the shell.
+            curses.endwin()
+        self.syscalls.close() # Show what the program printed before it was aborted.
+        print("EXECUTION ABORTED: " + reason, file=sys.stderr)
+        for line in self.diagnostic():
+            print(line, file=sys.stderr)
+        exit(2)
+
+
+    def shutdown(self, dump_file="./memory.out", dump_range=(None, None), dump_format="hex", dump_diff=False):
+        """
+        Displays the final values of the return registers and does a memory dump,
+        then exits with the code the program exited with.
+        :param dump_file: file to dump memory to (or None to skip the dump).
+        :param dump_range: (start, end) addresses of memory to dump.
+        :param dump_format: format of the memory dump (hex, binary, word or raw).
+        :param dump_diff: only dump words changed since the program was loaded.
+        """
+        if dump_file is not None:
+            MemoryDump(self.memory, self.initial_memory).write(dump_file, *dump_range, format=dump_format, diff=dump_diff)
+        if self.renderer is None:
+            self.syscalls.close()
+            print("EXECUTION COMPLETE!")
+            for line in self.summary():
+                print(line)
+            print("1st return value: " + str(self.register_file.value[2]))
+            print("2nd return value: " + str(self.register_file.value[3]))
+            for thread in self.threads[1:]:
+                print("Thread " + str(thread.thread) + " return values: " + str(thread.register_file.value[2]) + " " +
+                      str(thread.register_file.value[3]))
+            if dump_file is not None:
+                print("See memory dump at " + str(dump_file))
+            exit(self.syscalls.exit_code)
+        self.renderer.publish(self.snapshot([])) # The final state may not have been drawn whilst fast forwarding.
+        self.renderer.stop()  # Take back ownership of the terminal.
         self.stdscr.addstr(46, 10, "EXECUTION COMPLETE!", curses.A_BOLD)
-        self.stdscr.addstr(47, 10, "1st return value: " + str(self.register_file.reg[2]["value"]), curses.color_pair(3))
-        self.stdscr.addstr(48, 10, "2nd return value: " + str(self.register_file.reg[3]["value"]), curses.color_pair(3))
-        self.stdscr.addstr(49, 10, "See memory dump at ./memory.out")
-        f = open("./memory.out", "wb")
-        f.write(str(self.memory).encode('utf-8'))
-        f.close()
+        self.stdscr.addstr(47, 10, "1st return value: " + str(self.register_file.value[2]), curses.color_pair(3))
+        self.stdscr.addstr(48, 10, "2nd return value: " + str(self.register_file.value[3]), curses.color_pair(3))
+        if dump_file is not None:
+            self.stdscr.addstr(49, 10, "See memory dump at " + str(dump_file))
         self.stdscr.addstr(4, 100,
-                           str(self.register_file.reg[2]["name"]) + " v: \u2713 " +
-                           str(self.register_file.reg[2]["value"])[:6] + " rob: " +
-                           str(self.register_file.reg[2]["rob_entry"]),
+                           str(RegisterFile.names[2]) + " v: \u2713 " +
+                           str(self.register_file.value[2])[:6] + " rob: " +
+                           str(self.register_file.rob_entry[2]),
                            curses.color_pair(3))
         self.stdscr.addstr(5, 100,
-                           str(self.register_file.reg[3]["name"]) + " v: \u2713 " +
-                           str(self.register_file.reg[3]["value"])[:6] + " rob: " +
-                           str(self.register_file.reg[3]["rob_entry"]),
+                           str(RegisterFile.names[3]) + " v: \u2713 " +
+                           str(self.register_file.value[3])[:6] + " rob: " +
+                           str(self.register_file.rob_entry[3]),
                            curses.color_pair(3))
         self.stdscr.refresh()
-        exit(0)
+        exit(self.syscalls.exit_code)
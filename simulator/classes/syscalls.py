@@ -0,0 +1,306 @@
+import sys
+from classes.constants import syscall_buffer_size
+from classes.errors import InvalidSyscall
+
+
+class SystemCalls():
+    """
+    Services of the syscall instruction, following the SPIM conventions: the service number is in $v0,
+    arguments are in $a0-$a2 and any result is returned in $v0.
+    Console output is buffered and written to the host in chunks of buffer_size bytes, so a program printing
+    a character at a time does not pay for a host write per character.
+    Files opened by the program are read and written directly into simulated memory.
+    """
+    # Service number : method handling it.
+    services = {
+        1: "print_int",     # Print the integer in $a0.
+        4: "print_string",  # Print the NUL terminated string at $a0.
+        5: "read_int",      # Read a line holding an integer into $v0.
+        8: "read_string",   # Read a line into the buffer at $a0 of $a1 bytes, NUL terminated.
+        10: "exit",         # Exit with code 0.
+        11: "print_char",   # Print the character in $a0.
+        13: "open",         # Open the file named at $a0 with flags $a1 (0 read, 1 write, 9 append), fd in $v0.
+        14: "read",         # Read up to $a2 bytes of file $a0 into the buffer at $a1, bytes read in $v0.
+        15: "write",        # Write $a2 bytes of the buffer at $a1 to file $a0, bytes written in $v0.
+        16: "close",        # Close file $a0.
+        17: "exit2"         # Exit with the code in $a0.
+    }
+    # Flags of the open service : mode of the host file.
+    modes = {0: "rb", 1: "wb", 9: "ab"}
+
+    def __init__(self, output=None, input=None, buffer_size=syscall_buffer_size, hold=False, console_input=True):
+        """
+        Constructor for the SystemCalls class.
+        :param output: file to write console output to (or None for standard output).
+        :param input: file console reads come from (or None for standard input).
+        :param buffer_size: bytes of console output buffered before they are written.
+        :param hold: keep all console output until close(), e.g. whilst curses owns the terminal.
+        :param console_input: allow reads of standard input when no input file is given. Whilst curses owns the
+        terminal its key presses drive the simulation, so a console read would wait forever.
+        """
+        self.console = output is None
+        self.output = sys.stdout.buffer if output is None else open(output, "wb")
+        if input is not None:
+            self.input = open(input, "rb")
+        else:
+            self.input = sys.stdin.buffer if console_input else None
+        self.owned = [stream for stream, name in ((self.output, output), (self.input, input)) if name is not None]
+        self.buffer_size = buffer_size
+        self.hold = hold
+        self.buffer = bytearray()
+        self.files = {} # File descriptor : host file opened by the program.
+        self.next_fd = 3
+        self.exit_code = 0
+        self.calls = 0
+        self.written = None # (address, bytes) of memory written by the last call, or None if it wrote none.
+
+
+    def call(self, registers, memory):
+        """
+        Carries out the service requested by a syscall instruction.
+        :param registers: architectural register values, $v0 is updated with any result.
+        :param memory: main memory.
+        :return: Boolean representing whether the program has exited.
+        """
+        service = registers[2]
+        if service not in self.services:
+            raise InvalidSyscall("unknown service " + str(service))
+        self.calls += 1
+        self.written = None
+        result = getattr(self, "_" + self.services[service])(registers[4], registers[5], registers[6], memory)
+        if result is True:
+            return True
+        if result is not None:
+            registers[2] = result
+        return False
+
+
+    def flush(self):
+        """
+        Writes the buffered console output to the host, unless it is being held.
+        """
+        if self.hold or not self.buffer:
+            return
+        if self.console:
+            sys.stdout.flush() # Keep the program's output in order with anything the simulator has printed.
+        self.output.write(self.buffer)
+        self.output.flush()
+        self.buffer = bytearray()
+
+
+    def close(self):
+        """
+        Writes any console output still buffered (even if it was held) and closes every file.
+        """
+        self.hold = False
+        self.flush()
+        for f in list(self.files.values()) + self.owned:
+            f.close()
+        self.files, self.owned = {}, []
+
+
+    def _emit(self, data):
+        """
+        Buffers console output, writing it out once a chunk has built up.
+        :param data: bytes to output.
+        """
+        self.buffer += data
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+
+    def _readline(self):
+        """
+        Reads a line of console input, first writing out any prompt waiting in the output buffer.
+        :return: Bytes of the line (empty at the end of the input).
+        """
+        return self._console_input().readline()
+
+
+    def _console_input(self):
+        """
+        Gets the console input stream, first writing out any prompt waiting in the output buffer.
+        :return: File console reads come from.
+        """
+        if self.input is None:
+            raise InvalidSyscall("console input is not available whilst the curses view owns the terminal, "
+                                 "run with --headless or pass the input with --input")
+        self.flush()
+        return self.input
+
+
+    def _print_int(self, a0, a1, a2, memory):
+        """
+        Service 1: prints an integer.
+        """
+        self._emit(str(a0).encode())
+
+
+    def _print_string(self, a0, a1, a2, memory):
+        """
+        Service 4: prints a NUL terminated string.
+        """
+        self._emit(self._load_string(memory, a0))
+
+
+    def _read_int(self, a0, a1, a2, memory):
+        """
+        Service 5: reads an integer.
+        :return: Integer read (0 at the end of the input).
+        """
+        line = self._readline().strip()
+        try:
+            return int(line) if line else 0
+        except ValueError:
+            raise InvalidSyscall("read_int got `" + line.decode(errors="replace") + "' which is not an integer")
+
+
+    def _read_string(self, a0, a1, a2, memory):
+        """
+        Service 8: reads a line into a buffer, keeping the newline if it fits and NUL terminating it.
+        """
+        if a1 < 1:
+            return
+        data = self._readline()[:a1 - 1]
+        self._store_bytes(memory, a0, data + b"\0")
+
+
+    def _exit(self, a0, a1, a2, memory):
+        """
+        Service 10: exits with code 0.
+        :return: True as the program has exited.
+        """
+        self.exit_code = 0
+        return True
+
+
+    def _print_char(self, a0, a1, a2, memory):
+        """
+        Service 11: prints a character.
+        """
+        self._emit(bytes([a0 & 0xff]))
+
+
+    def _open(self, a0, a1, a2, memory):
+        """
+        Service 13: opens a host file.
+        :return: File descriptor, or -1 if the file cannot be opened.
+        """
+        if a1 not in self.modes:
+            return -1
+        try:
+            f = open(self._load_string(memory, a0).decode(errors="replace"), self.modes[a1])
+        except OSError:
+            return -1
+        fd, self.next_fd = self.next_fd, self.next_fd + 1
+        self.files[fd] = f
+        return fd
+
+
+    def _read(self, a0, a1, a2, memory):
+        """
+        Service 14: reads from a file (or the console for file descriptor 0) into memory.
+        :return: Bytes read, 0 at the end of the file or -1 if the file is not open for reading.
+        """
+        if a0 == 0:
+            f = self._console_input()
+        else:
+            f = self.files.get(a0)
+        if f is None or a2 < 0:
+            return -1
+        try:
+            data = f.read(a2)
+        except OSError:
+            return -1
+        self._store_bytes(memory, a1, data)
+        return len(data)
+
+
+    def _write(self, a0, a1, a2, memory):
+        """
+        Service 15: writes memory to a file (or the console for file descriptors 1 and 2).
+        :return: Bytes written or -1 if the file is not open for writing.
+        """
+        data = self._load_bytes(memory, a1, a2)
+        if a0 in [1, 2]:
+            self._emit(data)
+            return len(data)
+        f = self.files.get(a0)
+        if f is None:
+            return -1
+        try:
+            return f.write(data)
+        except OSError:
+            return -1
+
+
+    def _close(self, a0, a1, a2, memory):
+        """
+        Service 16: closes a file.
+        """
+        f = self.files.pop(a0, None)
+        if f is not None:
+            f.close()
+
+
+    def _exit2(self, a0, a1, a2, memory):
+        """
+        Service 17: exits with a code.
+        :return: True as the program has exited.
+        """
+        self.exit_code = a0 & 0xff
+        return True
+
+
+    @staticmethod
+    def _load_string(memory, address):
+        """
+        Reads a NUL terminated string from memory.
+        :param memory: main memory.
+        :param address: address of the first character.
+        :return: Bytes of the string without the NUL.
+        """
+        data = bytearray()
+        while True:
+            byte = SystemCalls._load_byte(memory, address + len(data))
+            if byte == 0:
+                return bytes(data)
+            data.append(byte)
+
+
+    @staticmethod
+    def _load_bytes(memory, address, count):
+        """
+        Reads bytes from memory.
+        :param memory: main memory.
+        :param address: address of the first byte.
+        :param count: number of bytes.
+        :return: Bytes read.
+        """
+        return bytes(SystemCalls._load_byte(memory, address + i) for i in range(max(count, 0)))
+
+
+    @staticmethod
+    def _load_byte(memory, address):
+        """
+        Reads a byte of memory.
+        :param memory: main memory.
+        :param address: address of the byte.
+        :return: Integer value of the byte.
+        """
+        try:
+            return int(memory[address], 2) & 0xff
+        except KeyError:
+            raise InvalidSyscall("address 0x{0:08x} is not in memory".format(address))
+
+
+    def _store_bytes(self, memory, address, data):
+        """
+        Writes bytes to memory in the format the LSU uses.
+        :param memory: main memory.
+        :param address: address of the first byte.
+        :param data: bytes to write.
+        """
+        for i, byte in enumerate(data):
+            memory[address + i] = "{0:08b}".format(byte)
+        self.written = (address, len(data))
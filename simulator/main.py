@@ -1,29 +1,293 @@
-import argparse
+import argparse, pickle, sys
 from classes.simulator import Simulator
+from classes.functional import FunctionalSimulator
+from classes.batched import BatchedSimulator
+from classes.multicore import MultiCoreSimulator
 from curses import wrapper
-from classes.constants import debug
-from classes.errors import Interrupt
+from classes.constants import debug, result_cache_dir, progress_interval, watchdog_cycles, multicore_window
+from classes.constants import fetch_policy
+from classes.errors import Interrupt, SimulationAborted
+from classes.memory_dump import MemoryDump
+from classes.result_cache import ResultCache
+from classes.profiler import Profiler
+from classes.progress import ProgressStream
+from classes.debugger import Debugger
+from classes.syscalls import SystemCalls
+from classes.errors import InvalidSyscall
+import os
 
 
-def main(stdscr, args):
+def main(stdscr, args, syscalls, debugger=None):
     """
     Main function spawning the simulator.
+    :param stdscr: curses terminal (or None to run headless).
+    :param syscalls: SystemCalls carrying out the program's syscalls.
+    :param debugger: Debugger built from the breakpoints and watchpoints (or None).
     :param args: Arguments passed to simulator:
         source file name
+        headless flag
+        memory dump options
+        result cache options
+        profile file
+        progress stream options
+        limits
+        hardware threads and fetch policy
     """
-    simulator = Simulator(args.file, stdscr)
+    profiler, progress = None, None
+    if args.profile is not None:
+        profiler = Profiler(os.path.splitext(args.file)[0] + ".sym")
+    if args.progress is not None:
+        progress = ProgressStream(args.progress, args.progress_interval)
+    labels = Debugger.load_labels(os.path.splitext(args.file)[0] + ".sym")
+    entries = {thread: labels["thread" + str(thread)] for thread in range(args.threads) if "thread" + str(thread) in labels}
+    simulator = Simulator(args.file, stdscr, profiler, progress, debugger,
+                          max_cycles=args.max_cycles, max_seconds=args.max_seconds, watchdog=args.watchdog,
+                          threads=args.threads, entries=entries, fetch_policy=args.fetch_policy, syscalls=syscalls)
+    cache, key = None, None
+    # Only plain headless single threaded runs can be replayed.
+    if stdscr is None and args.cache and profiler is None and debugger is None and args.threads == 1:
+        cache = ResultCache(args.cache_dir)
+        key = cache.key(simulator.memory, simulator.threads[0].pc)
+        result = cache.get(key)
+        if result is not None:
+            simulator.load_result(result)
+            print("Using cached result " + key[:16])
+            if progress is not None:
+                progress.close(simulator)
+            simulator.shutdown(args.dump, args.dump_range, args.dump_format, args.dump_diff)
     try:
         simulator.simulate()
     except Interrupt:
+        if cache is not None and not syscalls.calls: # Console and file I/O cannot be replayed.
+            cache.put(key, simulator.result())
+        if profiler is not None:
+            profiler.write(args.profile)
+        if progress is not None:
+            progress.close(simulator)
         if debug:
             exit(0)
-        simulator.shutdown()
+        simulator.shutdown(args.dump, args.dump_range, args.dump_format, args.dump_diff)
+    except SimulationAborted as e:
+        if progress is not None:
+            progress.close(simulator)
+        simulator.abort(str(e))
+
+
+def multicore(args):
+    """
+    Runs the program headless on several cores sharing memory.
+    :param args: Arguments passed to simulator:
+        source file name
+        number of cores, worker processes and window size
+        memory dump options
+        limits
+    """
+    simulator = MultiCoreSimulator(args.file, args.cores, args.jobs, args.window, args.watchdog,
+                                   args.max_cycles, args.max_seconds)
+    try:
+        simulator.simulate()
+    except Interrupt:
+        simulator.shutdown(args.dump, args.dump_range, args.dump_format, args.dump_diff)
+    except SimulationAborted as e:
+        print("EXECUTION ABORTED: " + str(e), file=sys.stderr)
+        exit(2)
+
+
+def build_debugger(args):
+    """
+    Builds the debugger for the breakpoints and watchpoints given on the command line.
+    Locations may be addresses or labels from the assembler's .sym file.
+    :param args: Arguments passed to simulator.
+    :return: Debugger object.
+    """
+    labels = Debugger.load_labels(os.path.splitext(args.file)[0] + ".sym")
+    registers, addresses = [], []
+    for watch in args.watches:
+        register = Debugger.register(watch)
+        if register is not None:
+            registers.append(register)
+        else:
+            addresses.append(Debugger.address(watch, labels))
+    return Debugger(breakpoints=[Debugger.address(location, labels) for location in args.breakpoints],
+                    cycles=args.break_cycles, registers=registers, addresses=addresses, conditions=args.conditions)
+
+
+def functional(args):
+    """
+    Runs the program architecturally in functional mode, without modelling the pipeline or its timing.
+    :param args: Arguments passed to simulator:
+        source file name
+        memory dump options
+        program input and output files
+        limits
+    """
+    f = open(args.file, "rb")
+    memory = pickle.load(f)
+    pc = pickle.load(f)
+    f.close()
+    initial_memory = dict(memory)
+    syscalls = SystemCalls(args.output, args.input)
+    # Without a pipeline every instruction takes a cycle, so the cycle budget is a budget of instructions.
+    simulator = FunctionalSimulator(memory, pc, syscalls=syscalls,
+                                    max_instructions=args.max_cycles, max_seconds=args.max_seconds)
+    try:
+        simulator.run()
+    except InvalidSyscall as e:
+        syscalls.close()
+        print("EXECUTION ABORTED: invalid syscall: " + str(e), file=sys.stderr)
+        exit(2)
+    except SimulationAborted as e:
+        syscalls.close()
+        print("EXECUTION ABORTED: " + str(e), file=sys.stderr)
+        print("Instructions executed: " + str(simulator.instructions_executed), file=sys.stderr)
+        print("Block entry pc: 0x{0:08x}".format(simulator.pc), file=sys.stderr)
+        exit(2)
+    syscalls.close()
+    if args.dump is not None:
+        MemoryDump(memory, initial_memory).write(args.dump, *args.dump_range, format=args.dump_format, diff=args.dump_diff)
+    print("EXECUTION COMPLETE!")
+    print("Instructions executed: " + str(simulator.instructions_executed))
+    print("Blocks translated: " + str(simulator.translations) + ", invalidated: " + str(simulator.invalidations))
+    print("1st return value: " + str(simulator.registers[2]))
+    print("2nd return value: " + str(simulator.registers[3]))
+    if args.dump is not None:
+        print("See memory dump at " + str(args.dump))
+    exit(syscalls.exit_code)
+
+
+def batched(args):
+    """
+    Runs the program over several memory images at once on the NumPy batched engine, one lane per image.
+    :param args: Arguments passed to simulator:
+        source file name
+        file names of the other images
+        memory dump options
+        limits
+    Exits with 2 if any lane hit a limit.
+    """
+    files = [args.file] + args.batch
+    images, entry = [], None
+    for name in files:
+        f = open(name, "rb")
+        images.append(pickle.load(f))
+        pc = pickle.load(f)
+        f.close()
+        if entry is not None and pc != entry:
+            raise ValueError(name + " does not have the same entry point as " + files[0])
+        entry = pc
+    simulator = BatchedSimulator(images, entry, max_instructions=args.max_cycles, max_seconds=args.max_seconds)
+    simulator.run()
+    if simulator.aborted:
+        print("EXECUTION ABORTED: " + str(len(simulator.aborted)) + " of " + str(len(files)) + " lanes hit a limit",
+              file=sys.stderr)
+    else:
+        print("EXECUTION COMPLETE!")
+    for lane, name in enumerate(files):
+        registers = simulator.register_values(lane)
+        line = name + ": " + str(simulator.instructions_executed[lane]) + " instructions, return values " + \
+               str(registers[2]) + " " + str(registers[3])
+        if lane in simulator.faults:
+            line += " (stopped: " + simulator.faults[lane] + ")"
+        print(line)
+        if args.dump is not None:
+            MemoryDump(simulator.memory_image(lane), images[lane]).write(args.dump + "." + str(lane), *args.dump_range,
+                                                                         format=args.dump_format, diff=args.dump_diff)
+    print("Vectorised steps: " + str(simulator.steps))
+    if args.dump is not None:
+        print("See memory dumps at " + str(args.dump) + ".<lane>")
+    if simulator.aborted:
+        exit(2)
+
+
+def address_range(text):
+    """
+    Parses an address range of the form START:END (either bound may be omitted, hex is accepted).
+    :param text: range given on the command line.
+    :return: Tuple of start and end addresses.
+    """
+    try:
+        start, end = text.split(":")
+        return (int(start, 0) if start else None), (int(end, 0) if end else None)
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected START:END, got `" + text + "'")
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="JW MIPS Simulator")
+    parser.add_argument('--headless', action='store_true', help="Run without the curses interface")
+    parser.add_argument('--functional', action='store_true',
+                        help="Only run the program architecturally, translating hot blocks to Python (no timing)")
+    parser.add_argument('--batch', metavar='file', nargs='+',
+                        help="Also run these images of the same program, one NumPy lane each (32 bit arithmetic)")
+    parser.add_argument('--cores', metavar='N', type=int, default=1,
+                        help="Run headless on N cores sharing memory (core N starts at label coreN if there is one)")
+    parser.add_argument('--jobs', metavar='J', type=int, default=1, help="Worker processes to step the cores in")
+    parser.add_argument('--window', metavar='W', type=int, default=multicore_window,
+                        help="Cycles the cores run between exchanging their writes to memory")
+    parser.add_argument('--threads', metavar='T', type=int, default=1,
+                        help="Run T hardware threads sharing the core (thread N starts at label threadN if there is one)")
+    parser.add_argument('--fetch-policy', choices=Simulator.fetch_policies, default=fetch_policy,
+                        help="Order the hardware threads are offered fetch slots in")
+    parser.add_argument('--input', metavar='file', help="File the program's console reads come from (default stdin)")
+    parser.add_argument('--output', metavar='file', help="File the program's console output goes to (default stdout)")
+    parser.add_argument('--dump', metavar='file', default="./memory.out", help="Destination for the memory dump")
+    parser.add_argument('--no-dump', dest='dump', action='store_const', const=None, help="Skip the memory dump")
+    parser.add_argument('--dump-range', metavar='START:END', type=address_range, default=(None, None),
+                        help="Only dump addresses in [START, END)")
+    parser.add_argument('--dump-format', choices=MemoryDump.formats, default="hex", help="Format of the memory dump")
+    parser.add_argument('--dump-diff', action='store_true', help="Only dump words changed since the program was loaded")
+    parser.add_argument('--no-cache', dest='cache', action='store_false',
+                        help="Always simulate, neither using nor storing cached results")
+    parser.add_argument('--cache-dir', metavar='dir', default=result_cache_dir, help="Directory of cached results")
+    parser.add_argument('--profile', metavar='file', nargs='?', const="./profile.out",
+                        help="Write a per label and per source line profile (using the assembler's .sym file)")
+    parser.add_argument('--progress', metavar='target',
+                        help="Stream JSON lines progress records to a file, named pipe, - (stdout) or unix:PATH")
+    parser.add_argument('--progress-interval', metavar='K', type=int, default=progress_interval,
+                        help="Cycles between progress records")
+    parser.add_argument('--break', dest='breakpoints', metavar='location', action='append', default=[],
+                        help="Stop when the instruction at an address or label commits (runs at full speed until then)")
+    parser.add_argument('--break-cycle', dest='break_cycles', metavar='N', type=int, action='append', default=[],
+                        help="Stop at a clock cycle")
+    parser.add_argument('--watch', dest='watches', metavar='register|location', action='append', default=[],
+                        help="Stop when a committed write changes a register or the memory word at an address or label")
+    parser.add_argument('--break-if', dest='conditions', metavar='expression', action='append', default=[],
+                        help="Stop when a condition over the registers, pc, cycle and mem(address) becomes true")
+    parser.add_argument('--max-cycles', metavar='N', type=int,
+                        help="Abort the simulation after N cycles (N instructions in functional and batched mode)")
+    parser.add_argument('--max-seconds', metavar='S', type=float, help="Abort the simulation after S seconds")
+    parser.add_argument('--watchdog', metavar='N', type=int, default=watchdog_cycles,
+                        help="Abort the simulation after N cycles without a commit (0 to disable)")
     parser.add_argument('file', help="JW machine code file")
     args = parser.parse_args()
-    if debug:
-        main(None, args)
-    wrapper(main, args)
\ No newline at end of file
+    if args.threads > 1:
+        if args.cores > 1:
+            parser.error("hardware threads are only supported on a single core")
+        if args.profile is not None or args.breakpoints or args.break_cycles or args.watches or args.conditions:
+            parser.error("profiling and breakpoints are only supported on a single hardware thread")
+    if args.cores > 1:
+        if args.profile is not None or args.progress is not None or args.breakpoints or args.break_cycles or \
+                args.watches or args.conditions:
+            parser.error("profiling, progress streams and breakpoints are only supported on a single core")
+        multicore(args)
+    if args.batch:
+        batched(args)
+        exit(0)
+    if args.functional:
+        functional(args)
+    debugger = None
+    if args.breakpoints or args.break_cycles or args.watches or args.conditions:
+        # Checked before curses takes the terminal so a bad location or condition is reported like any other argument.
+        try:
+            debugger = build_debugger(args)
+        except (ValueError, SyntaxError) as e:
+            parser.error(str(e))
+    if debug or args.headless:
+        main(None, args, SystemCalls(args.output, args.input), debugger)
+    # Console output is held whilst curses owns the terminal and written once it has been handed back,
+    # and the console cannot be read as the key presses belong to the curses view.
+    syscalls = SystemCalls(args.output, args.input, hold=args.output is None, console_input=False)
+    try:
+        wrapper(main, args, syscalls, debugger)
+    finally:
+        syscalls.close()
\ No newline at end of file